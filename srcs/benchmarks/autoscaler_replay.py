@@ -0,0 +1,166 @@
+"""
+Replay workflow job traces against the runner targets of a pool:
+`min` runners waiting, and the forecast of the autoscaler.
+
+Run it from `srcs`:
+    python -m benchmarks.autoscaler_replay [trace.jsonl]
+
+A trace holds one webhook per line: `{"timestamp": <epoch>, "action": ..., "workflow_job":
+{"id": ..., "labels": [...]}}`, every job is replayed on the same pool.
+Without a trace, 8 days of jobs peaking on working hours are generated.
+The last day is measured, the previous ones fill the autoscaler history.
+"""
+import heapq
+import json
+import math
+import random
+import sys
+
+import fakeredis
+from runners_manager.runner.Autoscaler import Autoscaler
+from runners_manager.runner.Autoscaler import DAY
+from runners_manager.runner.RedisManager import RedisManager
+
+POOL = "centos7-small"
+MIN = 2
+MAX = 150
+BOOT_TIME = 300
+RECONCILE_INTERVAL = 30
+EXTRA_RUNNER_TIMER = 10 * 60
+DEFAULT_DURATION = 10 * 60
+
+
+def generate_trace(days: int = 8, seed: int = 42) -> list[tuple[float, float]]:
+    """
+    Jobs arriving as a Poisson process, 0.5 jobs/min at night and up to 6 jobs/min
+    in the morning and afternoon peaks of the working days
+    :return: the arrival time and duration of each job
+    """
+    rng = random.Random(seed)
+    jobs = []
+    now = 0.0
+    while now < days * DAY:
+        hour = now % DAY / 3600
+        working_day = now // DAY % 7 < 5
+        peak = math.exp(-((hour - 9.5) ** 2) / 2) + math.exp(-((hour - 14) ** 2) / 4)
+        rate = (0.5 + (5.5 * peak if working_day else 0)) / 60
+        now += rng.expovariate(rate)
+        jobs.append((now, rng.expovariate(1 / DEFAULT_DURATION)))
+    return jobs
+
+
+def load_trace(path: str) -> list[tuple[float, float]]:
+    """
+    Read the arrival time of the jobs queued, their duration is the time
+    between their `in_progress` and `completed` events
+    """
+    queued, started, completed = {}, {}, {}
+    with open(path) as f:
+        for line in f:
+            event = json.loads(line)
+            job_id = event["workflow_job"]["id"]
+            {"queued": queued, "in_progress": started, "completed": completed}.get(
+                event["action"], {}
+            )[job_id] = event["timestamp"]
+
+    start = min(queued.values())
+    return sorted(
+        (
+            timestamp - start,
+            completed[job_id] - started[job_id]
+            if job_id in started and job_id in completed
+            else DEFAULT_DURATION,
+        )
+        for job_id, timestamp in queued.items()
+    )
+
+
+def replay(
+    jobs: list[tuple[float, float]], minimum: int, autoscaler: Autoscaler or None
+) -> dict:
+    """
+    Simulate the pool: runners boot in BOOT_TIME, run a single job and are deleted,
+    the reconcile creates the runners missing and deletes the extra ones
+    The jobs still queued at the end of the trace wait until then
+    """
+    end = jobs[-1][0]
+    measure_from = end - DAY
+    events = [(arrival, 1, "queued", duration) for arrival, duration in jobs]
+    events += [
+        (t, 0, "reconcile", None) for t in range(0, int(end), RECONCILE_INTERVAL)
+    ]
+    heapq.heapify(events)
+
+    queue, idle, booting, running = [], [], 0, 0
+    waits, idle_seconds, last = [], 0.0, 0.0
+    while events:
+        now, _, kind, value = heapq.heappop(events)
+        if now >= measure_from:
+            idle_seconds += (len(idle) + booting) * (now - max(last, measure_from))
+        last = now
+
+        if kind == "queued":
+            queue.append((now, value))
+            if autoscaler:
+                autoscaler.record(POOL, "queued", now)
+        elif kind == "booted":
+            booting -= 1
+            idle.append(now)
+        elif kind == "completed":
+            running -= 1
+        elif kind == "reconcile":
+            target = (
+                autoscaler.target(POOL, minimum, MAX, BOOT_TIME, now)
+                if autoscaler
+                else minimum
+            )
+            # Runners waiting for too long over the target are deleted
+            extra = [t for t in idle[target:] if now - t > EXTRA_RUNNER_TIMER]
+            for t in extra:
+                idle.remove(t)
+            missing = min(
+                target - len(idle) - booting, MAX - running - len(idle) - booting
+            )
+            for _ in range(max(missing, 0)):
+                booting += 1
+                heapq.heappush(events, (now + BOOT_TIME, 0, "booted", None))
+
+        while queue and idle:
+            queued_at, duration = queue.pop(0)
+            idle.pop(0)
+            running += 1
+            if autoscaler:
+                autoscaler.record(POOL, "in_progress", now)
+            heapq.heappush(events, (now + duration, 0, "completed", None))
+            if queued_at >= measure_from:
+                waits.append(now - queued_at)
+
+    waits += [end - queued_at for queued_at, _ in queue if queued_at >= measure_from]
+    waits.sort()
+    return {
+        "jobs": len(waits),
+        "mean_wait": sum(waits) / len(waits),
+        "p95_wait": waits[int(len(waits) * 0.95)],
+        "idle_hours": idle_seconds / 3600,
+    }
+
+
+def main():
+    jobs = load_trace(sys.argv[1]) if len(sys.argv) > 1 else generate_trace()
+    results = {
+        f"min {MIN}": replay(jobs, MIN, None),
+        f"min {MIN * 10}": replay(jobs, MIN * 10, None),
+        f"autoscaler, min {MIN}": replay(
+            jobs, MIN, Autoscaler(RedisManager(fakeredis.FakeStrictRedis()))
+        ),
+    }
+    for name, result in results.items():
+        print(
+            f"{name:>18}: {result['jobs']} jobs, wait mean {result['mean_wait']:.0f}s "
+            f"p95 {result['p95_wait']:.0f}s, "
+            f"{result['idle_hours']:.1f} runner hours idle or booting"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Measure the init script renders per second.
+
+Run it from `srcs`:
+    python -m benchmarks.init_script
+"""
+import os
+import time
+
+from jinja2 import Environment
+from jinja2 import FileSystemLoader
+from runners_manager.runner.Runner import Runner
+from runners_manager.vm_creation import CloudManager
+from runners_manager.vm_creation.openstack.OpenstackManager import OpenstackManager
+from runners_manager.vm_creation.VmType import VmType
+
+RENDERS = 2000
+
+CloudManager.TEMPLATES_DIRECTORY = os.path.join(
+    os.path.dirname(__file__), "../../templates"
+)
+
+vm_type = VmType(
+    {
+        "tags": ["centos7", "small"],
+        "config": {"flavor": "m1.small", "image": "CentOS 7 (PVHVM)"},
+        "quantity": {"min": 2, "max": 4},
+    }
+)
+installer = {"download_url": "https://runner.tar.gz", "filename": "runner.tar.gz"}
+
+
+def legacy_render(runner: Runner, token: str) -> str:
+    """The rendering used before the template cache, a new environment each time"""
+    env = Environment(loader=FileSystemLoader(CloudManager.TEMPLATES_DIRECTORY))
+    env.trim_blocks = True
+    env.lstrip_blocks = True
+    return env.get_template("init_runner_script.sh").render(
+        installer=installer,
+        github_organization="org",
+        token=token,
+        name=runner.name,
+        tags=",".join(runner.vm_type.tags),
+        redhat_username="",
+        redhat_password="",
+        group="default",
+        ssh_keys="",
+    )
+
+
+def template_render(runner: Runner, token: str) -> str:
+    """The cached template, rendered for each runner"""
+    return CloudManager.init_script_template().render(
+        installer=installer,
+        github_organization="org",
+        token=token,
+        name=runner.name,
+        tags=",".join(runner.vm_type.tags),
+        redhat_username="",
+        redhat_password="",
+        group="default",
+        ssh_keys="",
+    )
+
+
+def throughput(render, runners: list[Runner]) -> float:
+    start = time.perf_counter()
+    for index, runner in enumerate(runners):
+        render(runner, f"token-{index}")
+    return len(runners) / (time.perf_counter() - start)
+
+
+def main():
+    manager = OpenstackManager(
+        "openstack",
+        {
+            "auth_url": "http://localhost",
+            "region_name": "region",
+            "project_name": "project",
+            "network_name": "network",
+            "username": "user",
+            "password": "password",
+        },
+        "",
+        "",
+        "",
+    )
+    runners = [
+        Runner(f"runner-{i}", None, vm_type, "openstack") for i in range(RENDERS)
+    ]
+
+    def cached_render(runner: Runner, token: str) -> str:
+        return manager.script_init_runner(runner, token, "org", installer)
+
+    print(f"new environment per render: {throughput(legacy_render, runners):.0f}/s")
+    print(f"cached template:            {throughput(template_render, runners):.0f}/s")
+    print(f"pre-rendered pool script:   {throughput(cached_render, runners):.0f}/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Compare the cost of the runner storage operations between the json layout
+and the set / hash layout of RedisManager.
+
+Run it from `srcs`:
+    python -m benchmarks.redis_layout
+Set REDIS_URL to run it against a real redis instead of fakeredis.
+"""
+import json
+import os
+import time
+
+import fakeredis
+import redis
+from runners_manager.runner.RedisManager import RedisManager
+from runners_manager.runner.Runner import Runner
+from runners_manager.vm_creation.VmType import VmType
+
+MANAGER = "managers:bench"
+OPERATIONS = 200
+
+vm_type = VmType(
+    {
+        "tags": ["bench"],
+        "config": {"flavor": "m1.small", "image": "CentOS 7 (PVHVM)"},
+        "quantity": {"min": 0, "max": 0},
+    }
+)
+
+
+def get_client() -> redis.Redis:
+    if os.getenv("REDIS_URL"):
+        return redis.Redis.from_url(os.getenv("REDIS_URL"))
+    return fakeredis.FakeStrictRedis()
+
+
+def timed(operation, runners: list[Runner]) -> float:
+    start = time.perf_counter()
+    for runner in runners:
+        operation(runner)
+    return (time.perf_counter() - start) / len(runners) * 1e6
+
+
+class JsonLayout(object):
+    """The previous layout: a json list per manager and a json string per runner"""
+
+    def __init__(self, client: redis.Redis):
+        self.redis = client
+        self.names = []
+
+    def fill(self, runners: list[Runner]):
+        self.names = [r.redis_key_name() for r in runners]
+        self.redis.mset({r.redis_key_name(): json.dumps(r.toJson()) for r in runners})
+        self.redis.set(MANAGER, json.dumps(self.names))
+
+    def create(self, runner: Runner):
+        self.names.append(runner.redis_key_name())
+        self.redis.set(runner.redis_key_name(), json.dumps(runner.toJson()))
+        self.redis.set(MANAGER, json.dumps(self.names))
+
+    def update_status(self, runner: Runner):
+        self.redis.set(runner.redis_key_name(), json.dumps(runner.toJson()))
+
+    def delete(self, runner: Runner):
+        self.names.remove(runner.redis_key_name())
+        self.redis.delete(runner.redis_key_name())
+        self.redis.set(MANAGER, json.dumps(self.names))
+
+
+class HashLayout(object):
+    """The current layout, used through RedisManager"""
+
+    def __init__(self, client: redis.Redis):
+        self.redis_manager = RedisManager(client)
+
+    def fill(self, runners: list[Runner]):
+        self.redis_manager.save_runners(MANAGER, runners)
+
+    def create(self, runner: Runner):
+        self.redis_manager.update_runner(runner)
+
+    def update_status(self, runner: Runner):
+        self.redis_manager.update_runner(runner, fields=["status"])
+
+    def delete(self, runner: Runner):
+        self.redis_manager.delete_runner(runner)
+
+
+def bench(layout_class, size: int) -> dict[str, float]:
+    client = get_client()
+    client.flushdb()
+    layout = layout_class(client)
+    layout.fill([Runner(f"fill-{i}", None, vm_type, "bench") for i in range(size)])
+
+    runners = [Runner(f"op-{i}", None, vm_type, "bench") for i in range(OPERATIONS)]
+    results = {"create": timed(layout.create, runners)}
+    for runner in runners:
+        runner.status = "online"
+    results["update_status"] = timed(layout.update_status, runners)
+    results["delete"] = timed(layout.delete, runners)
+    return results
+
+
+def main():
+    print(f"{'layout':<8}{'runners':>8}{'create':>12}{'status':>12}{'delete':>12}")
+    for size in [1000, 10000]:
+        for name, layout_class in [("json", JsonLayout), ("hash", HashLayout)]:
+            r = bench(layout_class, size)
+            print(
+                f"{name:<8}{size:>8}{r['create']:>10.1f}us"
+                f"{r['update_status']:>10.1f}us{r['delete']:>10.1f}us"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Measure the decoding throughput of runner records.
+
+Run it from `srcs`:
+    python -m benchmarks.runner_decode
+"""
+import datetime
+import json
+import time
+
+from runners_manager.runner.Runner import LEGACY_DATE_FORMAT
+from runners_manager.runner.Runner import Runner
+from runners_manager.vm_creation.VmType import VmType
+
+RECORDS = 20000
+
+vm_type = VmType.register(
+    VmType(
+        {
+            "tags": ["centos7", "small"],
+            "config": {"flavor": "m1.small", "image": "CentOS 7 (PVHVM)"},
+            "quantity": {"min": 2, "max": 4},
+        }
+    )
+)
+
+
+def legacy_record(runner: Runner) -> dict:
+    """A runner record as written before the compact format"""
+    return {
+        "name": runner.name,
+        "status": runner.status,
+        "status_history": runner.status_history,
+        "action_id": runner.action_id,
+        "vm_id": runner.vm_id,
+        "cloud": runner.cloud,
+        "vm_type": runner.vm_type.toJson(),
+        "created_at": str(runner.created_at),
+        "started_at": str(runner.started_at),
+    }
+
+
+def legacy_decode(data: dict) -> Runner:
+    """The decoder used before the compact format"""
+    runner = Runner(data["name"], data["vm_id"], VmType(data["vm_type"]), data["cloud"])
+    runner.status = data["status"]
+    runner.status_history = data["status_history"]
+    runner.action_id = data["action_id"]
+    runner.created_at = datetime.datetime.strptime(
+        data["created_at"], LEGACY_DATE_FORMAT
+    )
+    runner.started_at = datetime.datetime.strptime(
+        data["started_at"], LEGACY_DATE_FORMAT
+    )
+    return runner
+
+
+def throughput(decode, payloads: list[str]) -> float:
+    start = time.perf_counter()
+    for payload in payloads:
+        decode(json.loads(payload))
+    return len(payloads) / (time.perf_counter() - start)
+
+
+def main():
+    runners = []
+    for i in range(RECORDS):
+        runner = Runner(f"runner-{i}", f"vm-{i}", vm_type, "openstack")
+        runner.update_status("online")
+        runner.action_id = i
+        runners.append(runner)
+
+    legacy = [json.dumps(legacy_record(r)) for r in runners]
+    compact = [json.dumps(r.toJson()) for r in runners]
+
+    print(f"legacy record size:  {sum(map(len, legacy)) / RECORDS:.0f} bytes")
+    print(f"compact record size: {sum(map(len, compact)) / RECORDS:.0f} bytes")
+    print(
+        f"legacy decoder, legacy records:   {throughput(legacy_decode, legacy):.0f}/s"
+    )
+    print(
+        f"Runner.fromJson, legacy records:  {throughput(Runner.fromJson, legacy):.0f}/s"
+    )
+    print(
+        f"Runner.fromJson, compact records: {throughput(Runner.fromJson, compact):.0f}/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
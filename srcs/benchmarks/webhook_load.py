@@ -0,0 +1,136 @@
+"""
+Load test of the webhook intake at 10k workflow job events per minute.
+
+Run it from `srcs`:
+    python -m benchmarks.webhook_load [seconds, 60 by default]
+Set REDIS_URL to queue the events in a real redis. fakeredis has no streams,
+without it the events are handled right after the deduplication.
+
+Each job sends its queued, in_progress and completed events in a burst and 10%
+of the deliveries are sent twice. Handling an event notifies the reconcile
+scheduler like a runner status update, the reconciles run are counted.
+"""
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+import fakeredis
+import redis
+from runners_manager.runner.EventQueue import EventQueue
+from runners_manager.runner.ReconcileScheduler import ReconcileScheduler
+from runners_manager.runner.RedisManager import RedisManager
+
+RATE = 10000 / 60
+REDELIVERIES = 0.1
+RECONCILE_TIME = 0.05
+
+
+class CountingManager(object):
+    """Stands for the Manager, a reconcile takes RECONCILE_TIME"""
+
+    def __init__(self):
+        self.reconciles = 0
+
+    def manage_runners(self):
+        self.reconciles += 1
+        time.sleep(RECONCILE_TIME)
+
+
+def deliveries(count: int, rng: random.Random):
+    """
+    The deliveries of the workflow job events, with the redeliveries
+    """
+    job_id = 0
+    sent = 0
+    while sent < count:
+        job_id += 1
+        for action in ["queued", "in_progress", "completed"]:
+            delivery = str(uuid.UUID(int=rng.getrandbits(128)))
+            payload = json.dumps({"action": action, "workflow_job": {"id": job_id}})
+            for _ in range(2 if rng.random() < REDELIVERIES else 1):
+                if sent == count:
+                    return
+                yield delivery, action, job_id, payload
+                sent += 1
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 60
+    client = (
+        redis.Redis.from_url(os.getenv("REDIS_URL"))
+        if os.getenv("REDIS_URL")
+        else fakeredis.FakeStrictRedis()
+    )
+    manager = CountingManager()
+    scheduler = ReconcileScheduler(manager)
+    # Only the events trigger reconciles
+    scheduler.next_poll = time.monotonic() + 3600
+    scheduler.start()
+
+    handled = 0
+    lock = threading.Lock()
+
+    def handler(event: str, payload: str):
+        nonlocal handled
+        with lock:
+            handled += 1
+        scheduler.notify()
+
+    redis_manager = RedisManager(client)
+    queue = EventQueue(redis_manager, handler)
+    streams = bool(os.getenv("REDIS_URL"))
+    if streams:
+        queue.start()
+
+    def intake(payload: str, job_id: int, delivery_keys: list[str]) -> bool:
+        if streams:
+            return (
+                queue.put("workflow_job", payload, str(job_id), delivery_keys)
+                is not None
+            )
+        # Only the deduplication of EventQueue.put
+        if redis_manager.mark_delivered(
+            [f"delivered:{key}" for key in delivery_keys], queue.dedupe_ttl
+        ):
+            handler("workflow_job", payload)
+            return True
+        return False
+
+    count = int(seconds * RATE)
+    latencies, queued = [], 0
+    start = time.monotonic()
+    for index, (delivery, action, job_id, payload) in enumerate(
+        deliveries(count, random.Random(42))
+    ):
+        # Send at RATE events per second
+        delay = start + index / RATE - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        sent_at = time.perf_counter()
+        if intake(payload, job_id, [delivery, f"job:{job_id}:1:{action}"]):
+            queued += 1
+        latencies.append(time.perf_counter() - sent_at)
+    elapsed = time.monotonic() - start
+
+    while handled < queued and time.monotonic() - start < seconds + 30:
+        time.sleep(0.1)
+    time.sleep(scheduler.coalesce_window + RECONCILE_TIME)
+    queue.stop()
+    scheduler.stop()
+
+    latencies.sort()
+    print(f"{count} events sent in {elapsed:.1f}s: {count / elapsed * 60:.0f}/min")
+    print(f"{count - queued} duplicates dropped, {handled}/{queued} events handled")
+    print(
+        f"intake latency p50 {latencies[len(latencies) // 2] * 1000:.2f}ms "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f}ms"
+    )
+    print(f"{manager.reconciles} reconciles for {handled} events")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,5 @@
 import importlib
 import logging
-import time
 
 import redis
 from runners_manager.runner.Manager import Manager
@@ -13,17 +12,10 @@ logger = logging.getLogger("runner_manager")
 
 
 def maintain_number_of_runner(runner_m: Manager, github_manager: GithubManager):
-    while True:
-        runners = github_manager.get_runners(runner_m.factory.runner_prefix)
-        logger.info(f"nb runners: {len(runners['runners'])}")
-        logger.info(
-            f"offline: {len([e for e in runners['runners'] if e['status'] == 'offline'])}"
-        )
-
-        logger.debug(runners)
-        runner_m.update_all_runners(runners["runners"])
-
-        time.sleep(10)
+    """
+    Reconcile runners forever, without webhooks only the adaptive full poll runs
+    """
+    runner_m.scheduler.run_forever()
 
 
 def get_cloud_manager(settings: dict, args: EnvSettings) -> CloudManager:
@@ -31,13 +23,15 @@ def get_cloud_manager(settings: dict, args: EnvSettings) -> CloudManager:
         f'runners_manager.vm_creation.{settings["cloud_name"]}'
     )
 
-    return cloud_module.CloudManager(
+    cloud_manager = cloud_module.CloudManager(
         name=settings["cloud_name"],
         settings=settings["cloud_config"],
         redhat_username=args.redhat_username,
         redhat_password=args.redhat_password,
         ssh_keys=settings["allowed_ssh_keys"],
     )
+    cloud_manager.reload_init_script = args.init_script_reload
+    return cloud_manager
 
 
 def init(settings: dict, args: EnvSettings):
@@ -5,9 +5,11 @@ from fastapi.requests import Request
 from fastapi.responses import Response
 from prometheus_client import CollectorRegistry
 from prometheus_client import CONTENT_TYPE_LATEST
+from prometheus_client import Counter
 from prometheus_client import Enum
 from prometheus_client import Gauge
 from prometheus_client import generate_latest
+from prometheus_client import Histogram
 from prometheus_client import REGISTRY
 from prometheus_client.multiprocess import MultiProcessCollector
 
@@ -53,16 +55,171 @@ class Metrics(object):
             labelnames=self.default_labels,
         )
 
-        self.runner_creation_time_seconds = Gauge(
-            "runner_manager_resource_creation_time",
-            "Metrics displaying the time to create the runner resource",
+        self.runner_creation_time_seconds = Histogram(
+            "runner_manager_resource_creation_time_seconds",
+            "Metrics displaying the time to create the VM of a runner",
+            labelnames=self.default_labels + ["pool"],
+            buckets=(5, 10, 20, 30, 60, 90, 120, 180, 300, 600),
+        )
+
+        self.runner_delete_time_seconds = Histogram(
+            "runner_manager_resource_delete_time_seconds",
+            "Metrics displaying the time to delete the VM of a runner",
+            labelnames=self.default_labels + ["pool"],
+            buckets=(0.5, 1, 2, 5, 10, 20, 30, 60, 120),
+        )
+
+        self.runner_bulk_delete_time_seconds = Histogram(
+            "runner_manager_bulk_delete_time_seconds",
+            "Metrics displaying the time to delete a group of runners",
             labelnames=self.default_labels,
+            buckets=(1, 5, 10, 30, 60, 120, 300, 600),
+        )
+
+        self.runner_delete_results = Counter(
+            "runner_manager_runner_delete_results",
+            "Metrics counting the runners deleted by result",
+            labelnames=self.default_labels + ["result"],
+        )
+
+        self.runner_time_to_online_seconds = Histogram(
+            "runner_manager_runner_time_to_online_seconds",
+            "Metrics displaying the time for a new runner to be online on GitHub",
+            labelnames=self.default_labels + ["baked"],
+            buckets=(30, 60, 90, 120, 180, 240, 300, 450, 600, 900),
         )
 
-        self.runner_delete_time_seconds = Gauge(
-            "runner_manager_resource_delete_time",
-            "Metrics displaying the time to delete the runner resource",
+        self.runner_bake_time_seconds = Histogram(
+            "runner_manager_runner_bake_time_seconds",
+            "Metrics displaying the time to bake the image of a runner pool",
             labelnames=self.default_labels,
+            buckets=(300, 600, 900, 1200, 1800, 2700, 3600),
+        )
+
+        self.runner_autoscaler_target = Gauge(
+            "runner_manager_runner_autoscaler_target",
+            "Metrics displaying the number of runners waiting forecast for a runner pool",
+            labelnames=self.default_labels + ["pool"],
+        )
+
+        self.runner_warm_vms = Gauge(
+            "runner_manager_runner_warm_vms",
+            "Metrics displaying the number of warm VMs ready for a runner pool",
+            labelnames=self.default_labels + ["pool"],
+        )
+
+        self.runner_creation_queue_depth = Gauge(
+            "runner_manager_runner_creation_queue_depth",
+            "Metrics displaying the number of VM creations waiting for a worker",
+            labelnames=self.default_labels,
+        )
+
+        self.runner_creation_in_flight = Gauge(
+            "runner_manager_runner_creation_in_flight",
+            "Metrics displaying the number of VM creations running",
+            labelnames=self.default_labels,
+        )
+
+        self.job_wait_seconds = Histogram(
+            "runner_manager_job_wait_seconds",
+            "Metrics displaying the time a job waited between queued and in progress",
+            labelnames=self.default_labels + ["pool"],
+            buckets=(5, 10, 30, 60, 120, 300, 600, 900, 1800, 3600),
+        )
+
+        self.manage_runners_duration_seconds = Histogram(
+            "runner_manager_manage_runners_duration_seconds",
+            "Metrics displaying the time to reconcile every runner pool",
+            labelnames=self.default_labels,
+            buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+        )
+
+        self.manage_pool_duration_seconds = Histogram(
+            "runner_manager_manage_pool_duration_seconds",
+            "Metrics displaying the time to reconcile a runner pool",
+            labelnames=self.default_labels + ["pool"],
+            buckets=(0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+        )
+
+        self.redis_command_seconds = Histogram(
+            "runner_manager_redis_command_seconds",
+            "Metrics displaying the latency of the redis commands and pipelines",
+            labelnames=["command"],
+            buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1),
+        )
+
+        self.github_request_seconds = Histogram(
+            "runner_manager_github_request_seconds",
+            "Metrics displaying the latency of the GitHub API calls",
+            labelnames=["endpoint"],
+            buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+        )
+
+        self.redis_round_trips_saved = Counter(
+            "runner_manager_redis_round_trips_saved",
+            "Metrics counting the redis round trips saved by batching writes",
+        )
+
+        self.github_cache_hits = Counter(
+            "runner_manager_github_cache_hits",
+            "Metrics counting the GitHub responses served from the cache",
+            labelnames=["endpoint"],
+        )
+
+        self.github_cache_misses = Counter(
+            "runner_manager_github_cache_misses",
+            "Metrics counting the GitHub responses not found in the cache",
+            labelnames=["endpoint"],
+        )
+
+        self.github_rate_limit_remaining = Gauge(
+            "runner_manager_github_rate_limit_remaining",
+            "Metrics displaying the GitHub API calls left before the rate limit reset",
+        )
+
+        self.github_rate_limit_limit = Gauge(
+            "runner_manager_github_rate_limit_limit",
+            "Metrics displaying the GitHub API calls allowed per rate limit window",
+        )
+
+        self.github_rate_limit_reset = Gauge(
+            "runner_manager_github_rate_limit_reset",
+            "Metrics displaying the timestamp of the next GitHub rate limit reset",
+        )
+
+        self.github_rate_limit_waits = Counter(
+            "runner_manager_github_rate_limit_waits",
+            "Metrics counting the GitHub API calls delayed to save the rate limit",
+            labelnames=["priority"],
+        )
+
+        self.event_queue_lag_seconds = Gauge(
+            "runner_manager_event_queue_lag_seconds",
+            "Metrics displaying the time the last webhook event handled waited in its stream",
+            labelnames=["stream"],
+        )
+
+        self.event_queue_duplicates = Counter(
+            "runner_manager_event_queue_duplicates",
+            "Metrics counting the webhook deliveries dropped as already queued",
+        )
+
+        self.event_queue_dead_letters = Counter(
+            "runner_manager_event_queue_dead_letters",
+            "Metrics counting the webhook events moved to the dead letters after failing",
+            labelnames=["stream"],
+        )
+
+        self.event_queue_wait_seconds = Histogram(
+            "runner_manager_event_queue_wait_seconds",
+            "Metrics displaying the time the webhook events wait before being handled",
+            buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300),
+        )
+
+        self.reconcile_latency_seconds = Histogram(
+            "runner_manager_reconcile_latency_seconds",
+            "Metrics displaying the time between an event and the end of its reconcile",
+            buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
         )
 
 
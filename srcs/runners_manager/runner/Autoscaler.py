@@ -0,0 +1,154 @@
+import logging
+import math
+import time
+
+from runners_manager.runner.RedisManager import RedisManager
+
+logger = logging.getLogger("runner_manager")
+
+DAY = 24 * 60 * 60
+
+
+class Autoscaler(object):
+    """
+    Forecast the number of runners waiting each pool needs from its jobs history
+
+    The `queued` and `in_progress` workflow job events of each pool are counted
+    in redis in time buckets of `bucket_seconds`, kept `history_days` days.
+    The arrival rate of the jobs is the rate of the last `window` seconds,
+    blended by `seasonality` with the rate seen at the same time of day the previous days.
+    By Little's law, rate × boot time jobs arrive while a runner boots:
+    that many runners should be waiting, plus one for each job still queued.
+    """
+
+    ACTIONS = ("queued", "in_progress")
+
+    bucket_seconds: int
+    window: int
+    history_days: int
+    seasonality: float
+    boot_time: float
+
+    def __init__(
+        self,
+        redis: RedisManager,
+        bucket_seconds: int = 300,
+        window: int = 900,
+        history_days: int = 7,
+        seasonality: float = 0.5,
+        boot_time: float = 300,
+    ):
+        """
+        :param boot_time: seconds for a runner to be online, until a runner of the pool
+            was seen booting
+        """
+        self.redis = redis
+        self.bucket_seconds = bucket_seconds
+        self.window = window
+        self.history_days = history_days
+        self.seasonality = seasonality
+        self.boot_time = boot_time
+
+    def bucket(self, timestamp: float) -> int:
+        return int(timestamp // self.bucket_seconds)
+
+    def day(self, bucket: int) -> int:
+        return bucket * self.bucket_seconds // DAY
+
+    def record(self, pool_id: str, action: str, now: float = None) -> None:
+        """
+        Count a workflow job event of the pool
+        """
+        if action not in self.ACTIONS:
+            return
+        bucket = self.bucket(now if now is not None else time.time())
+        self.redis.count_job(
+            pool_id,
+            f"{action}:{bucket}",
+            self.day(bucket),
+            (self.history_days + 1) * DAY,
+        )
+
+    def counts(self, pool_id: str, ranges: list[tuple[float, float]]) -> list[dict]:
+        """
+        Sum the events of each time range in a single redis round trip
+        :return: for each range the count of each action, None if nothing was recorded
+            on the day of the range
+        """
+        fields = {}
+        for start, end in ranges:
+            for bucket in range(self.bucket(start), self.bucket(end - 1) + 1):
+                fields.setdefault(self.day(bucket), set()).update(
+                    f"{action}:{bucket}" for action in self.ACTIONS
+                )
+        days = self.redis.get_job_counts(
+            pool_id, {day: sorted(names) for day, names in fields.items()}
+        )
+
+        results = []
+        for start, end in ranges:
+            buckets = range(self.bucket(start), self.bucket(end - 1) + 1)
+            if all(days[self.day(bucket)] is None for bucket in buckets):
+                results.append(None)
+                continue
+            results.append(
+                {
+                    action: sum(
+                        (days[self.day(bucket)] or {}).get(f"{action}:{bucket}", 0)
+                        for bucket in buckets
+                    )
+                    for action in self.ACTIONS
+                }
+            )
+        return results
+
+    def forecast(
+        self, pool_id: str, boot_time: float, now: float = None
+    ) -> tuple[float, int]:
+        """
+        Return the jobs arrival rate expected while a runner boots, in jobs per second,
+        and the number of jobs queued during the last window and not started yet
+        """
+        now = now if now is not None else time.time()
+        horizon = max(boot_time, self.window)
+        # The recent window starts on a bucket, the current bucket is not complete
+        start = self.bucket(now - self.window) * self.bucket_seconds
+        ranges = [(start, now)] + [
+            (now - day * DAY, now - day * DAY + horizon)
+            for day in range(1, self.history_days + 1)
+        ]
+        recent, *history = self.counts(pool_id, ranges)
+
+        recent = recent or {action: 0 for action in self.ACTIONS}
+        rate = recent["queued"] / max(now - start, 1)
+        backlog = max(recent["queued"] - recent["in_progress"], 0)
+
+        history = [counts for counts in history if counts is not None]
+        if history:
+            seasonal = sum(counts["queued"] for counts in history) / (
+                len(history) * horizon
+            )
+            rate = (1 - self.seasonality) * rate + self.seasonality * seasonal
+        return rate, backlog
+
+    def target(
+        self,
+        pool_id: str,
+        minimum: int,
+        maximum: int,
+        boot_time: float or None = None,
+        now: float = None,
+    ) -> int:
+        """
+        Return the number of runners the pool should keep waiting,
+        between `minimum` and `maximum` (0 for no maximum)
+        """
+        boot_time = boot_time or self.boot_time
+        rate, backlog = self.forecast(pool_id, boot_time, now)
+        target = max(math.ceil(rate * boot_time) + backlog, minimum)
+        if maximum > 0:
+            target = min(target, maximum)
+        logger.debug(
+            f"{pool_id}: {rate * 60:.2f} jobs/min, {backlog} queued, target {target}"
+        )
+        return target
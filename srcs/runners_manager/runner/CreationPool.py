@@ -0,0 +1,178 @@
+import logging
+import threading
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+
+from runners_manager.monitoring.prometheus import metrics
+
+logger = logging.getLogger("runner_manager")
+
+
+class CreationPool(object):
+    """
+    Run the VM creations of a cloud in a bounded pool of threads
+
+    At most `max_queue_depth` creations are queued or running, the next ones are refused.
+    Each runner pool runs at most `pool_concurrency` creations at the same time (0 for
+    no limit), so a large scale-up of one pool does not delay the others.
+    A task can create the VMs of several runners, each of them counts in the limits,
+    the batches are sized with `pool_capacity` to not go over `pool_concurrency`.
+    A queued creation can be cancelled, a running one is flagged and the task
+    is expected to clean up its VM when it checks `cancelled`.
+    """
+
+    name: str
+    max_workers: int
+    max_queue_depth: int
+    pool_concurrency: int
+
+    def __init__(
+        self,
+        name: str,
+        max_workers: int = 10,
+        max_queue_depth: int = 100,
+        pool_concurrency: int = 0,
+    ):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        self.pool_concurrency = pool_concurrency
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=f"create-{name}"
+        )
+        self.lock = threading.Lock()
+        self.queued: dict[str, deque] = {}
+        self.in_flight: dict[str, set] = {}
+        self.tasks: dict[str, Future] = {}
+        self.cancelled_keys = set()
+
+    def capacity(self) -> int:
+        """
+        Return the number of creations the queue still accepts
+        """
+        with self.lock:
+            return max(self.max_queue_depth - len(self.tasks), 0)
+
+    def pool_capacity(self, pool_id: str) -> int:
+        """
+        Return the number of creations of a runner pool which can start right away,
+        the queued creations cancelled are not counted
+        """
+        with self.lock:
+            free = self.max_queue_depth - len(self.tasks.keys() - self.cancelled_keys)
+            if self.pool_concurrency:
+                queued = sum(
+                    len(set(keys) - self.cancelled_keys)
+                    for keys, future, *_ in self.queued.get(pool_id, ())
+                    if not future.cancelled()
+                )
+                running = len(self.in_flight.get(pool_id, ()))
+                free = min(free, self.pool_concurrency - running - queued)
+            return max(free, 0)
+
+    def submit(self, key: str, pool_id: str, fn: Callable, *args) -> Future or None:
+        """
+        Queue a creation, return None when the queue is full
+        """
+        return self.submit_batch([key], pool_id, fn, *args)
+
+    def submit_batch(
+        self, keys: list[str], pool_id: str, fn: Callable, *args
+    ) -> Future or None:
+        """
+        Queue a task creating several VMs, each key counts as one creation
+        Return None when the queue can't take all of them
+        """
+        keys = tuple(keys)
+        with self.lock:
+            if len(self.tasks) + len(keys) > self.max_queue_depth:
+                logger.warning(f"Creation queue full, {', '.join(keys)} not created")
+                return None
+
+            future = Future()
+            for key in keys:
+                self.tasks[key] = future
+            self.queued.setdefault(pool_id, deque()).append((keys, future, fn, args))
+            self._dispatch(pool_id)
+            self._export()
+        return future
+
+    def cancel(self, key: str) -> bool:
+        """
+        Cancel a creation, return False if it is unknown or already finished
+        A creation sharing its task with others is only flagged
+        """
+        with self.lock:
+            future = self.tasks.get(key)
+            if future is None:
+                return False
+            shared = sum(1 for f in self.tasks.values() if f is future) > 1
+            if not shared and future.cancel():
+                self.tasks.pop(key)
+                self._export()
+            else:
+                self.cancelled_keys.add(key)
+            return True
+
+    def pending(self, key: str) -> bool:
+        """
+        Return True if a creation with this key is queued or running
+        """
+        with self.lock:
+            return key in self.tasks
+
+    def cancelled(self, key: str) -> bool:
+        return key in self.cancelled_keys
+
+    def _dispatch(self, pool_id: str) -> None:
+        queue = self.queued.get(pool_id)
+        running = self.in_flight.setdefault(pool_id, set())
+        while queue and (
+            not self.pool_concurrency or len(running) < self.pool_concurrency
+        ):
+            keys, future, fn, args = queue.popleft()
+            # Skip the creations cancelled while queued
+            if not future.set_running_or_notify_cancel():
+                continue
+            running.update(keys)
+            self.executor.submit(self._run, pool_id, keys, future, fn, args)
+
+    def _run(
+        self, pool_id: str, keys: tuple[str], future: Future, fn: Callable, args
+    ) -> None:
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            logger.error(f"Creation of {', '.join(keys)} failed: {e}")
+            future.set_exception(e)
+        finally:
+            with self.lock:
+                for key in keys:
+                    self.in_flight[pool_id].discard(key)
+                    self.tasks.pop(key, None)
+                    self.cancelled_keys.discard(key)
+                self._dispatch(pool_id)
+                self._export()
+
+    def _export(self) -> None:
+        in_flight = sum(len(keys) for keys in self.in_flight.values())
+        metrics.runner_creation_in_flight.labels(cloud=self.name).set(in_flight)
+        metrics.runner_creation_queue_depth.labels(cloud=self.name).set(
+            len(self.tasks) - in_flight
+        )
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Cancel the queued creations and stop the workers
+        """
+        with self.lock:
+            for queue in self.queued.values():
+                for keys, future, fn, args in queue:
+                    future.cancel()
+                    for key in keys:
+                        self.tasks.pop(key, None)
+                queue.clear()
+            self._export()
+        self.executor.shutdown(wait=wait)
@@ -0,0 +1,194 @@
+import logging
+import os
+import socket
+import threading
+import time
+import zlib
+from collections.abc import Callable
+
+from runners_manager.monitoring.prometheus import metrics
+from runners_manager.runner.RedisManager import RedisManager
+
+logger = logging.getLogger("runner_manager")
+
+
+class EventQueue(object):
+    """
+    Durable queue of the webhook events, kept in redis streams
+
+    An event is appended to one of `shards` streams picked from its key,
+    so the events with the same key are handled in order, but for the retries
+    of the failed ones.
+    Each stream is read in a consumer group by one worker thread of the process.
+    An event is acknowledged once handled, the events read but not acknowledged
+    for `claim_idle` seconds, failed or read by a worker which died, are claimed
+    and handled again: every event is handled at least once.
+    An event delivered `max_deliveries` times without success is moved
+    to the dead letter stream `<stream>:dead` and acknowledged.
+    The redeliveries of an event, recognized by its delivery keys, are dropped
+    for `dedupe_ttl` seconds.
+    """
+
+    GROUP = "runner-manager"
+
+    shards: int
+    max_length: int
+    claim_idle: float
+    dedupe_ttl: int
+    max_deliveries: int
+    block: float
+    batch: int
+    consumer: str
+
+    def __init__(
+        self,
+        redis: RedisManager,
+        handler: Callable[[str, str], None],
+        shards: int = 1,
+        max_length: int = 10000,
+        claim_idle: float = 60,
+        dedupe_ttl: int = 60 * 60,
+        max_deliveries: int = 5,
+        block: float = 1,
+        batch: int = 10,
+    ):
+        """
+        :param handler: called with the event name and its payload
+        """
+        self.redis = redis
+        self.handler = handler
+        self.shards = shards
+        self.max_length = max_length
+        self.claim_idle = claim_idle
+        self.dedupe_ttl = dedupe_ttl
+        self.max_deliveries = max_deliveries
+        self.block = block
+        self.batch = batch
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self.threads = []
+        self.stopped = threading.Event()
+
+    def stream(self, key: str) -> str:
+        return f"events:{zlib.crc32(key.encode()) % self.shards}"
+
+    def put(
+        self, event: str, payload: str, key: str = "", delivery_keys: list[str] = ()
+    ) -> str or None:
+        """
+        Queue an event, the events sharing a key are handled in order
+        The event is dropped if one of its delivery keys was already queued
+        :return: the id of the event in its stream, None for a duplicate
+        """
+        delivered = [f"delivered:{delivery}" for delivery in delivery_keys]
+        if delivered and not self.redis.mark_delivered(delivered, self.dedupe_ttl):
+            logger.info(f"Event {event} {', '.join(delivery_keys)} already queued")
+            metrics.event_queue_duplicates.inc()
+            return None
+
+        try:
+            return self.redis.add_event(
+                self.stream(key),
+                {"event": event, "payload": payload},
+                self.max_length,
+            )
+        except Exception:
+            # Let the redelivery of the event in
+            if delivered:
+                self.redis.forget_delivered(delivered)
+            raise
+
+    def start(self) -> None:
+        """
+        Start a worker thread for each stream
+        """
+        if self.threads:
+            return
+        self.stopped.clear()
+        for shard in range(self.shards):
+            thread = threading.Thread(
+                target=self.run,
+                args=(f"events:{shard}",),
+                name=f"events-{shard}",
+                daemon=True,
+            )
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.threads = []
+
+    def handle(
+        self, stream: str, event_id: str, fields: dict[str, str], deliveries: int = 1
+    ) -> None:
+        """
+        Handle an event and acknowledge it,
+        an event failing is left pending to be claimed and handled again
+        :param deliveries: the number of times the event was read, this one included
+        """
+        if deliveries > self.max_deliveries:
+            logger.error(
+                f"Event {event_id} of {stream} failed {deliveries - 1} times, "
+                "moved to the dead letters"
+            )
+            self.redis.dead_letter_event(
+                stream, self.GROUP, event_id, fields, self.max_length
+            )
+            metrics.event_queue_dead_letters.labels(stream=stream).inc()
+            return
+
+        # The ids of the events are the time they were added, in milliseconds
+        lag = max(time.time() - int(event_id.split("-")[0]) / 1000, 0)
+        metrics.event_queue_lag_seconds.labels(stream=stream).set(lag)
+        metrics.event_queue_wait_seconds.observe(lag)
+        try:
+            self.handler(fields["event"], fields["payload"])
+        except Exception as e:
+            logger.error(f"Event {event_id} of {stream} failed: {e}")
+            return
+        self.redis.ack_event(stream, self.GROUP, event_id)
+
+    def poll(self, stream: str, claim: bool = False) -> int:
+        """
+        Handle the next events of a stream,
+        with `claim` the events left by other workers are handled first
+        :return: the number of events handled
+        """
+        events = []
+        if claim:
+            events = self.redis.claim_events(
+                stream,
+                self.GROUP,
+                self.consumer,
+                int(self.claim_idle * 1000),
+                self.batch,
+            )
+        if not events:
+            events = [
+                (event_id, fields, 1)
+                for event_id, fields in self.redis.read_events(
+                    stream,
+                    self.GROUP,
+                    self.consumer,
+                    self.batch,
+                    int(self.block * 1000),
+                )
+            ]
+        for event_id, fields, deliveries in events:
+            self.handle(stream, event_id, fields, deliveries)
+        return len(events)
+
+    def run(self, stream: str) -> None:
+        next_claim = 0
+        while not self.stopped.is_set():
+            try:
+                if next_claim == 0:
+                    self.redis.create_event_group(stream, self.GROUP)
+                claim = time.monotonic() >= next_claim
+                if claim:
+                    next_claim = time.monotonic() + self.claim_idle
+                self.poll(stream, claim)
+            except Exception as e:
+                logger.error(f"Reading the events of {stream} failed: {e}")
+                next_claim = 0
+                self.stopped.wait(self.block)
@@ -1,6 +1,10 @@
 import datetime
+import itertools
 import logging
 
+from runners_manager.monitoring.prometheus import metrics
+from runners_manager.runner.Autoscaler import Autoscaler
+from runners_manager.runner.ReconcileScheduler import ReconcileScheduler
 from runners_manager.runner.RedisManager import RedisManager
 from runners_manager.runner.Runner import Runner
 from runners_manager.runner.RunnerFactory import RunnerFactory
@@ -20,9 +24,14 @@ class Manager(object):
 
     factory: RunnerFactory
     runner_managers: list[RunnerManager]
+    runner_index: dict[str, RunnerManager]
+    pool_index: dict[tuple[bool or None, frozenset[str]], RunnerManager]
     extra_runner_online_timer: datetime.timedelta
     timeout_runner_timer: datetime.timedelta
     redis: RedisManager
+    github_runners_etag: str or None
+    scheduler: ReconcileScheduler
+    autoscaler: Autoscaler or None
 
     def __init__(
         self,
@@ -32,11 +41,22 @@ class Manager(object):
         r: RedisManager,
     ):
         self.factory = RunnerFactory(
-            cloud_manager, github_manager, settings["github_organization"], r
+            cloud_manager,
+            github_manager,
+            settings["github_organization"],
+            r,
+            creation_pool=settings.get("creation_pool"),
         )
         self.runner_managers = []
+        self.runner_index = {}
         for v_type in settings["runner_pool"]:
-            self.runner_managers.append(RunnerManager(VmType(v_type), self.factory, r))
+            self.runner_managers.append(
+                RunnerManager(VmType(v_type), self.factory, r, self.runner_index)
+            )
+        self.pool_index = self.index_pools()
+        vm_types = [manager.vm_type for manager in self.runner_managers]
+        cloud_manager.warm_up(vm_types, self.factory.runner_prefix)
+        self.factory.load_baked_images(vm_types)
 
         self.extra_runner_online_timer = datetime.timedelta(
             **settings["extra_runner_timer"]
@@ -45,6 +65,13 @@ class Manager(object):
             **settings["timeout_runner_timer"]
         )
         self.redis = r
+        self.github_runners_etag = None
+        self.scheduler = ReconcileScheduler(self, **settings.get("reconcile", {}))
+        self.autoscaler = (
+            Autoscaler(r, **settings["autoscaler"])
+            if settings.get("autoscaler")
+            else None
+        )
         self.synchronize_managed_runner_with_local_settings()
 
     def get_runner_manager_not_on_demand(
@@ -65,11 +92,53 @@ class Manager(object):
             if runner_m.vm_type.on_demand is True and condition(runner_m)
         ]
 
-    def remove_all_runners(self):
+    def index_pools(self) -> dict[tuple[bool or None, frozenset[str]], RunnerManager]:
+        """
+        Map every subset of the tags of each pool to the smallest pool having them,
+        among all the pools (None) and among the pools with the same on demand flag
+        """
+        index = {}
+        # Sorting is stable, between pools of the same size the first configured wins
+        for manager in sorted(self.runner_managers, key=lambda m: len(m.vm_type.tags)):
+            tags = manager.vm_type.tags
+            for size in range(len(tags) + 1):
+                for subset in itertools.combinations(tags, size):
+                    for on_demand in (None, manager.vm_type.on_demand):
+                        index.setdefault((on_demand, frozenset(subset)), manager)
+        return index
+
+    def find_pool(
+        self,
+        labels: list[str],
+        on_demand: bool or None = None,
+        best_match: bool = False,
+    ) -> RunnerManager or None:
+        """
+        Return the pool with these tags, whatever their order, "self-hosted" apart
+        :param on_demand: only look at the pools on demand, or not on demand
+        :param best_match: return the smallest pool having all the tags,
+            the pool a runner would be picked from for a job with these labels
+        """
+        tags = frozenset(labels) - {"self-hosted"}
+        manager = self.pool_index.get((on_demand, tags))
+        if manager is None or best_match:
+            return manager
+        # The smallest pool with the tags has exactly them if such a pool exists
+        return manager if len(manager.vm_type.tags) == len(tags) else None
+
+    def remove_all_runners(self) -> dict[str, bool]:
+        """
+        Delete every runner not running a job
+        :return: for each runner name, True if it was deleted
+        """
+        report = {}
         for manager in self.runner_managers:
-            for runner in manager.get_runners().values():
-                if not runner.is_running:
-                    manager.delete_runner(runner)
+            report.update(
+                manager.delete_runners(
+                    [r for r in manager.get_runners().values() if not r.is_running]
+                )
+            )
+        return report
 
     def synchronize_managed_runner_with_local_settings(self):
         for key_runners_manager in self.redis.get_all_runners_managers():
@@ -78,66 +147,112 @@ class Manager(object):
             if key_runners_manager not in [
                 rm.redis_key_name() for rm in self.runner_managers
             ]:
-                for name, runner in self.redis.get_runners(key_runners_manager).items():
-                    self.factory.delete_runner(runner)
-                    self.redis.delete_runner(runner)
-                self.redis.delete_runners_manager(key_runners_manager)
+                runners = list(self.redis.get_runners(key_runners_manager).values())
+                self.factory.delete_runners(runners)
+                with self.redis.batch():
+                    for runner in runners:
+                        self.redis.delete_runner(runner)
+                    self.redis.delete_runners_manager(key_runners_manager)
+
+        # The warm VMs of the pools removed from the settings
+        pool_ids = [rm.vm_type.pool_id for rm in self.runner_managers]
+        for pool_id in self.redis.get_warm_pools():
+            if pool_id not in pool_ids:
+                self.factory.delete_warm_vms(self.redis.pop_warm_vms(pool_id))
 
-    def update_all_runners(self, github_runners: list[dict]):
+    def update_all_runners(self, github_runners: list[dict], etag: str = None):
         """
         Here we update runners states with github api data
         And recalculate the need to spawn or delete runners
         :param github_runners:  Github api infos about self-hosted runners
+        :param etag: ETag of the runners list, when it is the same as the last one
+            the runners are already up to date with github and are not updated again.
+            Pools are still reconciled, some decisions depend on timers.
         """
-        for runner_manager in self.runner_managers:
-            runner_manager.update_runners(github_runners)
+        if etag is not None and etag == self.github_runners_etag:
+            logger.info("Runners list not modified on GitHub")
+        else:
+            with self.redis.batch():
+                for runner_manager in self.runner_managers:
+                    runner_manager.update_runners(github_runners)
+            self.github_runners_etag = etag
 
         self.log_runners_infos()
         self.manage_runners()
 
     def update_runner_status(self, runner: dict):
+        """
+        Update a runner from a webhook event and reconcile only its pool
+        Called from the threads of the event queue, the runners are only changed
+        under the lock of the scheduler, not while a pool is reconciled
+        """
         logger.info(runner)
-        try:
-            manager = next(
-                manager
-                for manager in self.runner_managers
-                if runner["name"] in manager.runners.keys()
-            )
-        except StopIteration:
-            logger.info("Runner not managed")
-            return
+        with self.scheduler.lock:
+            manager = self.runner_index.get(runner["name"])
+            if manager is None:
+                logger.info("Runner not managed")
+                return
 
-        logger.info(manager)
-        manager.update_runner(runner)
-        self.log_runners_infos()
-        self.manage_runners()
+            logger.info(manager)
+            manager.get_runners()
+            manager.update_runner(runner)
+            self.log_runners_infos()
+        if not manager.vm_type.on_demand:
+            self.scheduler.notify(manager)
 
     def manage_runners(self):
-        # runner logic For each type of VM
-        for manager in self.get_runner_manager_not_on_demand():
+        """
+        Reconcile every pool not on demand,
+        all the redis writes of the pass are sent in a single batch
+        """
+        with metrics.manage_runners_duration_seconds.labels(
+            cloud=self.factory.cloud_manager.name
+        ).time(), self.redis.batch():
+            # runner logic For each type of VM
+            for manager in self.get_runner_manager_not_on_demand():
+                self.manage_pool(manager)
+
+    def manage_pool(self, manager: RunnerManager):
+        """
+        Reconcile the runners of a single pool
+        """
+        with metrics.manage_pool_duration_seconds.labels(
+            cloud=self.factory.cloud_manager.name, pool=manager.vm_type.pool_id
+        ).time(), self.redis.batch():
+            # Read the runners state from redis once for the whole pass
+            manager.get_runners()
+            # The same target to trim and to fill the pool, forecast once
+            target = self.target_runner_number(manager)
+
             # Always Delete and re create new Vm when they finished running
             offline_runners = manager.filter_runners(lambda r: r.has_run)
-            for r in offline_runners:
-                manager.delete_runner(r)
-                manager.create_runner()
+            if offline_runners:
+                manager.delete_runners(offline_runners)
+                manager.create_runners(len(offline_runners))
 
             # Delete runner if they are offline for more then Xmin after spawn
-            for elem in manager.filter_runners(self.runner_should_never_spawn):
-                logger.info("Runner will never be online")
-                manager.delete_runner(elem)
+            never_spawned = manager.filter_runners(self.runner_should_never_spawn)
+            if never_spawned:
+                logger.info(f"{len(never_spawned)} runners will never be online")
+                manager.delete_runners(never_spawned)
 
-            # Delete last runners if you have too many and they are not used for the last x minutes
+            # Delete last runners if you have too many
+            # and they are not used for the last x minutes
             runners_to_delete = manager.filter_runners(self.too_much_runner_online)[
-                manager.min_runner_number() :
+                target:
             ]
-            for runner in runners_to_delete:
+            if runners_to_delete:
                 logger.info("Reducing the number of runners online")
-                manager.delete_runner(runner)
+                manager.delete_runners(runners_to_delete)
+
+            # Create if it's still not enough, in a single cloud request
+            needed = self.new_runners_needed(manager, target)
+            if needed > 0:
+                logger.info(f"Need {needed} new runners")
+                manager.create_runners(needed)
 
-            # Create if it's still not enough
-            while self.need_new_runner(manager):
-                logger.info("Need new runner")
-                manager.create_runner()
+            # Replace the warm VMs used
+            self.factory.fill_warm_pool(manager.vm_type)
 
     def need_new_runner(self, manager: RunnerManager) -> bool:
         """
@@ -147,20 +262,83 @@ class Manager(object):
         :param manager: RunnerManager
         :return: True if can and need a new runner
         """
+        return self.new_runners_needed(manager) > 0
+
+    def record_job(self, labels: list[str], action: str) -> None:
+        """
+        Count a workflow job event in the history of the pool with these labels
+        """
+        if self.autoscaler is None:
+            return
+        manager = self.find_pool(labels, best_match=True)
+        if manager is not None:
+            self.autoscaler.record(manager.vm_type.pool_id, action)
+
+    def observe_job_wait(
+        self,
+        labels: list[str],
+        queued_at: datetime.datetime,
+        started_at: datetime.datetime,
+    ) -> None:
+        """
+        Observe the time a job waited for a runner, from its webhook timestamps
+        The jobs not matching any pool are observed in the "other" pool
+        """
+        manager = self.find_pool(labels, best_match=True)
+        metrics.job_wait_seconds.labels(
+            cloud=self.factory.cloud_manager.name,
+            pool=manager.vm_type.pool_id if manager is not None else "other",
+        ).observe(max((started_at - queued_at).total_seconds(), 0))
 
+    def target_runner_number(self, manager: RunnerManager) -> int:
+        """
+        Return the number of runners the pool should keep waiting,
+        `min` or the forecast of the autoscaler when it is enabled
+        """
+        if self.autoscaler is None:
+            return manager.min_runner_number()
+        try:
+            target = self.autoscaler.target(
+                manager.vm_type.pool_id,
+                manager.min_runner_number(),
+                manager.max_runner_number(),
+                manager.boot_time,
+            )
+        except Exception as e:
+            logger.error(f"Autoscaler forecast failed: {e}")
+            target = manager.min_runner_number()
+        metrics.runner_autoscaler_target.labels(
+            cloud=self.factory.cloud_manager.name, pool=manager.vm_type.pool_id
+        ).set(target)
+        return target
+
+    def new_runners_needed(self, manager: RunnerManager, target: int = None) -> int:
+        """
+        Return the number of runners to create to have `min` runners waiting,
+        or the number forecast by the autoscaler, without going over `max` runners
+        :param manager: RunnerManager
+        :param target: the runners to keep waiting, from `target_runner_number`
+            if not given
+        """
         if not self.redis.get_manager_running():
             logger.warning("Spawning set to off. No runner started")
-            return False
+            return 0
 
         current_online_or_creating = len(
             manager.filter_runners(lambda r: r.is_online or r.is_creating)
         )
         current_running = len(manager.filter_runners(lambda r: r.is_running))
+        if target is None:
+            target = self.target_runner_number(manager)
 
-        return (
-            current_online_or_creating < manager.min_runner_number()
-            and current_running + current_online_or_creating
-            < manager.max_runner_number()
+        return max(
+            min(
+                target - current_online_or_creating,
+                manager.max_runner_number()
+                - current_running
+                - current_online_or_creating,
+            ),
+            0,
         )
 
     def too_much_runner_online(self, runner: Runner) -> bool:
@@ -0,0 +1,175 @@
+import logging
+import threading
+import time
+
+from runners_manager.monitoring.prometheus import metrics
+
+logger = logging.getLogger("runner_manager")
+
+
+class ReconcileScheduler(object):
+    """
+    Decide when the runners are reconciled
+
+    Webhook events and state changes call `notify`, the reconcile starts right away,
+    after a short window used to merge the bursts of events in a single pass.
+    An event naming its pool only reconciles the pools notified during the window,
+    the other events reconcile every pool.
+    The full poll of the GitHub runners list is a fallback: it runs when no event
+    arrived for `poll_interval` seconds. This interval doubles up to `max_poll_interval`
+    each time the poll finds nothing new and goes back to `min_poll_interval` otherwise.
+    A steady stream of events never delays the full poll past `max_poll_interval`,
+    the events missed by the webhooks are still caught up.
+    """
+
+    min_poll_interval: float
+    max_poll_interval: float
+    coalesce_window: float
+    poll_interval: float
+
+    def __init__(
+        self,
+        manager,
+        min_poll_interval: float = 10,
+        max_poll_interval: float = 120,
+        coalesce_window: float = 0.5,
+    ):
+        self.manager = manager
+        self.min_poll_interval = min_poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.coalesce_window = coalesce_window
+
+        self.poll_interval = min_poll_interval
+        self.next_poll = 0
+        self.last_full_poll = time.monotonic()
+        self.last_poll_state = None
+        self.pending_since = None
+        # Pools to reconcile, None for every pool
+        self.pending_pools = set()
+
+        self.condition = threading.Condition()
+        self.lock = threading.RLock()
+        self.thread = None
+        self.stopped = False
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self) -> None:
+        """
+        Run the scheduler in a background thread
+        """
+        if self.running:
+            return
+        self.stopped = False
+        self.thread = threading.Thread(
+            target=self.run_forever, name="reconcile-scheduler", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self) -> None:
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+
+    def notify(self, pool=None) -> None:
+        """
+        Ask for a reconcile, it runs inline when the scheduler is not started
+        :param pool: the RunnerManager of the only pool to reconcile, None for all
+        """
+        if not self.running:
+            self.reconcile(pools=None if pool is None else [pool])
+            return
+
+        with self.condition:
+            if self.pending_since is None:
+                self.pending_since = time.monotonic()
+            if pool is None:
+                self.pending_pools = None
+            elif self.pending_pools is not None:
+                self.pending_pools.add(pool)
+            self.condition.notify()
+
+    def reconcile(self, full: bool = False, pools: list or None = None) -> None:
+        """
+        Reconcile the runners, with `full` the state is first refreshed from GitHub
+        :param pools: the RunnerManagers to reconcile, None for every pool
+        """
+        with self.lock:
+            if full:
+                self.full_poll()
+            elif pools is None:
+                self.manager.manage_runners()
+            else:
+                for pool in pools:
+                    self.manager.manage_pool(pool)
+
+    def full_poll(self) -> None:
+        github_manager = self.manager.factory.github_manager
+        runners = github_manager.get_runners(self.manager.factory.runner_prefix)
+        logger.info(f"nb runners: {len(runners['runners'])}")
+        logger.info(
+            f"offline: {len([e for e in runners['runners'] if e['status'] == 'offline'])}"
+        )
+        logger.debug(runners)
+
+        # Back off while the runners list does not move
+        state = sorted((e["name"], e["status"], e["busy"]) for e in runners["runners"])
+        if state == self.last_poll_state:
+            self.poll_interval = min(self.poll_interval * 2, self.max_poll_interval)
+        else:
+            self.poll_interval = self.min_poll_interval
+        self.last_poll_state = state
+
+        self.manager.update_all_runners(runners["runners"], etag=runners.get("etag"))
+
+    def wait(self) -> tuple[float or None, set or None]:
+        """
+        Wait for an event or the next full poll,
+        return the time of the first event waiting or None for a full poll,
+        and the pools notified or None for every pool
+        """
+        with self.condition:
+            while self.pending_since is None and not self.stopped:
+                timeout = self.next_poll - time.monotonic()
+                if timeout <= 0:
+                    return None, None
+                self.condition.wait(timeout)
+
+        # Let the burst of events finish before reconciling
+        time.sleep(self.coalesce_window)
+        with self.condition:
+            pending_since, self.pending_since = self.pending_since, None
+            pools, self.pending_pools = self.pending_pools, set()
+        return pending_since, pools or None
+
+    def run_once(self) -> None:
+        pending_since, pools = self.wait()
+        if self.stopped:
+            return
+
+        # The full poll also reconciles every pool notified
+        full = (
+            pending_since is None
+            or time.monotonic() - self.last_full_poll >= self.max_poll_interval
+        )
+        try:
+            self.reconcile(full=full, pools=pools)
+        except Exception as e:
+            logger.error(f"Reconcile failed: {e}")
+        if full:
+            self.last_full_poll = time.monotonic()
+
+        # Events keep the state up to date, they postpone the next full poll
+        # up to `max_poll_interval` after the last one
+        self.next_poll = min(
+            time.monotonic() + self.poll_interval,
+            self.last_full_poll + self.max_poll_interval,
+        )
+        if pending_since is not None:
+            metrics.reconcile_latency_seconds.observe(time.monotonic() - pending_since)
+
+    def run_forever(self) -> None:
+        while not self.stopped:
+            self.run_once()
@@ -1,79 +1,695 @@
 import json
 import logging
+import threading
+import time
+from contextlib import contextmanager
 
 import redis
+import redis.exceptions
+from runners_manager.monitoring.prometheus import metrics
 from runners_manager.runner.Runner import Runner
+from runners_manager.vm_creation.VmType import VmType
 
 logger = logging.getLogger("runner_manager")
 
 
+def timed_commands(client: redis.Redis) -> redis.Redis:
+    """
+    Observe the latency of every command the client sends outside of a pipeline,
+    labelled by the redis command name
+    """
+    execute_command = client.execute_command
+    if getattr(execute_command, "timed", False):
+        return client
+
+    def _execute_command(*args, **options):
+        with metrics.redis_command_seconds.labels(command=str(args[0]).upper()).time():
+            return execute_command(*args, **options)
+
+    _execute_command.timed = True
+    client.execute_command = _execute_command
+    return client
+
+
 class RedisManager(object):
+    """
+    Store runners and managers in redis:
+        - `managers:<tags>` set of the runner keys of a manager
+        - `runners:<name>` hash of a runner, each field is json encoded
+        - `pools:<tags>` json of the VmType of a pool, runners only keep the pool id
+        - `generation:managers:<tags>` counter incremented on every write on a manager
+        - `registry:managers` and `registry:runners` sets of every manager and runner key
+        - `warm:<tags>` set of the ids of the warm VMs of a pool
+        - `baked:<tags>` id of the baked image of a pool
+        - `jobs:<tags>:<day>` hash of the workflow job events of a pool
+          counted by `<action>:<time bucket>`, kept a few days
+        - `events:<shard>` streams of the webhook events waiting to be handled
+        - `delivered:<delivery>` webhook deliveries already queued, expiring
+        - `counters:runner_names` last index used in the runner names
+    """
+
+    LAYOUT_VERSION = b"4"
+    # Seconds a VM id waits for the first write of its runner before being given up
+    PENDING_VM_ID_TTL = 10 * 60
+    # Fields every runner hash has, with `pool` or `vm_type` for the older records
+    RUNNER_FIELDS = (
+        "name",
+        "status",
+        "status_history",
+        "action_id",
+        "vm_id",
+        "cloud",
+        "created_at",
+        "started_at",
+    )
+    MANAGERS_REGISTRY = "registry:managers"
+    RUNNERS_REGISTRY = "registry:runners"
+    RUNNER_INDEX = "counters:runner_names"
     redis: redis.Redis
+    local: threading.local
+    round_trips_saved: int
+    pending_vm_ids: dict[str, tuple[Runner, float]]
 
     def __init__(self, redis: redis.Redis):
-        self.redis = redis
+        self.redis = timed_commands(redis)
+        self.local = threading.local()
+        # The writes are flushed one at a time, a VM id saved while the first write
+        # of its runner waits in a batch is written right after it
+        self.flush_lock = threading.Lock()
+        self.pending_vm_ids = {}
+        self.round_trips_saved = 0
         if self.redis.get("settings:running") is None:
             self.redis.set("settings:running", str(True))
+        self.migrate()
+
+    @contextmanager
+    def batch(self):
+        """
+        Collect every write done by the current thread inside the block
+        and flush them in a single MULTI / EXEC when leaving it.
+        The updates of some fields of runners are written after it,
+        in a second transaction skipping the runners deleted meanwhile.
+        Reads are not batched, they are still sent straight to redis.
+        """
+        if getattr(self.local, "pipeline", None) is not None:
+            yield
+            return
+
+        self.local.pipeline = self.redis.pipeline(transaction=True)
+        self.local.writes = 0
+        self.local.generations = {}
+        self.local.updates = []
+        try:
+            yield
+        finally:
+            pipeline, writes = self.local.pipeline, self.local.writes
+            updates = self.local.updates
+            self.local.pipeline = None
+            self.local.generations = {}
+            self.local.updates = []
+            with self.flush_lock:
+                self.execute(pipeline)
+                if updates:
+                    self.update_existing_runners(updates, counted=True)
+                self.write_pending_vm_ids()
+
+            self.round_trips_saved = max(writes - 1, 0)
+            metrics.redis_round_trips_saved.inc(self.round_trips_saved)
+            logger.debug(f"Redis batch of {writes} writes flushed")
+
+    @contextmanager
+    def _write(self):
+        """
+        Give the pipeline of the running batch,
+        or a new pipeline executed when leaving the block
+        """
+        pipeline = getattr(self.local, "pipeline", None)
+        if pipeline is not None:
+            self.local.writes += 1
+            yield pipeline
+        else:
+            pipeline = self.redis.pipeline(transaction=True)
+            yield pipeline
+            with self.flush_lock:
+                self.execute(pipeline)
+                self.write_pending_vm_ids()
+
+    def execute(self, pipeline) -> list:
+        """
+        Execute a pipeline, its latency is observed as a MULTI or a PIPELINE command
+        """
+        command = "MULTI" if pipeline.transaction else "PIPELINE"
+        with metrics.redis_command_seconds.labels(command=command).time():
+            return pipeline.execute()
 
     def set_manager_running(self, status: bool):
-        self.redis.set("settings:running", str(status))
+        with self._write() as pipeline:
+            pipeline.set("settings:running", str(status))
 
     def get_manager_running(self):
         return b"True" == self.redis.get("settings:running")
 
+    def migrate(self):
+        """
+        Convert the keys written with the json layout,
+        `managers:<tags>` json list of runner keys and `runners:<name>` json string,
+        into the set / hash layout, then build the keys registry.
+        Runners embedding their whole VmType are rewritten with the pool id.
+        """
+        if self.redis.get("settings:layout") == self.LAYOUT_VERSION:
+            return
+
+        logger.info("Migrate redis keys to the set / hash layout")
+        for key in self.redis.scan_iter(match="managers:*"):
+            if self.redis.type(key) != b"string":
+                continue
+            runners_name = json.loads(self.redis.get(key))
+            with self._write() as pipeline:
+                pipeline.delete(key)
+                if runners_name:
+                    pipeline.sadd(key, *runners_name)
+                self._incr_generation(pipeline, key.decode("ascii"))
+
+        for key in self.redis.scan_iter(match="runners:*"):
+            key_type = self.redis.type(key)
+            if key_type == b"string":
+                data = json.loads(self.redis.get(key))
+            elif key_type == b"hash":
+                data = self.decode_fields(self.redis.hgetall(key))
+                if "pool" in data:
+                    continue
+            else:
+                continue
+
+            runner = Runner.fromJson(data)
+            with self._write() as pipeline:
+                pipeline.delete(key)
+                pipeline.hset(key, mapping=self.encode_fields(runner.toJson()))
+            self.save_pool(runner.vm_type)
+
+        self.rebuild_registry()
+        self.redis.set("settings:layout", self.LAYOUT_VERSION)
+
+    def rebuild_registry(self):
+        """
+        Rebuild the keys registry from the keyspace,
+        SCAN is used to not block the redis instance
+        """
+        logger.info("Rebuild the redis keys registry")
+        managers = list(self.redis.scan_iter(match="managers:*"))
+        runners = list(self.redis.scan_iter(match="runners:*"))
+        with self._write() as pipeline:
+            pipeline.delete(self.MANAGERS_REGISTRY, self.RUNNERS_REGISTRY)
+            if managers:
+                pipeline.sadd(self.MANAGERS_REGISTRY, *managers)
+            if runners:
+                pipeline.sadd(self.RUNNERS_REGISTRY, *runners)
+
     def get_all_runners_managers(self) -> list[str]:
-        return [name.decode("ascii") for name in self.redis.keys("managers:*")]
+        return [
+            name.decode("ascii") for name in self.redis.smembers(self.MANAGERS_REGISTRY)
+        ]
 
     def get_all_runners(self) -> list[Runner]:
-        return [self.get_runner(name) for name in self.redis.keys("runners:*")]
+        return self.read_runners(self.redis.smembers(self.RUNNERS_REGISTRY))
 
     def delete_runners_manager(self, runner_manager):
-        self.redis.delete(runner_manager)
+        with self._write() as pipeline:
+            pipeline.delete(runner_manager, self.generation_key_name(runner_manager))
+            pipeline.srem(self.MANAGERS_REGISTRY, runner_manager)
+
+    @staticmethod
+    def generation_key_name(runner_manager: str) -> str:
+        """
+        Define the redis key of the generation counter of a manager,
+        it is incremented on every write touching one of its runners
+        """
+        return f"generation:{runner_manager}"
+
+    def get_manager_generation(self, runner_manager: str) -> int:
+        """
+        Return the generation of a manager,
+        including the increments still waiting in the batch of the current thread
+        """
+        generation = self.redis.get(self.generation_key_name(runner_manager))
+        pending = getattr(self.local, "generations", {}).get(runner_manager, 0)
+        return (int(generation) if generation else 0) + pending
+
+    def _incr_generation(self, pipeline, runner_manager: str):
+        pipeline.incr(self.generation_key_name(runner_manager))
+        if getattr(self.local, "pipeline", None) is not None:
+            self.local.generations[runner_manager] = (
+                self.local.generations.get(runner_manager, 0) + 1
+            )
+
+    @staticmethod
+    def pool_key_name(pool_id: str) -> str:
+        return f"pools:{pool_id}"
+
+    def save_pool(self, vm_type: VmType) -> None:
+        """
+        Save the VmType of a pool, used to rebuild runners of pools unknown locally
+        """
+        with self._write() as pipeline:
+            pipeline.set(
+                self.pool_key_name(vm_type.pool_id), json.dumps(vm_type.toJson())
+            )
+
+    def load_pools(self, pool_ids: set[str]) -> None:
+        """
+        Register from redis the pools not registered locally,
+        like the ones removed from the settings but with runners left
+        """
+        missing = [pool_id for pool_id in pool_ids if not VmType.from_pool_id(pool_id)]
+        if not missing:
+            return
+
+        pools = self.redis.mget([self.pool_key_name(pool_id) for pool_id in missing])
+        for pool_id, data in zip(missing, pools):
+            if data:
+                VmType.register(VmType(json.loads(data)))
+            else:
+                logger.warning(f"Definition of the pool {pool_id} not found")
+                VmType.register(
+                    VmType(
+                        {
+                            "tags": pool_id.split("-") if pool_id else [],
+                            "config": {},
+                            "quantity": {},
+                        }
+                    )
+                )
+
+    @staticmethod
+    def warm_key_name(pool_id: str) -> str:
+        return f"warm:{pool_id}"
+
+    def add_warm_vm(self, pool_id: str, vm_id: str) -> None:
+        with self._write() as pipeline:
+            pipeline.sadd(self.warm_key_name(pool_id), vm_id)
+
+    def pop_warm_vm(self, pool_id: str) -> str or None:
+        """
+        Take a warm VM of the pool, return None if there is none left
+        """
+        vm_id = self.redis.spop(self.warm_key_name(pool_id))
+        return vm_id.decode() if vm_id is not None else None
+
+    def pop_warm_vms(self, pool_id: str, count: int = None) -> list[str]:
+        """
+        Take `count` warm VMs of the pool, all of them if `count` is None
+        """
+        key = self.warm_key_name(pool_id)
+        vm_ids = sorted(self.redis.smembers(key))[:count]
+        if not vm_ids:
+            return []
+
+        # Only the VMs removed here are returned, the others were taken meanwhile
+        pipeline = self.redis.pipeline(transaction=False)
+        for vm_id in vm_ids:
+            pipeline.srem(key, vm_id)
+        removed = self.execute(pipeline)
+        return [vm_id.decode() for vm_id, ok in zip(vm_ids, removed) if ok]
+
+    def count_warm_vms(self, pool_id: str) -> int:
+        return self.redis.scard(self.warm_key_name(pool_id))
+
+    def get_warm_pools(self) -> list[str]:
+        """
+        Return the ids of the pools with warm VMs, including the pools not configured anymore
+        """
+        return [
+            key.decode()[len(self.warm_key_name("")) :]
+            for key in self.redis.scan_iter(match=self.warm_key_name("*"))
+        ]
+
+    @staticmethod
+    def baked_key_name(pool_id: str) -> str:
+        return f"baked:{pool_id}"
+
+    def save_baked_image(self, pool_id: str, image_id: str) -> None:
+        with self._write() as pipeline:
+            pipeline.set(self.baked_key_name(pool_id), image_id)
+
+    def get_baked_image(self, pool_id: str) -> str or None:
+        image_id = self.redis.get(self.baked_key_name(pool_id))
+        return image_id.decode() if image_id is not None else None
+
+    def delete_baked_image(self, pool_id: str) -> None:
+        with self._write() as pipeline:
+            pipeline.delete(self.baked_key_name(pool_id))
+
+    @staticmethod
+    def jobs_key_name(pool_id: str, day: int) -> str:
+        return f"jobs:{pool_id}:{day}"
+
+    def count_job(self, pool_id: str, field: str, day: int, ttl: int) -> None:
+        """
+        Count a workflow job event of a pool, the hash of the day expires after `ttl`
+        """
+        key = self.jobs_key_name(pool_id, day)
+        with self._write() as pipeline:
+            pipeline.hincrby(key, field, 1)
+            pipeline.expire(key, ttl)
+
+    def get_job_counts(
+        self, pool_id: str, fields: dict[int, list[str]]
+    ) -> dict[int, dict[str, int] or None]:
+        """
+        Read the job counters of a pool in a single round trip
+        :param fields: the fields to read in the hash of each day
+        :return: the counters of each day, None for the days without any job
+        """
+        days = list(fields.keys())
+        pipeline = self.redis.pipeline(transaction=False)
+        for day in days:
+            pipeline.exists(self.jobs_key_name(pool_id, day))
+            pipeline.hmget(self.jobs_key_name(pool_id, day), fields[day])
+        results = self.execute(pipeline)
+
+        counts = {}
+        for index, day in enumerate(days):
+            exists, values = results[2 * index], results[2 * index + 1]
+            counts[day] = (
+                {
+                    field: int(value) if value is not None else 0
+                    for field, value in zip(fields[day], values)
+                }
+                if exists
+                else None
+            )
+        return counts
+
+    def add_event(self, stream: str, fields: dict[str, str], max_length: int) -> str:
+        """
+        Append an event to a stream, keeping about `max_length` events
+        :return: the id of the event
+        """
+        return self.redis.xadd(
+            stream, fields, maxlen=max_length, approximate=True
+        ).decode()
 
-    def update_manager_runners(self, runner_manager: str, runners: list[Runner]):
-        runners_name = [r.redis_key_name() for r in runners]
-        self.redis.set(runner_manager, json.dumps(runners_name))
+    def mark_delivered(self, keys: list[str], ttl: int) -> bool:
+        """
+        Record the keys of a webhook delivery for `ttl` seconds
+        :return: False if one of them was already recorded
+        """
+        pipeline = self.redis.pipeline(transaction=False)
+        for key in keys:
+            pipeline.set(key, 1, nx=True, ex=ttl)
+        return all(self.execute(pipeline))
+
+    def forget_delivered(self, keys: list[str]) -> None:
+        self.redis.delete(*keys)
+
+    def create_event_group(self, stream: str, group: str) -> None:
+        """
+        Create the consumer group of a stream, it starts with the first event kept
+        """
+        try:
+            self.redis.xgroup_create(stream, group, id="0", mkstream=True)
+        except redis.exceptions.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    @staticmethod
+    def decode_events(entries) -> list[tuple[str, dict[str, str]]]:
+        return [
+            (
+                entry_id.decode(),
+                {key.decode(): value.decode() for key, value in fields.items()},
+            )
+            for entry_id, fields in entries
+            # Events trimmed from the stream while pending have no fields
+            if fields
+        ]
+
+    def read_events(
+        self, stream: str, group: str, consumer: str, count: int, block: int
+    ) -> list[tuple[str, dict[str, str]]]:
+        """
+        Read the next events of the group, waiting up to `block` milliseconds
+        """
+        response = self.redis.xreadgroup(
+            group, consumer, {stream: ">"}, count=count, block=block
+        )
+        return self.decode_events(response[0][1]) if response else []
+
+    def claim_events(
+        self, stream: str, group: str, consumer: str, min_idle: int, count: int
+    ) -> list[tuple[str, dict[str, str], int]]:
+        """
+        Take over the events read by a consumer but not acknowledged
+        for `min_idle` milliseconds, like the ones which failed or of a consumer which died
+        :return: each event with the number of times it was delivered, this claim included
+        """
+        pending = self.redis.xpending_range(stream, group, "-", "+", count)
+        deliveries = {
+            entry["message_id"].decode(): entry["times_delivered"] + 1
+            for entry in pending
+            if entry["time_since_delivered"] >= min_idle
+        }
+        if not deliveries:
+            return []
+        claimed = self.redis.xclaim(stream, group, consumer, min_idle, list(deliveries))
+        trimmed = [entry_id for entry_id, fields in claimed if not fields]
+        if trimmed:
+            self.redis.xack(stream, group, *trimmed)
+        return [
+            (event_id, fields, deliveries[event_id])
+            for event_id, fields in self.decode_events(claimed)
+        ]
+
+    def dead_letter_event(
+        self,
+        stream: str,
+        group: str,
+        event_id: str,
+        fields: dict[str, str],
+        max_length: int,
+    ) -> None:
+        """
+        Move an event to the dead letter stream `<stream>:dead` and acknowledge it
+        """
+        pipeline = self.redis.pipeline(transaction=True)
+        pipeline.xadd(
+            f"{stream}:dead",
+            {**fields, "event_id": event_id},
+            maxlen=max_length,
+            approximate=True,
+        )
+        pipeline.xack(stream, group, event_id)
+        self.execute(pipeline)
+
+    def ack_event(self, stream: str, group: str, event_id: str) -> None:
+        self.redis.xack(stream, group, event_id)
+
+    @staticmethod
+    def encode_fields(data: dict) -> dict[str, str]:
+        return {field: json.dumps(value) for field, value in data.items()}
+
+    @staticmethod
+    def decode_fields(data: dict[bytes, bytes]) -> dict:
+        return {
+            field.decode("ascii"): json.loads(value) for field, value in data.items()
+        }
+
+    def runner_exists(self, name: str) -> bool:
+        return self.redis.exists(name) > 0
+
+    def any_runner_exists(self, names: list[str]) -> bool:
+        return self.redis.exists(*names) > 0
+
+    def next_runner_index(self) -> int:
+        """
+        Return a new index for the runner names, shared by every process and restart
+        """
+        return self.redis.incr(self.RUNNER_INDEX)
 
     def delete_runner(self, runner: Runner) -> None:
-        self.redis.delete(runner.redis_key_name())
+        """
+        Delete the runner hash and remove it from its manager set
+        """
+        self.pending_vm_ids.pop(runner.redis_key_name(), None)
+        with self._write() as pipeline:
+            pipeline.delete(runner.redis_key_name())
+            pipeline.srem(runner.manager_redis_key_name(), runner.redis_key_name())
+            pipeline.srem(self.RUNNERS_REGISTRY, runner.redis_key_name())
+            self._incr_generation(pipeline, runner.manager_redis_key_name())
 
-    def update_runner(self, runner: Runner) -> None:
-        self.redis.set(runner.redis_key_name(), json.dumps(runner.toJson()))
+    def update_runner(self, runner: Runner, fields: list[str] = None) -> bool:
+        """
+        Save the runner hash and add it to its manager set.
+        With `fields` only these fields are written, the others are left untouched,
+        and nothing is written if the runner hash does not exist anymore.
+        :return: False when the update was skipped, in a batch it is only known
+            when flushed and True is returned
+        """
+        if fields is not None:
+            if getattr(self.local, "pipeline", None) is None:
+                return bool(
+                    self.update_existing_runners([(runner, fields)], counted=True)
+                )
+            # Written when the batch is flushed, with the values of the runner then
+            self.local.writes += 1
+            self.local.updates.append((runner, fields))
+            manager = runner.manager_redis_key_name()
+            self.local.generations[manager] = self.local.generations.get(manager, 0) + 1
+            return True
 
-    def get_runner(self, name: str) -> Runner:
-        if not self.redis.get(name):
-            return None
-        data = json.loads(self.redis.get(name))
-        return Runner.fromJson(data)
+        data = runner.toJson()
+        with self._write() as pipeline:
+            pipeline.hset(runner.redis_key_name(), mapping=self.encode_fields(data))
+            pipeline.sadd(runner.manager_redis_key_name(), runner.redis_key_name())
+            pipeline.sadd(self.RUNNERS_REGISTRY, runner.redis_key_name())
+            pipeline.sadd(self.MANAGERS_REGISTRY, runner.manager_redis_key_name())
+            self._incr_generation(pipeline, runner.manager_redis_key_name())
+        return True
 
-    def get_runners(self, manager_name: str) -> dict[str, Runner]:
+    def save_vm_id(self, runner: Runner) -> None:
         """
-        Get all runners name from the manager name and build each of them with there json
+        Write the VM id of a runner created in the background.
+        When its runner is not in redis yet, its first write waiting in a batch,
+        the VM id is written right after it.
         """
-        runner_names = self.redis.get(manager_name)
-        if not runner_names:
-            return {}
+        with self.flush_lock:
+            if not self.update_existing_runners([(runner, ["vm_id"])]):
+                self.pending_vm_ids[runner.redis_key_name()] = (
+                    runner,
+                    time.monotonic(),
+                )
 
-        runners_json = self.redis.mget(json.loads(runner_names))
-        runners = {}
-        for runner in runners_json:
-            if runner:
-                r = Runner.fromJson(json.loads(runner))
-                runners[r.name] = r
+    def write_pending_vm_ids(self) -> None:
+        """
+        Write the VM ids waiting for their runner, called with the flush lock held
+        """
+        if not self.pending_vm_ids:
+            return
+        written = self.update_existing_runners(
+            [(runner, ["vm_id"]) for runner, _ in self.pending_vm_ids.values()]
+        )
+        for key, (runner, since) in list(self.pending_vm_ids.items()):
+            if runner.name in written:
+                del self.pending_vm_ids[key]
+            elif time.monotonic() - since > self.PENDING_VM_ID_TTL:
+                logger.error(f"VM {runner.vm_id} of runner {runner.name} never saved")
+                del self.pending_vm_ids[key]
 
-        return runners
+    def update_existing_runners(
+        self, updates: list[tuple[Runner, list[str]]], counted: bool = False
+    ) -> list[str]:
+        """
+        Write some fields of each runner in a single transaction,
+        the runners without hash, deleted meanwhile, are skipped.
+        With `counted`, the updates counted by the caches of the managers, the generation
+        is incremented for the skipped ones too: the deletion by another process still shows.
+        The hashes are watched while their existence is checked,
+        the transaction is tried again when one of them changed.
+        :return: the names of the runners written
+        """
+        keys = list({runner.redis_key_name() for runner, _ in updates})
 
-    def save_runners(self, runner_manager: str, runners: list[Runner]):
+        def write(pipeline) -> list[str]:
+            check = self.redis.pipeline(transaction=False)
+            for key in keys:
+                check.exists(key)
+            existing = {key for key, found in zip(keys, self.execute(check)) if found}
+
+            pipeline.multi()
+            written = []
+            for runner, fields in updates:
+                if runner.redis_key_name() not in existing:
+                    logger.info(f"Runner {runner.name} not in redis, update skipped")
+                    if counted:
+                        pipeline.incr(
+                            self.generation_key_name(runner.manager_redis_key_name())
+                        )
+                    continue
+                written.append(runner.name)
+                data = runner.toJson()
+                pipeline.hset(
+                    runner.redis_key_name(),
+                    mapping=self.encode_fields(
+                        {field: data[field] for field in fields}
+                    ),
+                )
+                pipeline.incr(self.generation_key_name(runner.manager_redis_key_name()))
+            return written
+
+        return self.redis.transaction(write, *keys, value_from_callable=True)
+
+    def get_runner(self, name: str) -> Runner or None:
+        data = self.redis.hgetall(name)
+        if not data:
+            return None
+        runners = self.decode_runners([(name, data)])
+        return runners[0] if runners else None
+
+    def decode_runners(
+        self, records: list[tuple[str, dict[bytes, bytes]]]
+    ) -> list[Runner]:
+        """
+        Build the runners from their key and hash,
+        the incomplete hashes are dropped from redis instead
+        """
+        decoded, incomplete = [], []
+        for key, data in records:
+            data = self.decode_fields(data)
+            if all(field in data for field in self.RUNNER_FIELDS) and (
+                "pool" in data or "vm_type" in data
+            ):
+                decoded.append(data)
+            else:
+                incomplete.append(key)
+        if incomplete:
+            self.drop_runner_keys(incomplete)
+
+        self.load_pools({data["pool"] for data in decoded if "pool" in data})
+        return [Runner.fromJson(data) for data in decoded]
+
+    def drop_runner_keys(self, keys: list[str]) -> None:
         """
-        Save runners json data in redis, first we save the list of object for a manager
-        Then we save each object with his name
+        Delete runner hashes and remove them from every manager set and the registry
+        """
+        logger.warning(f"Dropping incomplete runner records: {keys}")
+        managers = self.get_all_runners_managers()
+        with self._write() as pipeline:
+            pipeline.delete(*keys)
+            pipeline.srem(self.RUNNERS_REGISTRY, *keys)
+            for manager in managers:
+                pipeline.srem(manager, *keys)
 
-        Set a dictionary with there name as keys and the json as value to save them all in one time
+    def read_runners(self, runner_keys) -> list[Runner]:
+        """
+        Read every runner hash in a single round trip
         """
-        self.update_manager_runners(runner_manager, runners)
+        runner_keys = list(runner_keys)
+        pipeline = self.redis.pipeline(transaction=False)
+        for key in runner_keys:
+            pipeline.hgetall(key)
 
-        d = {}
-        for r in runners:
-            d[r.redis_key_name()] = json.dumps(r.toJson())
+        return self.decode_runners(
+            [
+                (key, data)
+                for key, data in zip(runner_keys, self.execute(pipeline))
+                if data
+            ]
+        )
 
-        self.redis.mset(d)
+    def get_runners(self, manager_name: str) -> dict[str, Runner]:
+        """
+        Get all runners name from the manager set and build each of them with there hash
+        Runners are sorted by creation date
+        """
+        runners = self.read_runners(self.redis.smembers(manager_name))
+        runners.sort(key=lambda r: (r.created_at, r.name))
+        return {r.name: r for r in runners}
+
+    def save_runners(self, runner_manager: str, runners: list[Runner]):
+        """
+        Save runners data in redis in one batch,
+        each runner hash is written and added to the manager set
+        """
+        with self.batch():
+            for r in runners:
+                self.update_runner(r)
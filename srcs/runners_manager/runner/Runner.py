@@ -6,6 +6,23 @@ from runners_manager.vm_creation.VmType import VmType
 
 logger = logging.getLogger("runner_manager")
 
+LEGACY_DATE_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def decode_date(value: float or str or None) -> datetime.datetime or None:
+    """
+    Dates are saved as epoch floats, older records used formatted strings
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return datetime.datetime.strptime(value, LEGACY_DATE_FORMAT)
+    return datetime.datetime.fromtimestamp(value)
+
+
+def encode_date(value: datetime.datetime or None) -> float or None:
+    return value.timestamp() if value else None
+
 
 class Runner(object):
     """
@@ -13,6 +30,18 @@ class Runner(object):
     It should always be synchronised with Github and your Cloud provider data
     """
 
+    __slots__ = (
+        "name",
+        "started_at",
+        "created_at",
+        "status",
+        "status_history",
+        "action_id",
+        "vm_id",
+        "vm_type",
+        "cloud",
+    )
+
     name: str
     started_at: datetime.datetime or None
     created_at: datetime.datetime
@@ -53,55 +82,51 @@ class Runner(object):
         """
         return f"runners:{self.name}"
 
+    def manager_redis_key_name(self):
+        """
+        Define the redis key name of the manager owning this instance
+        :return:
+        """
+        return f"managers:{self.vm_type.pool_id}"
+
     @staticmethod
     def fromJson(data: dict):
         """
         Build a Runner from json data
+        The VmType is the registered one of the runner pool,
+        records written before the pool id was saved embed the whole VmType
         :param dict:
         :return:
         """
-        runner = Runner(
-            data["name"], data["vm_id"], VmType(data["vm_type"]), data["cloud"]
-        )
+        if "pool" in data:
+            vm_type = VmType.from_pool_id(data["pool"])
+        else:
+            vm_type = VmType.intern(data["vm_type"])
 
+        runner = Runner(data["name"], data["vm_id"], vm_type, data["cloud"])
         runner.status = data["status"]
         runner.status_history = data["status_history"]
         runner.action_id = data["action_id"]
-        runner.created_at = datetime.datetime.strptime(
-            data["created_at"], "%Y-%m-%d %H:%M:%S.%f"
-        )
-
-        if data["started_at"]:
-            runner.started_at = datetime.datetime.strptime(
-                data["started_at"], "%Y-%m-%d %H:%M:%S.%f"
-            )
-        else:
-            runner.started_at = None
+        runner.created_at = decode_date(data["created_at"])
+        runner.started_at = decode_date(data["started_at"])
         return runner
 
     def toJson(self):
         """
-        The fields_to_serialized, list the field to put in the dict
+        The runner pool is saved by its id and dates as epoch floats
         :return: dict object representative of Self
         """
-        fields_to_serialized = [
-            "name",
-            "status",
-            "status_history",
-            "action_id",
-            "vm_id",
-            "cloud",
-        ]
-        d = {"vm_type": self.vm_type.toJson(), "created_at": str(self.created_at)}
-        if self.started_at:
-            d["started_at"] = str(self.started_at)
-        else:
-            d["started_at"] = None
-
-        for field in fields_to_serialized:
-            d[field] = self.__getattribute__(field)
-
-        return d
+        return {
+            "name": self.name,
+            "status": self.status,
+            "status_history": self.status_history,
+            "action_id": self.action_id,
+            "vm_id": self.vm_id,
+            "cloud": self.cloud,
+            "pool": self.vm_type.pool_id,
+            "created_at": encode_date(self.created_at),
+            "started_at": encode_date(self.started_at),
+        }
 
     def update_status(self, status: str):
         """
@@ -110,7 +135,6 @@ class Runner(object):
         :param status:
         :return:
         """
-        self.vm_type.tags.sort()
         if self.status == status or (
             self.status in ["creating", "respawning"] and status == "offline"
         ):
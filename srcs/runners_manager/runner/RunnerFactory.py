@@ -1,8 +1,12 @@
-import asyncio
 import datetime
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from hashlib import shake_256
 
+from runners_manager.monitoring.prometheus import metrics
+from runners_manager.runner.CreationPool import CreationPool
 from runners_manager.runner.RedisManager import RedisManager
 from runners_manager.runner.Runner import Runner
 from runners_manager.vm_creation.CloudManager import CloudManager
@@ -20,11 +24,13 @@ class RunnerFactory(object):
 
     github_organization: str
     runner_name_format: str
-    runner_counter: int
 
     redis: RedisManager
     cloud_manager: CloudManager
     github_manager: GithubManager
+    creations: CreationPool
+    max_delete_workers: int = 10
+    warming: dict[str, int]
 
     def __init__(
         self,
@@ -32,17 +38,24 @@ class RunnerFactory(object):
         github_manager: GithubManager,
         organization: str,
         redis: RedisManager,
+        creation_pool: dict or None = None,
     ):
         """
         This object spawn and delete the runner and spawn the VM
+        :param creation_pool: settings of the pool running the VM creations
         """
         self.cloud_manager = cloud_manager
         self.github_manager = github_manager
         self.github_organization = organization
         self.runner_name_format = "{tags_hash}-{index}"
         self.runner_prefix_format = "runner-{cloud}-{organization}"
-        self.runner_counter = 0
         self.redis = redis
+        self.creations = CreationPool(
+            name=str(cloud_manager.name), **(creation_pool or {})
+        )
+        # Number of warm VMs being created for each pool
+        self.warming = {}
+        self.warming_lock = threading.Lock()
 
     def async_create_vm(self, runner: Runner) -> None:
         if not self.redis.get_manager_running():
@@ -57,52 +70,270 @@ class RunnerFactory(object):
             github_organization=self.github_organization,
             installer=installer,
         )
+        self.vm_created(runner, instance_id)
+
+    def async_create_vms(self, runners: list[Runner]) -> None:
+        """
+        Create the VMs of several runners of the same pool in one cloud request
+        """
+        if not self.redis.get_manager_running():
+            logger.info("Not allowed to spawn VM")
+            return
+        logger.info(f"Start creating {len(runners)} VMs")
+
+        installer = self.github_manager.link_download_runner()
+        instance_ids = self.cloud_manager.create_vms(
+            runners=runners,
+            runner_token=self.github_manager.create_runner_token(),
+            github_organization=self.github_organization,
+            installer=installer,
+        )
+        for runner, instance_id in zip(runners, instance_ids):
+            self.vm_created(runner, instance_id)
 
+    def vm_created(self, runner: Runner, instance_id: int or None) -> None:
         if instance_id is None:
             logger.error(f"Creation of runner {runner} failed")
             runner.update_status("deleting")
             self.redis.delete_runner(runner)
+        elif self.creations.cancelled(runner.name):
+            # The runner was deleted while its VM was being created
+            logger.info(f"Creation of runner {runner} cancelled")
+            runner.vm_id = instance_id
+            self.cloud_manager.delete_vm(runner)
         else:
-            runner_exist = self.redis.get_runner(runner.redis_key_name())
-            if runner_exist:
-                runner = runner_exist
             runner.vm_id = instance_id
-            self.redis.update_runner(runner)
+            self.redis.save_vm_id(runner)
             logger.info("Create success")
 
-    def create_runner(self, vm_type: VmType) -> Runner:
+    def warm_pool_enabled(self, vm_type: VmType) -> bool:
+        return vm_type.warm > 0 and self.cloud_manager.supports_warm_pool
+
+    def async_start_warm_vm(self, runner: Runner) -> None:
+        if not self.redis.get_manager_running():
+            logger.info("Not allowed to spawn VM")
+            self.redis.add_warm_vm(runner.vm_type.pool_id, runner.vm_id)
+            return
+        logger.info(f"Start warm VM {runner.vm_id} as {runner.name}")
+
+        if self.cloud_manager.start_warm_vm(
+            runner, self.github_manager.create_runner_token(), self.github_organization
+        ):
+            self.vm_created(runner, runner.vm_id)
+        else:
+            logger.warning(f"Warm VM {runner.vm_id} failed, creating {runner.name}")
+            runner.vm_id = None
+            self.async_create_vm(runner)
+
+    def async_create_warm_vm(self, vm_type: VmType, name: str) -> None:
+        try:
+            vm_id = self.cloud_manager.create_warm_vm(
+                vm_type,
+                name,
+                self.github_organization,
+                self.github_manager.link_download_runner(),
+            )
+            if vm_id is not None:
+                self.redis.add_warm_vm(vm_type.pool_id, vm_id)
+        finally:
+            with self.warming_lock:
+                self.warming[vm_type.pool_id] -= 1
+
+    def delete_warm_vms(self, vm_ids: list[str]) -> None:
+        for vm_id in vm_ids:
+            logger.info(f"Delete warm VM {vm_id}")
+            try:
+                self.cloud_manager.delete_warm_vm(vm_id)
+            except Exception as e:
+                logger.error(f"Delete of warm VM {vm_id} failed: {e}")
+
+    def fill_warm_pool(self, vm_type: VmType) -> int:
+        """
+        Queue the creation of the warm VMs missing in the pool,
+        the warm VMs above the size of the pool are deleted
+        :return: the number of warm VMs queued
+        """
+        if not self.cloud_manager.supports_warm_pool:
+            return 0
+
+        warm = self.redis.count_warm_vms(vm_type.pool_id)
+        if warm > vm_type.warm:
+            self.delete_warm_vms(
+                self.redis.pop_warm_vms(vm_type.pool_id, warm - vm_type.warm)
+            )
+            warm = self.redis.count_warm_vms(vm_type.pool_id)
+
+        if not self.warm_pool_enabled(vm_type) or not self.redis.get_manager_running():
+            return 0
+
+        metrics.runner_warm_vms.labels(
+            cloud=self.cloud_manager.name, pool=vm_type.pool_id
+        ).set(warm)
+        with self.warming_lock:
+            missing = vm_type.warm - warm - self.warming.get(vm_type.pool_id, 0)
+
+        queued = 0
+        for _ in range(missing):
+            name = f"warm-{self.generate_runner_name(vm_type)}"
+            with self.warming_lock:
+                self.warming[vm_type.pool_id] = self.warming.get(vm_type.pool_id, 0) + 1
+            if not self.creations.submit(
+                name, vm_type.pool_id, self.async_create_warm_vm, vm_type, name
+            ):
+                with self.warming_lock:
+                    self.warming[vm_type.pool_id] -= 1
+                break
+            queued += 1
+        return queued
+
+    def baking_enabled(self, vm_type: VmType) -> bool:
+        return vm_type.bake and self.cloud_manager.supports_baking
+
+    def load_baked_images(self, vm_types: list[VmType]) -> None:
+        """
+        Give the cloud the baked images saved for the pools,
+        a pool with baking enabled and no image yet is baked
+        The image of a pool which no longer bakes is deleted
+        """
+        for vm_type in vm_types:
+            image_id = self.redis.get_baked_image(vm_type.pool_id)
+            if self.baking_enabled(vm_type):
+                if image_id is not None:
+                    self.cloud_manager.baked_images[vm_type.pool_id] = image_id
+                else:
+                    self.bake(vm_type)
+            elif image_id is not None and self.cloud_manager.supports_baking:
+                logger.info(
+                    f"Baking disabled for {vm_type.pool_id}, deleting {image_id}"
+                )
+                self.cloud_manager.baked_images.pop(vm_type.pool_id, None)
+                self.cloud_manager.delete_image(image_id)
+                self.redis.delete_baked_image(vm_type.pool_id)
+
+    def bake(self, vm_type: VmType) -> bool:
+        """
+        Queue the bake of a new image for the pool, it replaces the current one once ready
+        :return: False if baking is disabled, a bake is already queued or the queue is full
+        """
+        key = f"bake-{vm_type.pool_id}"
+        if not self.baking_enabled(vm_type) or self.creations.pending(key):
+            return False
+        name = f"baked-{self.cloud_manager.name}-{vm_type.pool_id}-{int(time.time())}"
+        return (
+            self.creations.submit(key, vm_type.pool_id, self.async_bake, vm_type, name)
+            is not None
+        )
+
+    def async_bake(self, vm_type: VmType, name: str) -> None:
+        logger.info(f"Start baking {name}")
+        start = time.monotonic()
+        image_id = self.cloud_manager.bake_image(
+            vm_type,
+            name,
+            self.github_organization,
+            self.github_manager.link_download_runner(),
+        )
+        if image_id is None:
+            logger.error(f"Bake of {name} failed, keeping the current image")
+            return
+
+        metrics.runner_bake_time_seconds.labels(cloud=self.cloud_manager.name).observe(
+            time.monotonic() - start
+        )
+        previous = self.redis.get_baked_image(vm_type.pool_id)
+        self.redis.save_baked_image(vm_type.pool_id, image_id)
+        self.cloud_manager.baked_images[vm_type.pool_id] = image_id
+        if previous is not None and previous != image_id:
+            self.cloud_manager.delete_image(previous)
+
+    def create_runner(self, vm_type: VmType) -> Runner or None:
+        """
+        Queue the creation of a runner VM, a warm VM of the pool is used if there is one
+        :return: the new runner, None when the creation queue is full
+        """
         logger.info(f"Create new runner for {vm_type}")
         name = self.generate_runner_name(vm_type)
         runner = Runner(
             name=name, vm_id=None, vm_type=vm_type, cloud=self.cloud_manager.name
         )
-        try:
-            asyncio.get_running_loop().run_in_executor(
-                None, self.async_create_vm, runner
-            )
-        except RuntimeError:
-            self.async_create_vm(runner)
 
-        return runner
+        create = self.async_create_vm
+        if self.warm_pool_enabled(vm_type):
+            runner.vm_id = self.redis.pop_warm_vm(vm_type.pool_id)
+            if runner.vm_id is not None:
+                create = self.async_start_warm_vm
+
+        if self.creations.submit(name, vm_type.pool_id, create, runner):
+            return runner
+        if runner.vm_id is not None:
+            self.redis.add_warm_vm(vm_type.pool_id, runner.vm_id)
+        return None
+
+    def create_runners(self, vm_type: VmType, count: int) -> list[Runner]:
+        """
+        Queue the creation of several runner VMs in a single cloud request
+        The runners are named `<name>-<index>`, as the cloud names the VMs of a batch
+        The warm VMs of the pool are used first, each of them is started on its own
+        :return: the new runners, fewer than `count` when the creation queue is full
+            or the pool already runs `pool_concurrency` creations
+        """
+        runners = []
+        if self.warm_pool_enabled(vm_type):
+            for _ in range(min(count, self.redis.count_warm_vms(vm_type.pool_id))):
+                runner = self.create_runner(vm_type)
+                if runner is None:
+                    return runners
+                runners.append(runner)
+            count -= len(runners)
+
+        count = min(count, self.creations.pool_capacity(vm_type.pool_id))
+        if count <= 1:
+            runner = self.create_runner(vm_type) if count == 1 else None
+            return runners + [runner] if runner else runners
+
+        logger.info(f"Create {count} new runners for {vm_type}")
+        name = self.generate_runner_name(vm_type, batch=count)
+        batch = [
+            Runner(
+                name=f"{name}-{index}",
+                vm_id=None,
+                vm_type=vm_type,
+                cloud=self.cloud_manager.name,
+            )
+            for index in range(1, count + 1)
+        ]
+        if self.creations.submit_batch(
+            [runner.name for runner in batch],
+            vm_type.pool_id,
+            self.async_create_vms,
+            batch,
+        ):
+            return runners + batch
+        return runners
 
     def respawn_replace(self, runner: Runner) -> Runner:
         logger.info(f"respawn runner: {runner.name}")
         self.cloud_manager.delete_vm(runner)
+        # Reset before the creation is queued, it may finish first
+        runner.vm_id = None
 
-        try:
-            asyncio.get_running_loop().run_in_executor(
-                None, self.async_create_vm, runner
-            )
-        except RuntimeError:
-            self.async_create_vm(runner)
+        if not self.creations.submit(
+            runner.name, runner.vm_type.pool_id, self.async_create_vm, runner
+        ):
+            # Nothing is left in the cloud, the runner times out and is replaced
+            logger.warning(f"Respawn of {runner.name} not queued")
 
         runner.status_history = []
-        runner.vm_id = None
         runner.created_at = datetime.datetime.now()
         return runner
 
-    def delete_runner(self, runner: Runner):
+    def delete_runner(self, runner: Runner) -> bool:
+        """
+        Delete the runner from GitHub and its VM
+        :return: False if the GitHub runner could not be deleted
+        """
         logger.info(f"Deleting {runner.name}: type {runner.vm_type}")
+        self.creations.cancel(runner.name)
         try:
             if runner.action_id:
                 self.github_manager.force_delete_runner(runner.action_id)
@@ -111,10 +342,55 @@ class RunnerFactory(object):
                 self.cloud_manager.delete_vm(runner)
 
             logger.info("Delete success")
+            return True
         except APIException:
             logger.info(
                 f"APIException catch, when try to delete the runner: {str(runner)}"
             )
+            return False
+
+    def _delete_runner_safe(self, runner: Runner) -> bool:
+        try:
+            return self.delete_runner(runner)
+        except Exception as e:
+            logger.error(f"Error when deleting the runner {runner.name}: {e}")
+            return False
+
+    def delete_runners(self, runners: list[Runner]) -> dict[str, bool]:
+        """
+        Delete the runners from GitHub and their VM concurrently
+        :return: for each runner name, True if it was deleted
+        """
+        if not runners:
+            return {}
+
+        cloud = str(self.cloud_manager.name)
+        start = time.monotonic()
+        with ThreadPoolExecutor(
+            max_workers=min(self.max_delete_workers, len(runners)),
+            thread_name_prefix=f"delete-{cloud}",
+        ) as executor:
+            report = dict(
+                zip(
+                    [runner.name for runner in runners],
+                    executor.map(self._delete_runner_safe, runners),
+                )
+            )
+        metrics.runner_bulk_delete_time_seconds.labels(cloud=cloud).observe(
+            time.monotonic() - start
+        )
+
+        failed = [name for name, deleted in report.items() if not deleted]
+        metrics.runner_delete_results.labels(cloud=cloud, result="success").inc(
+            len(report) - len(failed)
+        )
+        metrics.runner_delete_results.labels(cloud=cloud, result="failed").inc(
+            len(failed)
+        )
+        logger.info(f"{len(report) - len(failed)}/{len(report)} runners deleted")
+        if failed:
+            logger.warning(f"Runners not deleted: {', '.join(failed)}")
+        return report
 
     @property
     def runner_prefix(self):
@@ -122,10 +398,12 @@ class RunnerFactory(object):
             cloud=self.cloud_manager.name, organization=self.github_organization
         )
 
-    def generate_runner_name(self, vm_type: VmType) -> str:
+    def generate_runner_name(self, vm_type: VmType, batch: int = 0) -> str:
         """
         Generating unused name for runner, used in Redis in Github
+        The index comes from a counter in redis, it goes on after a restart
         :param vm_type:
+        :param batch: number of runners named `<name>-<index>`, they are unused too
         :return:
         """
         vm_type.tags.sort()
@@ -133,11 +411,12 @@ class RunnerFactory(object):
         # set by cloud providers and GitHub
         tags_hash = shake_256("".join(vm_type.tags).encode()).hexdigest(5)
         name = self.runner_name_format.format(
-            index=self.runner_counter,
+            index=self.redis.next_runner_index(),
             tags_hash=tags_hash,
         )
-        self.runner_counter += 1
+        name = f"{self.runner_prefix}-{name}"
+        names = [name] + [f"{name}-{index}" for index in range(1, batch + 1)]
         # Check that a virtual machine hasn't this name already
-        if self.redis.redis.get(f"runners:{name}") is not None:
-            return self.generate_runner_name(vm_type)
-        return f"{self.runner_prefix}-{name}"
+        if self.redis.any_runner_exists([f"runners:{n}" for n in names]):
+            return self.generate_runner_name(vm_type, batch)
+        return name
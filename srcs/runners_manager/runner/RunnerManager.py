@@ -2,6 +2,7 @@ import datetime
 import logging
 from collections.abc import Callable
 
+from runners_manager.monitoring.prometheus import metrics
 from runners_manager.runner.RedisManager import RedisManager
 from runners_manager.runner.Runner import Runner
 from runners_manager.runner.RunnerFactory import RunnerFactory
@@ -15,37 +16,107 @@ class RunnerManager(object):
     This object creates, delete and update runners infos bout VM and github runner
     We save every info updated on the redis database
     This class is a tool and is here to join Github and local data
+
+    Runners are kept in a local cache written through to redis, the cache is
+    only reloaded when the generation counter of the manager moved because
+    another process or thread wrote to it.
+    The runners of the cache are also listed in `index`, a runner name to pool
+    mapping shared by the pools of a Manager.
     """
 
     redis: RedisManager
     vm_type: VmType
     runners: dict[str, Runner]
+    generation: int
     factory: RunnerFactory
+    boot_time: float or None
+    index: dict[str, "RunnerManager"]
 
-    def __init__(self, vm_type: VmType, factory: RunnerFactory, redis: RedisManager):
+    def __init__(
+        self,
+        vm_type: VmType,
+        factory: RunnerFactory,
+        redis: RedisManager,
+        index: dict[str, "RunnerManager"] = None,
+    ):
         self.redis = redis
-        self.vm_type = vm_type
+        self.vm_type = VmType.register(vm_type)
         self.factory = factory
+        self.redis.save_pool(self.vm_type)
         self.runners = {}
-        self.runners = self.redis.get_runners(self.redis_key_name())
+        self.index = index if index is not None else {}
+        self.generation = -1
+        # Moving average of the seconds for a new runner to be online
+        self.boot_time = None
+        self.get_runners()
 
     def get_runners(self) -> dict[str, Runner]:
-        self.runners = self.redis.get_runners(self.redis_key_name())
+        """
+        Reload the runners from redis if the cache is outdated and return them
+        """
+        generation = self.redis.get_manager_generation(self.redis_key_name())
+        if generation != self.generation:
+            for name in list(self.runners):
+                if self.index.get(name) is self:
+                    del self.index[name]
+            self.runners = self.redis.get_runners(self.redis_key_name())
+            self.index.update(dict.fromkeys(self.runners, self))
+            self.generation = generation
         return self.runners
 
+    def track(self, runner: Runner) -> None:
+        """
+        Add a runner to the cache and the index
+        """
+        self.runners[runner.name] = runner
+        self.index[runner.name] = self
+
+    def untrack(self, name: str) -> None:
+        """
+        Remove a runner from the cache and the index
+        """
+        self.runners.pop(name, None)
+        if self.index.get(name) is self:
+            del self.index[name]
+
+    def written(self, count: int = 1) -> None:
+        """
+        Keep the cache generation in line with the writes done by this manager
+        Each RedisManager write increments the generation counter once
+        """
+        self.generation += count
+
     def redis_key_name(self) -> str:
         """
         Define the redis key name for this instance
         :return:
         """
-        return f'managers:{"-".join(self.vm_type.tags)}'
+        return f"managers:{self.vm_type.pool_id}"
 
     def update_runner(self, github_runner: dict) -> None:
-        self.runners = self.redis.get_runners(self.redis_key_name())
         if github_runner["name"] in self.runners:
             runner = self.runners[github_runner["name"]]
+            starting = runner.status in ["creating", "respawning"]
             runner.update_from_github(github_runner)
-            self.redis.update_runner(runner)
+            if starting and not runner.is_offline:
+                boot_time = runner.time_since_created.total_seconds()
+                self.boot_time = (
+                    boot_time
+                    if self.boot_time is None
+                    else 0.8 * self.boot_time + 0.2 * boot_time
+                )
+                cloud_manager = self.factory.cloud_manager
+                metrics.runner_time_to_online_seconds.labels(
+                    cloud=cloud_manager.name,
+                    baked=str(self.vm_type.pool_id in cloud_manager.baked_images),
+                ).observe(boot_time)
+            if self.redis.update_runner(
+                runner, fields=["status", "status_history", "started_at", "action_id"]
+            ):
+                self.written()
+            else:
+                # Deleted by another process, reload the runners on the next read
+                self.generation = -1
 
     def update_runners(self, github_runners: list[dict]) -> None:
         """
@@ -53,70 +124,117 @@ class RunnerManager(object):
         :param github_runners:
         :return:
         """
-        self.runners = self.redis.get_runners(self.redis_key_name())
+        self.get_runners()
 
         # Remove runners not listed on github
         github_r_names = [r["name"] for r in github_runners]
         runners_to_deletes = [
             name
-            for name, r in self.get_runners().items()
+            for name, r in self.runners.items()
             if name not in github_r_names and not r.is_creating
         ]
-        for name in runners_to_deletes:
-            self.delete_runner(self.runners[name])
+        self.delete_runners([self.runners[name] for name in runners_to_deletes])
 
         # Update status of each runner
         for elem in github_runners:
             self.update_runner(elem)
 
-    def create_runner(self) -> None:
+    def create_runner(self) -> bool:
         """
         Here we create an VM with the factory and
            if everything succeed we store the result in the redis Database.
 
         It won't create a Runner if we are already at the maximum we want.
         In the case the max is set at 0 we don't have a maximum.
+        :return: False if the runner was not created
         """
         if 0 < self.vm_type.quantity["max"] <= len(self.runners):
             logger.info("Runner not created, already to much")
-            return
+            return False
 
         if not self.redis.get_manager_running():
             logger.warning("Spawning set to off. No runner started")
-            return
+            return False
 
-        self.runners = self.redis.get_runners(self.redis_key_name())
         runner = self.factory.create_runner(self.vm_type)
+        if runner is None:
+            logger.warning("Runner not created, the creation queue is full")
+            return False
+
         runner.update_status("creating")
-        self.runners[runner.name] = runner
+        self.track(runner)
 
         self.redis.update_runner(runner)
-        self.redis.update_manager_runners(
-            self.redis_key_name(), list(self.runners.values())
-        )
+        self.written()
+        return True
+
+    def create_runners(self, count: int) -> int:
+        """
+        Create several runners, their VMs are created in a single cloud request
+        It won't create more runners than the maximum.
+        :return: the number of runners created
+        """
+        if 0 < self.vm_type.quantity["max"]:
+            count = min(count, self.vm_type.quantity["max"] - len(self.runners))
+        if count <= 0:
+            return 0
+
+        if not self.redis.get_manager_running():
+            logger.warning("Spawning set to off. No runner started")
+            return 0
+
+        runners = self.factory.create_runners(self.vm_type, count)
+        if len(runners) < count:
+            logger.warning(
+                f"{count - len(runners)} runners not created, the creation queue is full"
+            )
+
+        with self.redis.batch():
+            for runner in runners:
+                runner.update_status("creating")
+                self.track(runner)
+                self.redis.update_runner(runner)
+        self.written(len(runners))
+        return len(runners)
 
     def delete_runner(self, runner: Runner) -> None:
-        self.runners = self.redis.get_runners(self.redis_key_name())
         runner.update_status("deleting")
         self.factory.delete_runner(runner)
-        del self.runners[runner.name]
+        self.untrack(runner.name)
 
         self.redis.delete_runner(runner)
-        self.redis.update_manager_runners(
-            self.redis_key_name(), list(self.runners.values())
-        )
+        self.written()
 
         del runner
 
+    def delete_runners(self, runners: list[Runner]) -> dict[str, bool]:
+        """
+        Delete several runners, GitHub and the cloud are called concurrently
+        and redis is cleaned in a single batch
+        :return: for each runner name, True if it was deleted from GitHub and the cloud
+        """
+        if not runners:
+            return {}
+
+        for runner in runners:
+            runner.update_status("deleting")
+        report = self.factory.delete_runners(runners)
+
+        with self.redis.batch():
+            for runner in runners:
+                self.untrack(runner.name)
+                self.redis.delete_runner(runner)
+        self.written(len(runners))
+        return report
+
     def respawn_runner(self, runner: Runner) -> None:
-        self.runners = self.redis.get_runners(self.redis_key_name())
         runner.update_status("respawning")
-        self.runners[runner.name] = runner
+        self.track(runner)
         self.factory.respawn_replace(runner)
         self.redis.update_runner(runner)
+        self.written()
 
     def runners_not_used_for(self, duration: datetime.timedelta) -> [Runner]:
-        self.runners = self.redis.get_runners(self.redis_key_name())
         return self.filter_runners(
             lambda runner: runner.status == "online"
             and not runner.has_run
@@ -126,10 +244,10 @@ class RunnerManager(object):
     def filter_runners(self, cond: Callable[[Runner], bool]) -> [Runner]:
         """
         Return a list of runner matching the condition function
+        It reads the local cache, call `get_runners` first to refresh it
         :param cond:
         :return:
         """
-        self.runners = self.redis.get_runners(self.redis_key_name())
         return list(
             filter(
                 lambda e: (
@@ -137,7 +255,7 @@ class RunnerManager(object):
                     and e.vm_type.tags == self.vm_type.tags
                     and cond(e)
                 ),
-                self.runners.values(),
+                list(self.runners.values()),
             )
         )
 
@@ -0,0 +1,49 @@
+import unittest
+
+import fakeredis
+from runners_manager.runner.Autoscaler import Autoscaler
+from runners_manager.runner.Autoscaler import DAY
+from runners_manager.runner.RedisManager import RedisManager
+
+
+class TestAutoscaler(unittest.TestCase):
+    def setUp(self) -> None:
+        self.redis = RedisManager(fakeredis.FakeStrictRedis())
+        self.autoscaler = Autoscaler(self.redis, boot_time=300)
+        # The recent window starts 1050 seconds before now
+        self.now = 100 * DAY + 150
+
+    def record(self, action: str, count: int, now: float) -> None:
+        for _ in range(count):
+            self.autoscaler.record("centos7-small", action, now)
+
+    def test_no_history(self):
+        self.assertEqual(self.autoscaler.target("centos7-small", 1, 4, now=self.now), 1)
+
+    def test_arrival_rate(self):
+        self.record("queued", 7, self.now - 100)
+        self.record("in_progress", 7, self.now - 50)
+        # 7 jobs in 1050 seconds, 2 jobs arrive while a runner boots
+        self.assertEqual(self.autoscaler.target("centos7-small", 1, 4, now=self.now), 2)
+        # A faster boot needs fewer runners waiting
+        self.assertEqual(
+            self.autoscaler.target("centos7-small", 0, 4, boot_time=100, now=self.now),
+            1,
+        )
+
+    def test_backlog(self):
+        self.record("queued", 7, self.now - 100)
+        self.record("in_progress", 4, self.now - 50)
+        self.assertEqual(self.autoscaler.target("centos7-small", 1, 0, now=self.now), 5)
+        self.assertEqual(self.autoscaler.target("centos7-small", 1, 4, now=self.now), 4)
+
+    def test_seasonality(self):
+        # Yesterday 18 jobs arrived in the next 900 seconds, nothing yet today
+        self.record("queued", 18, self.now - DAY + 600)
+        self.record("in_progress", 18, self.now - DAY + 600)
+        # Half the rate of yesterday: 18 / 900 / 2 jobs per second during 300 seconds
+        self.assertEqual(self.autoscaler.target("centos7-small", 0, 0, now=self.now), 3)
+        # Events of other actions or after the forecast are ignored
+        self.record("completed", 10, self.now - DAY + 600)
+        self.record("queued", 10, self.now - DAY + 2000)
+        self.assertEqual(self.autoscaler.target("centos7-small", 0, 0, now=self.now), 3)
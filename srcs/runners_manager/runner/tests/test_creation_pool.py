@@ -0,0 +1,101 @@
+import threading
+import unittest
+
+from runners_manager.runner.CreationPool import CreationPool
+
+
+class TestCreationPool(unittest.TestCase):
+    def setUp(self) -> None:
+        self.pool = CreationPool(
+            "test", max_workers=4, max_queue_depth=4, pool_concurrency=2
+        )
+        self.release = threading.Event()
+        self.started = []
+
+    def tearDown(self) -> None:
+        self.release.set()
+        self.pool.shutdown()
+
+    def create(self, name: str) -> str:
+        self.started.append(name)
+        self.release.wait(5)
+        return name
+
+    def test_pool_concurrency(self):
+        futures = [
+            self.pool.submit(f"a-{i}", "a", self.create, f"a-{i}") for i in range(3)
+        ]
+        b = self.pool.submit("b-0", "b", self.create, "b-0")
+
+        # The third creation of the pool waits for a free slot
+        self.assertEqual(len(self.pool.in_flight["a"]), 2)
+        self.assertEqual(len(self.pool.in_flight["b"]), 1)
+        self.assertFalse(futures[2].running())
+
+        self.release.set()
+        self.assertEqual([f.result(5) for f in futures], ["a-0", "a-1", "a-2"])
+        self.assertEqual(b.result(5), "b-0")
+
+    def test_pool_capacity(self):
+        self.assertEqual(self.pool.pool_capacity("a"), 2)
+        self.pool.submit("a-0", "a", self.create, "a-0")
+        self.assertEqual(self.pool.pool_capacity("a"), 1)
+        self.pool.submit_batch(["a-1", "a-2"], "a", self.create, "a")
+        # The queue has room left but the pool can't start more creations
+        self.assertEqual(self.pool.pool_capacity("a"), 0)
+        self.assertEqual(self.pool.pool_capacity("b"), 1)
+
+    def test_pool_capacity_cancelled(self):
+        self.pool.shutdown()
+        self.pool = CreationPool(
+            "test", max_workers=4, max_queue_depth=6, pool_concurrency=3
+        )
+        for i in range(3):
+            self.pool.submit(f"a-{i}", "a", self.create, f"a-{i}")
+        self.pool.submit_batch(["a-3", "a-4"], "a", self.create, "a")
+        self.pool.submit("a-5", "a", self.create, "a-5")
+        self.assertEqual(self.pool.pool_capacity("b"), 0)
+
+        # The queued creations cancelled free their slots,
+        # a creation of a batch is only flagged but does not count either
+        self.pool.cancel("a-5")
+        self.pool.cancel("a-3")
+        self.assertEqual(self.pool.pool_capacity("b"), 2)
+        self.assertEqual(self.pool.pool_capacity("a"), 0)
+
+    def test_queue_depth(self):
+        for i in range(4):
+            self.assertIsNotNone(self.pool.submit(f"a-{i}", "a", self.create, i))
+        self.assertIsNone(self.pool.submit("a-4", "a", self.create, 4))
+
+    def test_cancel(self):
+        self.pool.submit("a-0", "a", self.create, "a-0")
+        self.pool.submit("a-1", "a", self.create, "a-1")
+        queued = self.pool.submit("a-2", "a", self.create, "a-2")
+
+        self.assertTrue(self.pool.cancel("a-2"))
+        self.assertTrue(queued.cancelled())
+        # A running creation is only flagged
+        self.assertTrue(self.pool.cancel("a-0"))
+        self.assertTrue(self.pool.cancelled("a-0"))
+        self.assertFalse(self.pool.cancel("unknown"))
+
+        self.release.set()
+        self.pool.shutdown()
+        self.assertNotIn("a-2", self.started)
+        self.assertEqual(self.pool.tasks, {})
+
+    def test_batch(self):
+        batch = self.pool.submit_batch(["a-1", "a-2", "a-3"], "a", self.create, "a")
+        self.assertEqual(self.pool.capacity(), 1)
+        self.assertIsNone(self.pool.submit_batch(["b-1", "b-2"], "b", self.create, "b"))
+
+        # A runner of a batch can't be removed from its task, it is only flagged
+        self.assertTrue(self.pool.cancel("a-2"))
+        self.assertTrue(self.pool.cancelled("a-2"))
+        self.assertFalse(batch.cancelled())
+
+        self.release.set()
+        self.assertEqual(batch.result(5), "a")
+        self.pool.shutdown()
+        self.assertEqual(self.pool.capacity(), 4)
@@ -0,0 +1,91 @@
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from runners_manager.runner.EventQueue import EventQueue
+
+
+class TestEventQueue(unittest.TestCase):
+    def setUp(self) -> None:
+        # fakeredis has no streams, the redis manager is mocked
+        self.redis = MagicMock()
+        self.handler = MagicMock()
+        self.queue = EventQueue(self.redis, self.handler, shards=4)
+
+    def event_id(self, age: float = 0) -> str:
+        return f"{int((time.time() - age) * 1000)}-0"
+
+    def test_put(self):
+        self.queue.put("workflow_job", "{}", key="42")
+        self.queue.put("workflow_job", "{}", key="42")
+        self.queue.put("ping", "{}")
+        streams = [c.args[0] for c in self.redis.add_event.call_args_list]
+        # The events of a job go to the same stream
+        self.assertEqual(streams[0], streams[1])
+        self.assertIn(streams[2], [f"events:{shard}" for shard in range(4)])
+        self.assertEqual(
+            self.redis.add_event.call_args.args[1], {"event": "ping", "payload": "{}"}
+        )
+
+    def test_poll(self):
+        first, second = self.event_id(5), self.event_id()
+        self.redis.read_events.return_value = [
+            (first, {"event": "workflow_job", "payload": "1"}),
+            (second, {"event": "workflow_job", "payload": "2"}),
+        ]
+        self.handler.side_effect = [Exception("failed"), None]
+
+        self.assertEqual(self.queue.poll("events:0"), 2)
+        self.assertEqual([c.args[1] for c in self.handler.call_args_list], ["1", "2"])
+        # A failing event is left pending, it is claimed and handled again
+        self.assertEqual(
+            [c.args[2] for c in self.redis.ack_event.call_args_list], [second]
+        )
+        self.redis.claim_events.assert_not_called()
+
+    def test_poll_claim(self):
+        self.redis.claim_events.return_value = [
+            (self.event_id(120), {"event": "workflow_job", "payload": "1"}, 2)
+        ]
+        self.assertEqual(self.queue.poll("events:0", claim=True), 1)
+        self.assertEqual(self.redis.claim_events.call_args.args[3], 60000)
+        # The events left by another worker are handled before the new ones
+        self.redis.read_events.assert_not_called()
+        self.handler.assert_called_once_with("workflow_job", "1")
+
+    def test_dead_letter(self):
+        failing = self.event_id(120)
+        fields = {"event": "workflow_job", "payload": "1"}
+        self.handler.side_effect = Exception("failed")
+        for deliveries in range(1, 6):
+            self.redis.claim_events.return_value = [(failing, fields, deliveries)]
+            self.queue.poll("events:0", claim=True)
+        self.assertEqual(self.handler.call_count, 5)
+        self.redis.ack_event.assert_not_called()
+        self.redis.dead_letter_event.assert_not_called()
+
+        # Past `max_deliveries` the event is moved aside without being handled
+        self.redis.claim_events.return_value = [(failing, fields, 6)]
+        self.queue.poll("events:0", claim=True)
+        self.assertEqual(self.handler.call_count, 5)
+        self.redis.dead_letter_event.assert_called_once_with(
+            "events:0", "runner-manager", failing, fields, 10000
+        )
+
+    def test_put_duplicate(self):
+        self.redis.mark_delivered.side_effect = [True, False]
+        self.assertIsNotNone(self.queue.put("workflow_job", "{}", "42", ["a", "job"]))
+        self.assertIsNone(self.queue.put("workflow_job", "{}", "42", ["b", "job"]))
+        self.assertEqual(self.redis.add_event.call_count, 1)
+        self.assertEqual(
+            self.redis.mark_delivered.call_args.args,
+            (["delivered:b", "delivered:job"], 3600),
+        )
+
+    def test_put_failed(self):
+        self.redis.mark_delivered.return_value = True
+        self.redis.add_event.side_effect = Exception("redis down")
+        with self.assertRaises(Exception):
+            self.queue.put("workflow_job", "{}", "42", ["a"])
+        # The redelivery of the event is not dropped
+        self.redis.forget_delivered.assert_called_once_with(["delivered:a"])
@@ -1,8 +1,11 @@
+import datetime
+import threading
 import unittest
 from unittest.mock import MagicMock
 from unittest.mock import patch
 
 import fakeredis
+from prometheus_client import REGISTRY
 from runners_manager.runner.Manager import Manager
 from runners_manager.runner.RedisManager import RedisManager
 
@@ -79,6 +82,36 @@ class TestRunnerManager(unittest.TestCase):
         )
         self.assertEqual(r.runner_managers.__len__(), 1)
 
+    @patch("runners_manager.runner.Manager.RunnerManager")
+    @patch("runners_manager.runner.Manager.RunnerFactory")
+    def test_removed_pool_warm_vms(self, factory, manager):
+        manager.return_value.vm_type.pool_id = "centos7-small"
+        self.fake_redis.add_warm_vm("centos7-small", "vm-1")
+        self.fake_redis.add_warm_vm("centos7-large", "vm-2")
+        Manager(
+            {
+                "github_organization": "test",
+                "runner_pool": [
+                    {
+                        "tags": ["centos7", "small"],
+                        "config": {
+                            "flavor": "m1.small",
+                            "image": "CentOS 7 (PVHVM)",
+                        },
+                        "quantity": {"min": 2, "max": 4, "warm": 1},
+                    }
+                ],
+                "redis": {"host": "test", "port": 1234},
+                "extra_runner_timer": {"minutes": 10, "hours": 10},
+                "timeout_runner_timer": {"minutes": 10, "hours": 10},
+            },
+            self.cloud_manager,
+            self.github_manager,
+            self.fake_redis,
+        )
+        factory.return_value.delete_warm_vms.assert_called_once_with(["vm-2"])
+        self.assertEqual(self.fake_redis.get_warm_pools(), ["centos7-small"])
+
     @patch("runners_manager.runner.Manager.RunnerManager")
     @patch("runners_manager.runner.Manager.RunnerFactory")
     def test_update_without_changes(self, mock_manager, mock_runner_factory):
@@ -134,3 +167,156 @@ class TestRunnerManager(unittest.TestCase):
         self.assertEqual(r.runner_managers[0].create_runner.call_count, 0)
         self.assertEqual(r.runner_managers[0].respawn_runner.call_count, 0)
         self.assertEqual(r.runner_managers[0].delete_runner.call_count, 0)
+
+    @patch("runners_manager.runner.Manager.RunnerManager")
+    @patch("runners_manager.runner.Manager.RunnerFactory")
+    def test_find_pool(self, factory, runner_manager):
+        runner_manager.side_effect = lambda vm_type, *args: MagicMock(vm_type=vm_type)
+        pools = [
+            (["centos7", "small"], False),
+            (["small", "centos7", "gpu"], True),
+            (["centos7", "large"], True),
+            (["centos7", "small", "docker"], True),
+        ]
+        r = Manager(
+            {
+                "github_organization": "test",
+                "runner_pool": [
+                    {
+                        "tags": tags,
+                        "config": {"flavor": "m1.small", "image": "CentOS 7 (PVHVM)"},
+                        "quantity": {"on_demand": on_demand, "min": 0, "max": 4},
+                    }
+                    for tags, on_demand in pools
+                ],
+                "redis": {"host": "test", "port": 1234},
+                "extra_runner_timer": {"minutes": 10, "hours": 10},
+                "timeout_runner_timer": {"minutes": 10, "hours": 10},
+            },
+            self.cloud_manager,
+            self.github_manager,
+            self.fake_redis,
+        )
+
+        def pool_id(manager):
+            return manager.vm_type.pool_id if manager else None
+
+        # Exact match, whatever the order of the labels
+        self.assertEqual(pool_id(r.find_pool(["small", "centos7"])), "centos7-small")
+        self.assertEqual(
+            pool_id(r.find_pool(["self-hosted", "gpu", "centos7", "small"])),
+            "centos7-gpu-small",
+        )
+        self.assertIsNone(r.find_pool(["centos7"]))
+        self.assertIsNone(r.find_pool(["centos7", "small"], on_demand=True))
+
+        # Best match, the smallest pool having every label
+        self.assertEqual(
+            pool_id(r.find_pool(["centos7"], best_match=True)), "centos7-small"
+        )
+        # A job with these labels is picked up by the regular pool
+        self.assertEqual(
+            pool_id(r.find_pool(["self-hosted", "small"], best_match=True)),
+            "centos7-small",
+        )
+        self.assertEqual(
+            pool_id(r.find_pool(["small", "gpu"], best_match=True)),
+            "centos7-gpu-small",
+        )
+        self.assertIsNone(r.find_pool(["centos7", "arm"], best_match=True))
+
+    @patch("runners_manager.runner.Manager.RunnerManager")
+    @patch("runners_manager.runner.Manager.RunnerFactory")
+    def test_manage_pool_target(self, factory, runner_manager):
+        r = Manager(
+            {
+                "github_organization": "test",
+                "runner_pool": [],
+                "redis": {"host": "test", "port": 1234},
+                "extra_runner_timer": {"minutes": 10, "hours": 0},
+                "timeout_runner_timer": {"minutes": 0, "hours": 1},
+            },
+            self.cloud_manager,
+            self.github_manager,
+            self.fake_redis,
+        )
+        r.autoscaler = MagicMock()
+        r.autoscaler.target.return_value = 3
+        manager = MagicMock()
+        manager.vm_type.pool_id = "centos7-small"
+        manager.filter_runners.return_value = []
+        manager.min_runner_number.return_value = 1
+        manager.max_runner_number.return_value = 5
+
+        r.manage_pool(manager)
+        # A single forecast for the trim and the creations of the pass
+        r.autoscaler.target.assert_called_once()
+        manager.create_runners.assert_called_once_with(3)
+
+    @patch("runners_manager.runner.Manager.RunnerManager")
+    @patch("runners_manager.runner.Manager.RunnerFactory")
+    def test_update_runner_status_locked(self, factory, runner_manager):
+        r = Manager(
+            {
+                "github_organization": "test",
+                "runner_pool": [],
+                "redis": {"host": "test", "port": 1234},
+                "extra_runner_timer": {"minutes": 10, "hours": 0},
+                "timeout_runner_timer": {"minutes": 0, "hours": 1},
+            },
+            self.cloud_manager,
+            self.github_manager,
+            self.fake_redis,
+        )
+        manager = MagicMock()
+        manager.vm_type.on_demand = False
+        r.runner_index["runner-0"] = manager
+        r.scheduler.notify = MagicMock()
+
+        # A reconcile running in another thread holds the lock
+        acquired = []
+
+        def update_runner(runner):
+            thread = threading.Thread(
+                target=lambda: acquired.append(r.scheduler.lock.acquire(blocking=False))
+            )
+            thread.start()
+            thread.join()
+
+        manager.update_runner.side_effect = update_runner
+        r.update_runner_status({"name": "runner-0", "status": "online", "busy": True})
+        self.assertListEqual(acquired, [False])
+        r.scheduler.notify.assert_called_once_with(manager)
+
+    @patch("runners_manager.runner.Manager.RunnerManager")
+    @patch("runners_manager.runner.Manager.RunnerFactory")
+    def test_observe_job_wait(self, factory, runner_manager):
+        factory.return_value.cloud_manager.name = "test"
+        r = Manager(
+            {
+                "github_organization": "test",
+                "runner_pool": [],
+                "redis": {"host": "test", "port": 1234},
+                "extra_runner_timer": {"minutes": 10, "hours": 0},
+                "timeout_runner_timer": {"minutes": 0, "hours": 1},
+            },
+            self.cloud_manager,
+            self.github_manager,
+            self.fake_redis,
+        )
+        labels = {"cloud": "test", "pool": "other"}
+        before = (
+            REGISTRY.get_sample_value("runner_manager_job_wait_seconds_sum", labels)
+            or 0
+        )
+        queued_at = datetime.datetime(2022, 1, 1, 12, 0, 0)
+        r.observe_job_wait(
+            ["self-hosted", "arm"],
+            queued_at,
+            queued_at + datetime.timedelta(seconds=90),
+        )
+        self.assertEqual(
+            REGISTRY.get_sample_value("runner_manager_job_wait_seconds_sum", labels)
+            - before,
+            90,
+        )
@@ -0,0 +1,90 @@
+import unittest
+from unittest.mock import MagicMock
+
+from runners_manager.runner.ReconcileScheduler import ReconcileScheduler
+
+
+class TestReconcileScheduler(unittest.TestCase):
+    def setUp(self) -> None:
+        self.manager = MagicMock()
+        self.manager.factory.runner_prefix = "runner"
+        self.manager.factory.github_manager.get_runners.return_value = {
+            "total_count": 1,
+            "runners": [{"name": "runner-0", "status": "online", "busy": False}],
+        }
+        self.scheduler = ReconcileScheduler(
+            self.manager, min_poll_interval=1, max_poll_interval=4, coalesce_window=0
+        )
+
+    def test_notify_without_thread(self):
+        self.scheduler.notify()
+        self.manager.manage_runners.assert_called_once()
+        self.manager.update_all_runners.assert_not_called()
+
+    def test_event_reconcile(self):
+        self.scheduler.next_poll = float("inf")
+        self.scheduler.pending_since = 0
+        self.scheduler.run_once()
+        self.manager.manage_runners.assert_called_once()
+        self.manager.update_all_runners.assert_not_called()
+        self.assertIsNone(self.scheduler.pending_since)
+
+    def test_events_full_poll(self):
+        self.scheduler.run_once()
+        self.manager.update_all_runners.assert_called_once()
+
+        # Events keep arriving, the full poll still runs after max_poll_interval
+        self.scheduler.pending_since = 0
+        self.scheduler.run_once()
+        self.manager.update_all_runners.assert_called_once()
+        self.assertLessEqual(
+            self.scheduler.next_poll, self.scheduler.last_full_poll + 4
+        )
+
+        self.scheduler.last_full_poll -= 4
+        self.scheduler.pending_since = 0
+        self.scheduler.run_once()
+        self.assertEqual(self.manager.update_all_runners.call_count, 2)
+        self.assertEqual(self.manager.manage_runners.call_count, 1)
+
+    def test_adaptive_full_poll(self):
+        self.scheduler.run_once()
+        self.manager.update_all_runners.assert_called_once()
+        self.assertEqual(self.scheduler.poll_interval, 1)
+
+        # Nothing changed on GitHub, the poll interval grows up to the maximum
+        for interval in [2, 4, 4]:
+            self.scheduler.next_poll = 0
+            self.scheduler.run_once()
+            self.assertEqual(self.scheduler.poll_interval, interval)
+
+        self.manager.factory.github_manager.get_runners.return_value = {
+            "total_count": 1,
+            "runners": [{"name": "runner-0", "status": "online", "busy": True}],
+        }
+        self.scheduler.next_poll = 0
+        self.scheduler.run_once()
+        self.assertEqual(self.scheduler.poll_interval, 1)
+
+    def test_pool_reconcile(self):
+        pool = MagicMock()
+        self.scheduler.notify(pool)
+        self.manager.manage_pool.assert_called_once_with(pool)
+        self.manager.manage_runners.assert_not_called()
+
+    def test_pending_pools(self):
+        small, large = MagicMock(), MagicMock()
+        self.scheduler.next_poll = float("inf")
+        self.scheduler.thread = MagicMock()
+        for pool in [small, large, small]:
+            self.scheduler.notify(pool)
+        self.scheduler.run_once()
+        self.assertEqual(self.manager.manage_pool.call_count, 2)
+        self.manager.manage_runners.assert_not_called()
+
+        # An event without pool reconciles every pool
+        self.scheduler.notify(small)
+        self.scheduler.notify()
+        self.scheduler.run_once()
+        self.manager.manage_runners.assert_called_once()
+        self.assertEqual(self.manager.manage_pool.call_count, 2)
@@ -0,0 +1,236 @@
+import json
+import unittest
+from unittest.mock import MagicMock
+
+import fakeredis
+from prometheus_client import REGISTRY
+from runners_manager.runner.RedisManager import RedisManager
+from runners_manager.runner.Runner import Runner
+from runners_manager.vm_creation.VmType import VmType
+
+
+class TestRedisManager(unittest.TestCase):
+    def setUp(self) -> None:
+        self.fake_redis = RedisManager(fakeredis.FakeStrictRedis())
+        self.vm_type = VmType.register(
+            VmType(
+                {
+                    "tags": ["centos7", "small"],
+                    "config": {
+                        "flavor": "m1.small",
+                        "image": "CentOS 7 (PVHVM)",
+                    },
+                    "quantity": {"min": 2, "max": 4},
+                }
+            )
+        )
+
+    def test_batch(self):
+        runners = [Runner(str(i), None, self.vm_type, "cloud") for i in range(3)]
+        with self.fake_redis.batch():
+            for runner in runners:
+                self.fake_redis.update_runner(runner)
+
+            # Nothing is sent before the end of the batch
+            self.assertEqual(self.fake_redis.get_runners("managers:centos7-small"), {})
+            # But the generation already counts the pending writes
+            self.assertEqual(
+                self.fake_redis.get_manager_generation("managers:centos7-small"), 3
+            )
+
+        self.assertEqual(self.fake_redis.round_trips_saved, 2)
+        self.assertListEqual(
+            sorted(self.fake_redis.get_runners("managers:centos7-small").keys()),
+            ["0", "1", "2"],
+        )
+        self.assertEqual(
+            self.fake_redis.get_manager_generation("managers:centos7-small"), 3
+        )
+
+    def test_update_runner_fields(self):
+        runner = Runner("0", None, self.vm_type, "cloud")
+        self.fake_redis.update_runner(runner)
+
+        runner.vm_id = "vm"
+        runner.update_status("online")
+        self.fake_redis.update_runner(runner, fields=["status"])
+
+        saved = self.fake_redis.get_runner(runner.redis_key_name())
+        self.assertEqual(saved.status, "online")
+        self.assertIsNone(saved.vm_id)
+
+        self.fake_redis.delete_runner(runner)
+        self.assertIsNone(self.fake_redis.get_runner(runner.redis_key_name()))
+        self.assertEqual(self.fake_redis.get_runners("managers:centos7-small"), {})
+
+        # The fields of a deleted runner are not written again
+        self.fake_redis.update_runner(runner, fields=["status"])
+        with self.fake_redis.batch():
+            self.fake_redis.update_runner(runner, fields=["vm_id"])
+        self.assertFalse(self.fake_redis.runner_exists(runner.redis_key_name()))
+        self.assertEqual(self.fake_redis.get_all_runners(), [])
+
+    def test_update_runner_fields_batch(self):
+        runner = Runner("0", None, self.vm_type, "cloud")
+        self.fake_redis.update_runner(runner)
+        with self.fake_redis.batch():
+            self.fake_redis.update_runner(runner, fields=["status"])
+            self.assertEqual(
+                self.fake_redis.get_manager_generation("managers:centos7-small"), 2
+            )
+            # The values of the runner when the batch is flushed are written
+            runner.update_status("online")
+        self.assertEqual(
+            self.fake_redis.get_runner(runner.redis_key_name()).status, "online"
+        )
+        self.assertEqual(
+            self.fake_redis.get_manager_generation("managers:centos7-small"), 2
+        )
+
+    def test_save_vm_id(self):
+        runner = Runner("0", None, self.vm_type, "cloud")
+        with self.fake_redis.batch():
+            self.fake_redis.update_runner(runner)
+            # The VM is created before the batch saving the runner is flushed
+            runner.vm_id = "vm"
+            self.fake_redis.save_vm_id(runner)
+            self.assertIn(runner.redis_key_name(), self.fake_redis.pending_vm_ids)
+        self.assertEqual(
+            self.fake_redis.get_runner(runner.redis_key_name()).vm_id, "vm"
+        )
+        self.assertEqual(self.fake_redis.pending_vm_ids, {})
+
+        # A deleted runner is not saved again
+        deleted = Runner("1", None, self.vm_type, "cloud")
+        self.fake_redis.update_runner(deleted)
+        self.fake_redis.delete_runner(deleted)
+        deleted.vm_id = "vm"
+        self.fake_redis.save_vm_id(deleted)
+        self.assertFalse(self.fake_redis.runner_exists(deleted.redis_key_name()))
+        self.fake_redis.delete_runner(deleted)
+        self.assertEqual(self.fake_redis.pending_vm_ids, {})
+
+    def test_incomplete_runner_dropped(self):
+        runner = Runner("0", None, self.vm_type, "cloud")
+        self.fake_redis.update_runner(runner)
+        # A hash holding only some fields, like the update of a deleted runner
+        client = self.fake_redis.redis
+        client.hset("runners:1", mapping={"vm_id": json.dumps("vm")})
+        client.sadd("managers:centos7-small", "runners:1")
+        client.sadd(RedisManager.RUNNERS_REGISTRY, "runners:1")
+
+        self.assertListEqual(
+            list(self.fake_redis.get_runners("managers:centos7-small").keys()), ["0"]
+        )
+        self.assertFalse(client.exists("runners:1"))
+        self.assertFalse(client.sismember("managers:centos7-small", "runners:1"))
+        self.assertFalse(client.sismember(RedisManager.RUNNERS_REGISTRY, "runners:1"))
+        self.assertEqual([r.name for r in self.fake_redis.get_all_runners()], ["0"])
+
+    def test_migrate_json_layout(self):
+        client = fakeredis.FakeStrictRedis()
+        runner = Runner("0", None, self.vm_type, "cloud")
+        client.set("managers:centos7-small", json.dumps([runner.redis_key_name()]))
+        client.set(
+            runner.redis_key_name(),
+            json.dumps(
+                {
+                    "name": "0",
+                    "status": "offline",
+                    "status_history": [],
+                    "action_id": None,
+                    "vm_id": None,
+                    "cloud": "cloud",
+                    "vm_type": self.vm_type.toJson(),
+                    "created_at": str(runner.created_at),
+                    "started_at": None,
+                }
+            ),
+        )
+
+        redis_manager = RedisManager(client)
+        self.assertEqual(client.type("managers:centos7-small"), b"set")
+        self.assertEqual(client.type(runner.redis_key_name()), b"hash")
+        self.assertEqual(
+            client.hget(runner.redis_key_name(), "pool"), b'"centos7-small"'
+        )
+        self.assertEqual(
+            redis_manager.get_runners("managers:centos7-small"), {"0": runner}
+        )
+
+    def test_unknown_pool(self):
+        vm_type = VmType(
+            {
+                "tags": ["removed"],
+                "config": {"flavor": "m1.small", "image": "CentOS 7 (PVHVM)"},
+                "quantity": {"min": 0, "max": 1},
+            }
+        )
+        self.fake_redis.save_pool(vm_type)
+        self.fake_redis.update_runner(Runner("0", None, vm_type, "cloud"))
+
+        runner = self.fake_redis.get_runner("runners:0")
+        self.assertEqual(runner.vm_type.config, vm_type.config)
+        self.assertIs(runner.vm_type, VmType.from_pool_id("removed"))
+
+    def test_keys_registry(self):
+        runners = [Runner(str(i), None, self.vm_type, "cloud") for i in range(2)]
+        for runner in runners:
+            self.fake_redis.update_runner(runner)
+        self.fake_redis.delete_runner(runners[0])
+
+        self.assertListEqual(
+            self.fake_redis.get_all_runners_managers(), ["managers:centos7-small"]
+        )
+        self.assertListEqual(self.fake_redis.get_all_runners(), [runners[1]])
+
+        self.fake_redis.redis.delete(
+            RedisManager.MANAGERS_REGISTRY, RedisManager.RUNNERS_REGISTRY
+        )
+        self.fake_redis.rebuild_registry()
+        self.assertListEqual(self.fake_redis.get_all_runners(), [runners[1]])
+
+        self.fake_redis.delete_runners_manager("managers:centos7-small")
+        self.assertListEqual(self.fake_redis.get_all_runners_managers(), [])
+
+    def test_mark_delivered(self):
+        self.assertTrue(self.fake_redis.mark_delivered(["delivered:a", "job"], 60))
+        self.assertFalse(self.fake_redis.mark_delivered(["delivered:b", "job"], 60))
+        self.assertEqual(self.fake_redis.redis.ttl("delivered:b"), 60)
+
+        self.fake_redis.forget_delivered(["job"])
+        self.assertTrue(self.fake_redis.mark_delivered(["job"], 60))
+
+    def test_claim_events(self):
+        # fakeredis has no streams, the client is mocked
+        redis_manager = RedisManager(MagicMock())
+        redis_manager.redis.xpending_range.return_value = [
+            {"message_id": b"1-0", "time_since_delivered": 90000, "times_delivered": 2},
+            {"message_id": b"2-0", "time_since_delivered": 10, "times_delivered": 1},
+        ]
+        redis_manager.redis.xclaim.return_value = [(b"1-0", {b"event": b"ping"})]
+
+        events = redis_manager.claim_events("events:0", "group", "me", 60000, 10)
+        self.assertListEqual(events, [("1-0", {"event": "ping"}, 3)])
+        self.assertEqual(redis_manager.redis.xclaim.call_args.args[4], ["1-0"])
+
+    def test_command_latency(self):
+        def commands_count(command):
+            return (
+                REGISTRY.get_sample_value(
+                    "runner_manager_redis_command_seconds_count", {"command": command}
+                )
+                or 0
+            )
+
+        gets, transactions = commands_count("GET"), commands_count("MULTI")
+        self.fake_redis.get_manager_running()
+        self.fake_redis.set_manager_running(False)
+        self.assertEqual(commands_count("GET") - gets, 1)
+        self.assertEqual(commands_count("MULTI") - transactions, 1)
+
+        # A client shared by two managers is only timed once
+        redis_manager = RedisManager(self.fake_redis.redis)
+        gets = commands_count("GET")
+        redis_manager.get_manager_running()
+        self.assertEqual(commands_count("GET") - gets, 1)
@@ -0,0 +1,135 @@
+import unittest
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import fakeredis
+from runners_manager.runner.CreationPool import CreationPool
+from runners_manager.runner.RedisManager import RedisManager
+from runners_manager.runner.Runner import Runner
+from runners_manager.runner.RunnerFactory import RunnerFactory
+from runners_manager.vm_creation.VmType import VmType
+
+
+class TestRunnerFactory(unittest.TestCase):
+    def setUp(self) -> None:
+        self.redis = RedisManager(fakeredis.FakeStrictRedis())
+        self.cloud_manager = MagicMock()
+        self.cloud_manager.name = "cloud"
+        self.cloud_manager.supports_warm_pool = True
+        self.cloud_manager.supports_baking = True
+        self.cloud_manager.baked_images = {}
+        self.github_manager = MagicMock()
+        self.factory = RunnerFactory(
+            self.cloud_manager, self.github_manager, "org", self.redis
+        )
+        self.vm_type = VmType(
+            {
+                "tags": ["centos7", "small"],
+                "config": {"flavor": "m1.small", "image": "CentOS 7 (PVHVM)"},
+                "quantity": {"min": 1, "max": 4, "warm": 2},
+            }
+        )
+
+    def tearDown(self) -> None:
+        self.factory.creations.shutdown()
+
+    def test_warm_pool(self):
+        self.cloud_manager.create_warm_vm.side_effect = ["vm-1", "vm-2"]
+        self.assertEqual(self.factory.fill_warm_pool(self.vm_type), 2)
+        self.factory.creations.shutdown()
+        self.assertEqual(self.redis.count_warm_vms(self.vm_type.pool_id), 2)
+        self.assertEqual(self.factory.warming[self.vm_type.pool_id], 0)
+
+    def test_warm_pool_trimmed(self):
+        for vm_id in ["vm-1", "vm-2", "vm-3"]:
+            self.redis.add_warm_vm(self.vm_type.pool_id, vm_id)
+        self.assertEqual(self.factory.fill_warm_pool(self.vm_type), 0)
+        self.assertEqual(self.redis.count_warm_vms(self.vm_type.pool_id), 2)
+        self.cloud_manager.delete_warm_vm.assert_called_once()
+
+        # Without warm VMs configured the pool is emptied
+        self.vm_type.quantity["warm"] = 0
+        self.assertEqual(self.factory.fill_warm_pool(self.vm_type), 0)
+        self.assertEqual(self.redis.count_warm_vms(self.vm_type.pool_id), 0)
+        self.assertEqual(self.cloud_manager.delete_warm_vm.call_count, 3)
+
+    @patch.object(RedisManager, "count_warm_vms", return_value=1)
+    @patch.object(RedisManager, "pop_warm_vm", side_effect=["vm-1"])
+    def test_create_runners_from_warm_pool(self, pop_warm_vm, count_warm_vms):
+        self.cloud_manager.start_warm_vm.return_value = True
+        self.cloud_manager.create_vms.return_value = ["vm-2", "vm-3"]
+
+        runners = self.factory.create_runners(self.vm_type, 3)
+        self.factory.creations.shutdown()
+
+        self.assertEqual(len(runners), 3)
+        self.assertEqual(runners[0].vm_id, "vm-1")
+        self.cloud_manager.start_warm_vm.assert_called_once()
+        # The runners missing are created cold in a single batch
+        self.cloud_manager.create_vms.assert_called_once()
+        self.assertListEqual([r.vm_id for r in runners[1:]], ["vm-2", "vm-3"])
+        pop_warm_vm.assert_called_once_with(self.vm_type.pool_id)
+
+    def test_bake(self):
+        self.vm_type.bake = True
+        self.cloud_manager.bake_image.side_effect = ["image-1", "image-2"]
+
+        # A pool without image is baked when loaded
+        self.factory.load_baked_images([self.vm_type])
+        self.factory.creations.shutdown()
+        self.assertEqual(self.redis.get_baked_image(self.vm_type.pool_id), "image-1")
+        self.assertEqual(self.cloud_manager.baked_images, {"centos7-small": "image-1"})
+
+        # A rebake replaces the image and deletes the previous one
+        self.factory.creations = CreationPool("cloud")
+        self.assertTrue(self.factory.bake(self.vm_type))
+        self.factory.creations.shutdown()
+        self.assertEqual(self.redis.get_baked_image(self.vm_type.pool_id), "image-2")
+        self.cloud_manager.delete_image.assert_called_once_with("image-1")
+
+        # The image is deleted when the pool no longer bakes
+        self.vm_type.bake = False
+        self.factory.load_baked_images([self.vm_type])
+        self.assertIsNone(self.redis.get_baked_image(self.vm_type.pool_id))
+        self.cloud_manager.delete_image.assert_called_with("image-2")
+
+    def test_batch_pool_concurrency(self):
+        self.cloud_manager.supports_warm_pool = False
+        self.cloud_manager.create_vms.side_effect = lambda runners, *args, **kwargs: [
+            f"vm-{runner.name}" for runner in runners
+        ]
+        self.factory.creations.shutdown()
+        self.factory.creations = CreationPool("cloud", pool_concurrency=3)
+
+        # The batch is cut to the creations the pool can still run
+        self.assertEqual(len(self.factory.create_runners(self.vm_type, 40)), 3)
+        self.factory.creations.shutdown()
+        self.cloud_manager.create_vms.assert_called_once()
+        self.assertEqual(
+            len(self.cloud_manager.create_vms.call_args.kwargs["runners"]), 3
+        )
+
+    def test_batch_names_unused(self):
+        self.cloud_manager.create_vms.side_effect = lambda runners, *args, **kwargs: [
+            f"vm-{runner.name}" for runner in runners
+        ]
+        self.cloud_manager.supports_warm_pool = False
+        # The first name takes the index 1
+        base = self.factory.generate_runner_name(self.vm_type).rsplit("-", 1)[0]
+        # A live runner has the name the next batch would give its second runner
+        taken = Runner(f"{base}-2-2", "vm", self.vm_type, "cloud")
+        self.redis.update_runner(taken)
+
+        first = self.factory.create_runners(self.vm_type, 2)
+        self.factory.creations.shutdown()
+        # A restarted manager goes on with the same counter
+        factory = RunnerFactory(
+            self.cloud_manager, self.github_manager, "org", self.redis
+        )
+        second = factory.create_runners(self.vm_type, 2)
+        factory.creations.shutdown()
+
+        names = [runner.name for runner in first + second]
+        self.assertEqual(len(set(names)), 4)
+        self.assertNotIn(taken.name, names)
+        self.assertListEqual([n.rsplit("-", 1)[1] for n in names], ["1", "2"] * 2)
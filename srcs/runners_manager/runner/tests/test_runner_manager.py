@@ -258,3 +258,112 @@ class TestRunnerManager(unittest.TestCase):
 
         r.update_runners([{"name": "0", "id": 0, "status": "online", "busy": True}])
         self.assertEqual(r.runners.__len__(), 1)
+
+    def test_runners_cache(self):
+        self.factory.create_runner.side_effect = [
+            Runner("0", None, self.vm_type_normal, "cloud"),
+            Runner("1", None, self.vm_type_normal, "cloud"),
+        ]
+        r = RunnerManager(self.vm_type_normal, self.factory, self.fake_redis)
+        r.create_runner()
+        runners = r.runners
+
+        # Writes done by the manager itself keep the cache valid
+        self.assertIs(r.get_runners(), runners)
+
+        # A write done elsewhere invalidate the cache
+        r2 = RunnerManager(self.vm_type_normal, self.factory, self.fake_redis)
+        r2.create_runner()
+        self.assertIsNot(r.get_runners(), runners)
+        self.assertListEqual(sorted(r.runners.keys()), ["0", "1"])
+        self.assertEqual(r.generation, r2.generation)
+
+    def test_runner_deleted_elsewhere(self):
+        self.factory.create_runner.side_effect = [
+            Runner(str(i), None, self.vm_type_normal, "cloud") for i in range(2)
+        ]
+        r = RunnerManager(self.vm_type_normal, self.factory, self.fake_redis)
+        r.create_runner()
+        r.create_runner()
+
+        # Another process deletes the runners while their updates are on the way
+        self.fake_redis.delete_runner(Runner("0", None, self.vm_type_normal, "cloud"))
+        r.update_runner({"name": "0", "id": 0, "status": "online", "busy": False})
+        self.assertListEqual(list(r.get_runners().keys()), ["1"])
+
+        self.fake_redis.delete_runner(Runner("1", None, self.vm_type_normal, "cloud"))
+        with self.fake_redis.batch():
+            r.update_runner({"name": "1", "id": 1, "status": "online", "busy": False})
+        self.assertEqual(r.get_runners(), {})
+
+    def test_delete_runners(self):
+        self.factory.create_runner.side_effect = [
+            Runner(str(i), None, self.vm_type_normal, "cloud") for i in range(3)
+        ]
+        self.factory.delete_runners.return_value = {"0": True, "1": False}
+        r = RunnerManager(self.vm_type_normal, self.factory, self.fake_redis)
+        for _ in range(3):
+            r.create_runner()
+
+        report = r.delete_runners([r.runners["0"], r.runners["1"]])
+        self.assertEqual(report, {"0": True, "1": False})
+        self.assertEqual(self.factory.delete_runners.call_count, 1)
+        self.assertListEqual(list(r.runners.keys()), ["2"])
+        self.assertListEqual(
+            list(self.fake_redis.get_runners(r.redis_key_name()).keys()), ["2"]
+        )
+        # The cache is still valid after the batch
+        runners = r.runners
+        self.assertIs(r.get_runners(), runners)
+
+    def test_create_runners(self):
+        self.factory.create_runners.side_effect = lambda vm_type, count: [
+            Runner(f"batch-{i}", None, vm_type, "cloud") for i in range(1, count + 1)
+        ]
+        r = RunnerManager(self.vm_type_normal, self.factory, self.fake_redis)
+
+        # The pool max is 4
+        self.assertEqual(r.create_runners(6), 4)
+        self.factory.create_runners.assert_called_once_with(self.vm_type_normal, 4)
+        self.assertTrue(all(runner.is_creating for runner in r.runners.values()))
+        self.assertEqual(
+            len(self.fake_redis.get_runners(r.redis_key_name())), len(r.runners)
+        )
+        self.assertEqual(r.create_runners(1), 0)
+
+    def test_runner_index(self):
+        self.factory.create_runners.side_effect = lambda vm_type, count: [
+            Runner(f"{vm_type.pool_id}-{i}", None, vm_type, "cloud")
+            for i in range(count)
+        ]
+        vm_type_large = VmType(
+            {
+                "tags": ["centos7", "large"],
+                "config": {"flavor": "m1.large", "image": "CentOS 7 (PVHVM)"},
+                "quantity": {"min": 1, "max": 2},
+            }
+        )
+        index = {}
+        small = RunnerManager(self.vm_type_normal, self.factory, self.fake_redis, index)
+        large = RunnerManager(vm_type_large, self.factory, self.fake_redis, index)
+        small.create_runners(2)
+        large.create_runners(1)
+        self.assertEqual(
+            {name: manager.vm_type.pool_id for name, manager in index.items()},
+            {
+                "centos7-small-0": "centos7-small",
+                "centos7-small-1": "centos7-small",
+                "centos7-large-0": "centos7-large",
+            },
+        )
+
+        small.delete_runners([small.runners["centos7-small-0"]])
+        self.assertNotIn("centos7-small-0", index)
+
+        # A runner created by another process is indexed when the cache is reloaded
+        other = RunnerManager(self.vm_type_normal, self.factory, self.fake_redis)
+        other.create_runners(1)
+        index.clear()
+        small.get_runners()
+        self.assertIs(index["centos7-small-1"], small)
+        self.assertIs(index["centos7-small-0"], small)
@@ -0,0 +1,84 @@
+import threading
+import time
+from collections.abc import Callable
+
+
+class TTLCache(object):
+    """
+    Keep values until they expire
+
+    A value expires `ttl` seconds after it was loaded, or `margin` seconds before
+    the date returned by `expiry` when the value carries its own expiration.
+    Concurrent callers asking for the same expired key share a single load.
+    """
+
+    ttl: float
+    margin: float
+    expiry: Callable[[object], float] or None
+    values: dict
+
+    def __init__(
+        self,
+        ttl: float,
+        margin: float = 0,
+        expiry: Callable[[object], float] or None = None,
+    ):
+        self.ttl = ttl
+        self.margin = margin
+        self.expiry = expiry
+        self.values = {}
+        self.lock = threading.Lock()
+        self.key_locks = {}
+
+    def _key_lock(self, key) -> threading.Lock:
+        with self.lock:
+            return self.key_locks.setdefault(key, threading.Lock())
+
+    def _fresh(self, key) -> tuple[bool, object]:
+        entry = self.values.get(key)
+        if entry is not None and entry[0] > time.time():
+            return True, entry[1]
+        return False, None
+
+    def get(self, key, loader: Callable[[], object]):
+        """
+        Return the cached value of the key, call the loader if it is missing or expired
+        """
+        fresh, value = self._fresh(key)
+        if fresh:
+            return value
+
+        with self._key_lock(key):
+            # Another caller may have loaded it while we waited for the lock
+            fresh, value = self._fresh(key)
+            if fresh:
+                return value
+
+            value = loader()
+            self.set(key, value)
+            return value
+
+    def refresh(self, key, loader: Callable[[], object]):
+        """
+        Load the key again even if it did not expire, callers keep the old value meanwhile
+        """
+        with self._key_lock(key):
+            value = loader()
+            self.set(key, value)
+            return value
+
+    def set(self, key, value) -> None:
+        if self.expiry is not None:
+            expires_at = self.expiry(value) - self.margin
+        else:
+            expires_at = time.time() + self.ttl
+        self.values[key] = (expires_at, value)
+
+    def invalidate(self, key=None) -> None:
+        """
+        Forget a key, or every key when none is given
+        """
+        if key is None:
+            self.values.clear()
+        else:
+            self.values.pop(key, None)
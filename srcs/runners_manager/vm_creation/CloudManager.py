@@ -1,24 +1,72 @@
 import abc
+import json
+import threading
 
 from jinja2 import Environment
 from jinja2 import FileSystemLoader
+from jinja2 import Template
 from marshmallow import Schema
 from runners_manager.monitoring.prometheus import metrics
 from runners_manager.runner.Runner import Runner
+from runners_manager.vm_creation.VmType import VmType
+
+TEMPLATES_DIRECTORY = "templates"
+INIT_SCRIPT_TEMPLATE = "init_runner_script.sh"
+# Rendered in the cached init scripts in place of the fields of each runner
+TOKEN_PLACEHOLDER = "@@RUNNER_TOKEN@@"
+NAME_PLACEHOLDER = "@@RUNNER_NAME@@"
+
+environments: dict[tuple[str, bool], Environment] = {}
+environments_lock = threading.Lock()
+
+
+def init_script_template(auto_reload: bool = False) -> Template:
+    """
+    Return the compiled init script template, shared by every cloud manager
+    With `auto_reload` the file is checked on each call and compiled again when it changed,
+    otherwise it is read once
+    """
+    key = (TEMPLATES_DIRECTORY, auto_reload)
+    with environments_lock:
+        env = environments.get(key)
+        if env is None:
+            env = Environment(
+                loader=FileSystemLoader(TEMPLATES_DIRECTORY),
+                auto_reload=auto_reload,
+                trim_blocks=True,
+                lstrip_blocks=True,
+            )
+            environments[key] = env
+    return env.get_template(INIT_SCRIPT_TEMPLATE)
+
+
+def pool_label(runner: Runner) -> str:
+    """
+    Pool of a runner for the metrics labels, the VMs listed from the cloud have none
+    or a VmType without tags
+    """
+    vm_type = getattr(runner, "vm_type", None)
+    if vm_type is None or not vm_type.pool_id:
+        return "unknown"
+    return vm_type.pool_id
 
 
 def create_vm_metric(func):
-    def _decorator(self, *args, **kwargs):
-        with metrics.runner_creation_time_seconds.labels(cloud=self.name).time():
-            return func(self, *args, **kwargs)
+    def _decorator(self, runner: Runner, *args, **kwargs):
+        with metrics.runner_creation_time_seconds.labels(
+            cloud=self.name, pool=pool_label(runner)
+        ).time():
+            return func(self, runner, *args, **kwargs)
 
     return _decorator
 
 
 def delete_vm_metric(func):
-    def _decorator(self, *args, **kwargs):
-        with metrics.runner_delete_time_seconds.labels(cloud=self.name).time():
-            return func(self, *args, **kwargs)
+    def _decorator(self, runner: Runner, *args, **kwargs):
+        with metrics.runner_delete_time_seconds.labels(
+            cloud=self.name, pool=pool_label(runner)
+        ).time():
+            return func(self, runner, *args, **kwargs)
 
     return _decorator
 
@@ -27,6 +75,11 @@ class CloudManager(abc.ABC):
     CONFIG_SCHEMA: Schema = Schema
     CONFIG_VM_TYPE_SCHEMA: Schema = Schema
     name: str
+    supports_warm_pool: bool = False
+    supports_baking: bool = False
+    baked_images: dict[str, str]
+    reload_init_script: bool = False
+    init_scripts: dict[tuple, tuple[tuple, str]]
     redhat_username: str
     redhat_password: str
 
@@ -46,6 +99,10 @@ class CloudManager(abc.ABC):
         self.ssh_keys = ssh_keys
         self.redhat_username = redhat_username
         self.redhat_password = redhat_password
+        # Id of the baked image of each runner pool, set by the runner factory
+        self.baked_images = {}
+        # Init script of each runner pool, rendered without the runner name and token
+        self.init_scripts = {}
 
     @abc.abstractmethod
     def get_all_vms(self, prefix: str) -> list[Runner]:
@@ -63,6 +120,64 @@ class CloudManager(abc.ABC):
     ) -> int or None:
         raise NotImplementedError
 
+    def create_vms(
+        self,
+        runners: list[Runner],
+        runner_token: int or None,
+        github_organization: str,
+        installer: str,
+    ) -> list[int or None]:
+        """
+        Create the VMs of several runners, the VM id or None is returned for each runner
+        Clouds able to create several VMs in one request should override it
+        """
+        return [
+            self.create_vm(runner, runner_token, github_organization, installer)
+            for runner in runners
+        ]
+
+    def create_warm_vm(
+        self, vm_type: VmType, name: str, github_organization: str, installer: str
+    ) -> str or None:
+        """
+        Create a provisioned VM without runner and put it to sleep
+        Only used when `supports_warm_pool` is set
+        """
+        raise NotImplementedError
+
+    def start_warm_vm(
+        self, runner: Runner, runner_token: str, github_organization: str
+    ) -> bool:
+        """
+        Wake up a warm VM, it registers as the runner with the token
+        On failure the VM is deleted and False returned
+        """
+        raise NotImplementedError
+
+    def delete_warm_vm(self, vm_id: str) -> None:
+        """
+        Delete a warm VM no longer needed by its pool
+        Only used when `supports_warm_pool` is set
+        """
+        raise NotImplementedError
+
+    def bake_image(
+        self, vm_type: VmType, name: str, github_organization: str, installer: str
+    ) -> str or None:
+        """
+        Provision a VM with the heavy part of the init script and save it as an image,
+        the runners of the pool then boot from it and only register
+        Only used when `supports_baking` is set
+        :return: the id of the image, None on failure
+        """
+        raise NotImplementedError
+
+    def delete_image(self, image_id: str) -> None:
+        """
+        Delete an image made by `bake_image`
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     @delete_vm_metric
     def delete_vm(self, runner: Runner):
@@ -72,29 +187,61 @@ class CloudManager(abc.ABC):
     def delete_images_from_shelved(self, name):
         raise NotImplementedError
 
+    def warm_up(self, vm_types: list[VmType], runner_prefix: str) -> None:
+        """
+        Prepare the cloud resources needed by the runner pools before the first creation
+        :param runner_prefix: the prefix of the names of the runners VMs
+        """
+        pass
+
     def script_init_runner(
-        self, runner: Runner, token: int, github_organization: str, installer: str
+        self,
+        runner: Runner,
+        token: int,
+        github_organization: str,
+        installer: str,
+        name_from_metadata: bool = False,
+        warm: bool = False,
+        bake: bool = False,
+        baked: bool = False,
     ):
         """
         Return the needed script by the virutal machines to run smoothly the Github runner
         It's generated by a jinja template
+        With `name_from_metadata` the script is the same for all the runners of the pool,
+        each VM reads its runner name from the metadata service
+        With `warm` the VM is powered off once provisioned, the runner is registered
+        on the next boot with the name and token read from the metadata service
+        With `bake` the VM is powered off once provisioned, to be saved as an image
+        With `baked` the VM boots from such an image, provisioning is skipped
+
+        The script of a pool is rendered once with placeholders for the runner name
+        and token, it is rendered again when the installer or the template changed
         """
-        file_loader = FileSystemLoader("templates")
-        env = Environment(loader=file_loader)
-        env.trim_blocks = True
-        env.lstrip_blocks = True
-        env.rstrip_blocks = True
-
-        template = env.get_template("init_runner_script.sh")
-        output = template.render(
-            installer=installer,
-            github_organization=github_organization,
-            token=token,
-            name=runner.name,
-            tags=",".join(runner.vm_type.tags),
-            redhat_username=self.redhat_username,
-            redhat_password=self.redhat_password,
-            group="default",
-            ssh_keys=self.ssh_keys,
+        template = init_script_template(self.reload_init_script)
+        key = (runner.vm_type.pool_id, name_from_metadata, warm, bake, baked)
+        stamp = (template, json.dumps(installer, sort_keys=True), github_organization)
+
+        cached = self.init_scripts.get(key)
+        if cached is None or cached[0] != stamp:
+            script = template.render(
+                installer=installer,
+                github_organization=github_organization,
+                token=TOKEN_PLACEHOLDER,
+                name=None if name_from_metadata else NAME_PLACEHOLDER,
+                tags=",".join(runner.vm_type.tags),
+                redhat_username=self.redhat_username,
+                redhat_password=self.redhat_password,
+                group="default",
+                ssh_keys=self.ssh_keys,
+                warm=warm,
+                bake=bake,
+                baked=baked,
+            )
+            cached = self.init_scripts[key] = (stamp, script)
+
+        return (
+            cached[1]
+            .replace(TOKEN_PLACEHOLDER, str(token))
+            .replace(NAME_PLACEHOLDER, runner.name)
         )
-        return output
@@ -1,2 +1,6 @@
 class APIException(Exception):
     pass
+
+
+class RateLimitException(APIException):
+    pass
@@ -1,29 +1,70 @@
 class VmType:
     """
     Define a Virtual machine and the quantity needed
+
+    The VmType of each runner pool is registered by its pool id,
+    runners only keep this id in redis and share the registered instance.
     """
 
+    __slots__ = ("tags", "config", "quantity", "pool_id", "bake")
+    registry: dict = {}
+
     tags: list[str]
     config: dict
     quantity: dict[str, int or bool]
+    pool_id: str
+    bake: bool
 
     def __init__(self, config):
         config["tags"].sort()
         self.tags = config["tags"]
         self.config = config["config"]
         self.quantity = config["quantity"]
+        self.pool_id = "-".join(self.tags)
+        # The runners boot from an image provisioned once for the pool
+        self.bake = config.get("bake", False)
+
+    @classmethod
+    def register(cls, vm_type: "VmType") -> "VmType":
+        """
+        Register the VmType of a runner pool, it replaces the previous one with the same id
+        """
+        cls.registry[vm_type.pool_id] = vm_type
+        return vm_type
+
+    @classmethod
+    def from_pool_id(cls, pool_id: str) -> "VmType" or None:
+        return cls.registry.get(pool_id)
+
+    @classmethod
+    def intern(cls, config: dict) -> "VmType":
+        """
+        Return the registered VmType of the pool described by the json data,
+        build and register it if the pool is unknown
+        """
+        vm_type = cls.registry.get("-".join(sorted(config["tags"])))
+        if vm_type is None:
+            vm_type = cls.register(VmType(config))
+        return vm_type
 
     @property
     def on_demand(self) -> bool:
         return self.quantity.get("on_demand", False)
 
+    @property
+    def warm(self) -> int:
+        """
+        Number of provisioned and shelved VMs kept ready for the pool
+        """
+        return self.quantity.get("warm", 0)
+
     def toJson(self) -> dict:
         """
         The fields_to_serialized, list the field to put in the dict
         :return: dict object representative of Self
         """
         d = {}
-        fields_to_serialized = ["tags", "config", "quantity", "on_demand"]
+        fields_to_serialized = ["tags", "config", "quantity", "on_demand", "bake"]
         for field in fields_to_serialized:
             d[field] = self.__getattribute__(field)
 
@@ -1,11 +1,127 @@
+import datetime
+import enum
 import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
+from runners_manager.monitoring.prometheus import metrics
+from runners_manager.vm_creation.Cache import TTLCache
 from runners_manager.vm_creation.Exception import APIException
+from runners_manager.vm_creation.Exception import RateLimitException
 
 logger = logging.getLogger("runner_manager")
 
 
+def token_expiry(token: dict) -> float:
+    """
+    Return the expiration timestamp of a registration token
+    """
+    return datetime.datetime.fromisoformat(
+        token["expires_at"].replace("Z", "+00:00")
+    ).timestamp()
+
+
+class Priority(enum.IntEnum):
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+
+class RateLimitGovernor(object):
+    """
+    Track the GitHub API rate limit budget from the response headers
+
+    Each priority keeps a share of the budget for the ones above it:
+    when the remaining calls fall under its reserve, a call waits for the reset.
+    Registration tokens can use the whole budget, the runners list stops at 10%
+    and the background calls (orphans cleanup, download links) at 30%.
+    A secondary rate limit (`Retry-After`) delays every call.
+    Calls which would wait more than `max_wait` seconds raise a RateLimitException.
+    """
+
+    reserves = {Priority.HIGH: 0, Priority.NORMAL: 0.1, Priority.LOW: 0.3}
+
+    max_wait: float
+    remaining: int or None
+    limit: int or None
+    reset_at: float
+    retry_at: float
+
+    def __init__(self, max_wait: float = 60):
+        self.max_wait = max_wait
+        self.remaining = None
+        self.limit = None
+        self.reset_at = 0
+        self.retry_at = 0
+        self.condition = threading.Condition()
+
+    def delay(self, priority: Priority) -> float:
+        """
+        Return the number of seconds to wait before a call with this priority
+        """
+        now = time.time()
+        if self.retry_at > now:
+            return self.retry_at - now
+        if self.remaining is None or self.reset_at <= now:
+            return 0
+        if self.remaining > self.reserves[priority] * self.limit:
+            return 0
+        return self.reset_at - now
+
+    def acquire(self, priority: Priority = Priority.NORMAL) -> None:
+        """
+        Wait until the budget allows a call and take one call from it
+        """
+        with self.condition:
+            delay = self.delay(priority)
+            if delay > 0:
+                if delay > self.max_wait:
+                    raise RateLimitException(
+                        f"GitHub rate limit reached, {priority.name} calls "
+                        f"are delayed for {int(delay)}s"
+                    )
+                logger.warning(
+                    f"GitHub rate limit, {priority.name} call waits {int(delay)}s"
+                )
+                metrics.github_rate_limit_waits.labels(priority=priority.name).inc()
+                while delay > 0:
+                    self.condition.wait(delay)
+                    delay = self.delay(priority)
+
+            if self.remaining is not None and self.reset_at > time.time():
+                self.remaining -= 1
+
+    def update(self, response: requests.Response) -> None:
+        """
+        Update the budget with the rate limit headers of a response
+        """
+        headers = response.headers
+        with self.condition:
+            if "X-RateLimit-Remaining" in headers:
+                self.remaining = int(headers["X-RateLimit-Remaining"])
+                self.limit = int(headers.get("X-RateLimit-Limit", self.remaining))
+                self.reset_at = float(headers.get("X-RateLimit-Reset", 0))
+                metrics.github_rate_limit_remaining.set(self.remaining)
+                metrics.github_rate_limit_limit.set(self.limit)
+                metrics.github_rate_limit_reset.set(self.reset_at)
+
+            if response.status_code in (403, 429):
+                if "Retry-After" in headers:
+                    self.retry_at = time.time() + int(headers["Retry-After"])
+                elif self.remaining == 0:
+                    self.retry_at = self.reset_at
+            self.condition.notify_all()
+
+    def limited(self, response: requests.Response) -> bool:
+        return response.status_code == 429 or (
+            response.status_code == 403
+            and ("Retry-After" in response.headers or self.remaining == 0)
+        )
+
+
 class GithubManager(object):
     """
     Manage runners api call for an organization
@@ -15,9 +131,24 @@ class GithubManager(object):
     organization: str
     headers: dict
     session: requests.Session
+    max_concurrent_pages: int
+    runner_pages: dict[tuple[int, int], tuple[str, dict]]
+    installers: TTLCache
+    registration_tokens: TTLCache
+    governor: RateLimitGovernor
 
-    def __init__(self, organization, token):
+    def __init__(self, organization, token, max_concurrent_pages=4):
         self.organization = organization
+        self.governor = RateLimitGovernor()
+        self.max_concurrent_pages = max_concurrent_pages
+        self.runner_pages = {}
+        # The download links change when a new runner version is released
+        self.installers = TTLCache(ttl=6 * 60 * 60)
+        # A token is valid one hour, it is renewed early enough
+        # for a VM to boot and register with it
+        self.registration_tokens = TTLCache(
+            ttl=60 * 60, margin=15 * 60, expiry=token_expiry
+        )
         self.session = requests.Session()
         self.session.headers.update(
             {
@@ -26,40 +157,112 @@ class GithubManager(object):
             }
         )
 
+    def _request(
+        self,
+        method: str,
+        url: str,
+        endpoint: str,
+        priority: Priority = Priority.NORMAL,
+        **kwargs,
+    ) -> requests.Response:
+        """
+        Send a request once the rate limit budget allows it
+        :param endpoint: name of the API endpoint in the metrics, not the URL
+            which holds ids
+        """
+        self.governor.acquire(priority)
+        with metrics.github_request_seconds.labels(endpoint=endpoint).time():
+            response = getattr(self.session, method)(url, **kwargs)
+        self.governor.update(response)
+
+        if self.governor.limited(response):
+            raise RateLimitException(
+                f"GitHub rate limit reached: {response.status_code} {url}"
+            )
+        return response
+
     def link_download_runner(self, archi="x64") -> str:
         """
         Get the download link of the runner binary tar ball for linux
+        The link is cached per architecture
         """
+        return self.installers.get(archi, lambda: self._link_download_runner(archi))
+
+    def _link_download_runner(self, archi="x64") -> str:
         download_link = (
             f"https://api.github.com/orgs/{self.organization}/actions/runners/downloads"
         )
+        response = self._request(
+            "get", download_link, "downloads", priority=Priority.LOW
+        )
         return next(
             elem
-            for elem in self.session.get(download_link).json()
+            for elem in response.json()
             if elem["os"] == "linux" and elem["architecture"] == archi
         )
 
-    def _get_runner_page(self, page=1, per_page=30) -> [dict]:
+    def _get_runner_page(
+        self, page=1, per_page=30, priority: Priority = Priority.NORMAL
+    ) -> [dict]:
         """
         Get the runner list by page
+        Pages are cached with their ETag, when GitHub answers 304 Not Modified
+        the cached page is returned, these responses don't count in the rate limit
         """
         info_link = f"https://api.github.com/orgs/{self.organization}/actions/runners"
-        return self.session.get(
-            info_link, params={"page": page, "per_page": per_page}
-        ).json()
+        cached = self.runner_pages.get((page, per_page))
+        response = self._request(
+            "get",
+            info_link,
+            "runners",
+            priority=priority,
+            params={"page": page, "per_page": per_page},
+            headers={"If-None-Match": cached[0]} if cached else {},
+        )
+        if response.status_code not in (200, 304):
+            raise APIException(
+                f"Error listing runners: {response.status_code} {response.text}"
+            )
+
+        if response.status_code == 304 and cached:
+            metrics.github_cache_hits.labels(endpoint="runners").inc()
+            etag, data = cached
+        else:
+            metrics.github_cache_misses.labels(endpoint="runners").inc()
+            etag, data = response.headers.get("ETag"), response.json()
+            if etag:
+                self.runner_pages[(page, per_page)] = (etag, data)
 
-    def get_runners(self, prefix="", per_page=100) -> [dict]:
+        # The cached page must not be modified by the caller
+        return dict(data, runners=list(data["runners"]), etag=etag)
+
+    def get_runners(
+        self, prefix="", per_page=100, priority: Priority = Priority.NORMAL
+    ) -> [dict]:
         """
         Get the list of all runners
+        The first page gives the total count, the next ones are fetched concurrently
+        `etag` joins the ETag of each page, it does not change while the list is the same
         """
-        index = 1
-        page = self._get_runner_page(page=index, per_page=per_page)
+        page = self._get_runner_page(page=1, per_page=per_page, priority=priority)
+        etags = [page["etag"]]
+
+        nb_pages = math.ceil(page["total_count"] / per_page)
+        if nb_pages > 1:
+            with ThreadPoolExecutor(
+                max_workers=min(self.max_concurrent_pages, nb_pages - 1)
+            ) as executor:
+                next_pages = executor.map(
+                    lambda index: self._get_runner_page(
+                        page=index, per_page=per_page, priority=priority
+                    ),
+                    range(2, nb_pages + 1),
+                )
+                for next_page in next_pages:
+                    page["runners"] += next_page["runners"]
+                    etags.append(next_page["etag"])
 
-        while index * per_page < page["total_count"]:
-            index += 1
-            page["runners"] += self._get_runner_page(page=index, per_page=per_page)[
-                "runners"
-            ]
+        page["etag"] = None if None in etags else ",".join(etags)
 
         page["runners"] = [
             elem for elem in page["runners"] if elem["name"].startswith(prefix)
@@ -71,19 +274,25 @@ class GithubManager(object):
         Create  a token used as paramert of the github action script start,
         this token is available one hour.
         `./config.sh --url URL --token TOKEN`
+        The token is cached and shared by all runners until it is close to expire
         :return:
         """
+        return self.registration_tokens.get(
+            self.organization, self._create_runner_token
+        )["token"]
+
+    def _create_runner_token(self) -> dict:
         token_link = (
             f"https://api.github.com/orgs/{self.organization}"
             + "/actions/runners/registration-token"
         )
-        response = self.session.post(token_link).json()
-
-        return response["token"]
+        return self._request(
+            "post", token_link, "registration-token", priority=Priority.HIGH
+        ).json()
 
     def force_delete_runner(self, runner_id: int):
         runner_link = f"https://api.github.com/orgs/{self.organization}/actions/runners/{runner_id}"
-        response = self.session.delete(runner_link)
+        response = self._request("delete", runner_link, "delete-runner")
 
         if response.status_code != 204:
             logger.error(
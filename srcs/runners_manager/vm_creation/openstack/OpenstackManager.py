@@ -1,6 +1,9 @@
 import asyncio
 import logging
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError
 
 import glanceclient.client as glance_client
 import keystoneauth1.session
@@ -11,11 +14,15 @@ import novaclient.v2.servers
 from runners_manager.monitoring.prometheus import metrics
 from runners_manager.runner.Runner import Runner
 from runners_manager.runner.Runner import VmType
+from runners_manager.vm_creation.Cache import TTLCache
 from runners_manager.vm_creation.CloudManager import CloudManager
 from runners_manager.vm_creation.CloudManager import create_vm_metric
 from runners_manager.vm_creation.CloudManager import delete_vm_metric
 from runners_manager.vm_creation.openstack.schema import OpenstackConfig
 from runners_manager.vm_creation.openstack.schema import OpenstackConfigVmType
+from runners_manager.vm_creation.openstack.ServerStatusWatcher import (
+    ServerStatusWatcher,
+)
 
 
 logger = logging.getLogger("runner_manager")
@@ -28,10 +35,24 @@ class OpenstackManager(CloudManager):
 
     CONFIG_SCHEMA = OpenstackConfig
     CONFIG_VM_TYPE_SCHEMA = OpenstackConfigVmType
+    supports_warm_pool = True
+    supports_baking = True
     nova_client: novaclient.client.Client
     neutron: neutronclient.v2_0.client.Client
     network_name: str
     settings: dict
+    lookups: TTLCache
+    lookup_ttl: float = 6 * 60 * 60
+    lookup_refresh_interval: float = 60 * 60
+    status_watcher: ServerStatusWatcher
+    servers_by_name: dict[str, set[str]]
+    create_timeout: float = 15 * 60
+    shelve_timeout: float = 15 * 60
+    provision_timeout: float = 30 * 60
+    image_timeout: float = 30 * 60
+    image_poll_interval: float = 10
+    reservation_attempts: int = 3
+    reservation_retry_interval: float = 2
 
     def __init__(
         self,
@@ -82,11 +103,181 @@ class OpenstackManager(CloudManager):
         self.glance = glance_client.Client(
             "2", session=session, region_name=settings["region_name"]
         )
+        # Images, flavors, network and security group barely change,
+        # they are cached instead of being looked up for each VM
+        self.lookups = TTLCache(ttl=self.lookup_ttl)
+        self.lookup_refresher = None
+        self.status_watcher = ServerStatusWatcher(self.nova_client)
+        # Our servers by name, rebuilt by each `get_all_vms` and kept up to date
+        # by the creations and deletions, used to find duplicated names
+        self.servers_by_name = {}
+        self.servers_lock = threading.Lock()
+        self.reaper = ThreadPoolExecutor(
+            max_workers=2, thread_name_prefix="openstack-reaper"
+        )
+
+    def _lookup(self, key, loader, refresh: bool = False):
+        if refresh:
+            return self.lookups.refresh(key, loader)
+        return self.lookups.get(key, loader)
+
+    def security_group_id(self, refresh: bool = False) -> str:
+        return self._lookup(
+            "security_group",
+            lambda: self.neutron.list_security_groups()["security_groups"][0]["id"],
+            refresh,
+        )
+
+    def network_id(self, refresh: bool = False) -> str:
+        return self._lookup(
+            "network",
+            lambda: self.neutron.list_networks(name=self.network_name)["networks"][0][
+                "id"
+            ],
+            refresh,
+        )
+
+    def find_image(self, name: str, refresh: bool = False):
+        return self._lookup(
+            ("image", name), lambda: self.nova_client.glance.find_image(name), refresh
+        )
+
+    def find_flavor(self, name: str, refresh: bool = False):
+        return self._lookup(
+            ("flavor", name), lambda: self.nova_client.flavors.find(name=name), refresh
+        )
+
+    def image_name(self, image_id: str) -> str:
+        return self._lookup(
+            ("image_id", image_id), lambda: self.glance.images.get(image_id).name
+        )
+
+    def flavor_name(self, flavor_id: str) -> str:
+        return self._lookup(
+            ("flavor_id", flavor_id),
+            lambda: self.nova_client.flavors.get(flavor_id).name,
+        )
+
+    def runner_image(self, vm_type: VmType) -> tuple[object, bool]:
+        """
+        Return the image the runners of the pool boot from
+        and whether it is a baked image
+        """
+        image_id = self.baked_images.get(vm_type.pool_id)
+        if image_id:
+            try:
+                return self.find_image(image_id), True
+            except Exception as e:
+                logger.error(f"Baked image {image_id} not found, {e}")
+        return self.find_image(vm_type.config["image"]), False
+
+    def load_lookups(self, vm_types: list[VmType], refresh: bool = False) -> None:
+        """
+        Load the resources used to create the VMs of each runner pool
+        With `refresh` they are loaded again even if they did not expire
+        """
+        self.security_group_id(refresh)
+        self.network_id(refresh)
+        for vm_type in vm_types:
+            self.find_image(vm_type.config["image"], refresh)
+            self.find_flavor(vm_type.config["flavor"], refresh)
+
+    def warm_up(self, vm_types: list[VmType], runner_prefix: str) -> None:
+        """
+        Fill the lookups cache and refresh it in the background before it expires,
+        the servers index is seeded with the servers left by the previous run
+        """
+        try:
+            self.load_lookups(vm_types)
+        except Exception as e:
+            logger.error(f"Openstack lookups warm up failed: {e}")
+
+        self.status_watcher.name_prefix = runner_prefix
+        try:
+            self.get_all_vms(runner_prefix)
+        except Exception as e:
+            logger.error(f"Openstack servers index warm up failed: {e}")
+
+        if self.lookup_refresher is None:
+            self.lookup_refresher = threading.Thread(
+                target=self.refresh_lookups,
+                args=(vm_types,),
+                name="openstack-lookups",
+                daemon=True,
+            )
+            self.lookup_refresher.start()
+
+    def refresh_lookups(self, vm_types: list[VmType]) -> None:
+        while True:
+            time.sleep(self.lookup_refresh_interval)
+            try:
+                self.load_lookups(vm_types, refresh=True)
+            except Exception as e:
+                logger.error(f"Openstack lookups refresh failed: {e}")
+
+    def index_server(self, name: str, server_id: str) -> None:
+        with self.servers_lock:
+            self.servers_by_name.setdefault(name, set()).add(server_id)
+
+    def unindex_server(self, name: str, server_id: str) -> None:
+        with self.servers_lock:
+            ids = self.servers_by_name.get(name, set())
+            ids.discard(server_id)
+            if not ids:
+                self.servers_by_name.pop(name, None)
+
+    def unindex_server_id(self, server_id: str) -> None:
+        """
+        Remove a server from the index when its name is unknown
+        """
+        with self.servers_lock:
+            for name, ids in list(self.servers_by_name.items()):
+                ids.discard(server_id)
+                if not ids:
+                    self.servers_by_name.pop(name)
+
+    def reap_duplicates(self, name: str) -> None:
+        """
+        Delete in the background the servers already using this name
+        """
+        with self.servers_lock:
+            ids = self.servers_by_name.pop(name, set())
+        for server_id in ids:
+            logger.info(f"Reaping server {server_id} with the duplicated name {name}")
+            self.reaper.submit(self.reap_server, server_id)
+
+    def discard_server(self, name: str, server_id: str) -> None:
+        """
+        Delete in the background a server of ours by its id,
+        the index may have lost it since it was rebuilt by `get_all_vms`
+        """
+        self.unindex_server(name, server_id)
+        self.reaper.submit(self.reap_server, server_id)
+
+    def reap_server(self, server_id: str) -> None:
+        try:
+            self.nova_client.servers.delete(server_id)
+        except novaclient.exceptions.NotFound:
+            pass
+        except Exception as e:
+            logger.error(f"Error when reaping the server {server_id}: {e}")
 
     def get_all_vms(self, prefix: str) -> list[Runner]:
         """
         Return the list of virtual machines releated to Github runner
+        The servers index is rebuilt from all our servers, the warm and bake ones included
         """
+        servers = self.nova_client.servers.list(sort_keys=["created_at"])
+        ours = (prefix, f"warm-{prefix}", f"baked-{self.name}-")
+        servers_by_name = {}
+        for vm in servers:
+            if vm.name.startswith(ours):
+                servers_by_name.setdefault(vm.name, set()).add(vm.id)
+        with self.servers_lock:
+            self.servers_by_name = servers_by_name
+
+        servers = [vm for vm in servers if vm.name.startswith(prefix)]
+
         return [
             Runner(
                 vm.name,
@@ -95,18 +286,15 @@ class OpenstackManager(CloudManager):
                     {
                         "tags": [],
                         "config": {
-                            "image": self.glance.images.get(vm.image["id"]).name,
-                            "flavor": self.nova_client.flavors.get(
-                                vm.flavor["id"]
-                            ).name,
+                            "image": self.image_name(vm.image["id"]),
+                            "flavor": self.flavor_name(vm.flavor["id"]),
                         },
                         "quantity": {},
                     }
                 ),
                 self.name,
             )
-            for vm in self.nova_client.servers.list(sort_keys=["created_at"])
-            if vm.name.startswith(prefix)
+            for vm in servers
         ]
 
     @create_vm_metric
@@ -117,6 +305,21 @@ class OpenstackManager(CloudManager):
         github_organization: str,
         installer: str,
         call_number=0,
+    ) -> int or None:
+        """
+        Create the VM of a runner, timed once whatever the number of retries
+        """
+        return self._create_vm(
+            runner, runner_token, github_organization, installer, call_number
+        )
+
+    def _create_vm(
+        self,
+        runner: Runner,
+        runner_token: int or None,
+        github_organization: str,
+        installer: str,
+        call_number=0,
     ) -> int or None:
         """
         Every call with nova_client looks very unstable.
@@ -134,21 +337,12 @@ class OpenstackManager(CloudManager):
         instance = None
         try:
             # Delete all VMs with the same name
-            vm_list = self.nova_client.servers.list(
-                search_opts={"name": runner.name}, sort_keys=["created_at"]
-            )
-            for vm in vm_list:
-                self.nova_client.servers.delete(vm.id)
+            self.reap_duplicates(runner.name)
 
-            sec_group_id = self.neutron.list_security_groups()["security_groups"][0][
-                "id"
-            ]
-            net = self.neutron.list_networks(name=self.network_name)["networks"][0][
-                "id"
-            ]
-            nic = {"net-id": net}
-            image = self.nova_client.glance.find_image(runner.vm_type.config["image"])
-            flavor = self.nova_client.flavors.find(name=runner.vm_type.config["flavor"])
+            sec_group_id = self.security_group_id()
+            nic = {"net-id": self.network_id()}
+            image, baked = self.runner_image(runner.vm_type)
+            flavor = self.find_flavor(runner.vm_type.config["flavor"])
 
             instance = self.nova_client.servers.create(
                 name=runner.name,
@@ -157,20 +351,24 @@ class OpenstackManager(CloudManager):
                 security_groups=[sec_group_id],
                 nics=[nic],
                 userdata=self.script_init_runner(
-                    runner, runner_token, github_organization, installer
+                    runner, runner_token, github_organization, installer, baked=baked
                 ),
             )
+            self.index_server(runner.name, instance.id)
 
-            while instance.status not in ["ACTIVE", "ERROR"]:
-                instance = self.nova_client.servers.get(instance.id)
-                time.sleep(2)
+            status = self.status_watcher.wait(
+                instance.id,
+                runner.name,
+                {"ACTIVE", "ERROR"},
+                timeout=self.create_timeout,
+            )
 
-            if instance.status == "ERROR":
-                logger.info("vm failed, creating a new one")
+            if status != "ACTIVE":
+                logger.info(f"vm failed with status {status}, creating a new one")
                 self.delete_vm(runner)
                 time.sleep(2)
                 metrics.runner_creation_failed.labels(cloud=self.name).inc()
-                return self.create_vm(
+                return self._create_vm(
                     runner,
                     runner_token,
                     github_organization,
@@ -179,6 +377,8 @@ class OpenstackManager(CloudManager):
                 )
         except Exception as e:
             logger.error(f"Vm creation raised an error, {e}")
+            # A cached resource may be gone, look them up again on the retry
+            self.lookups.invalidate()
 
         if not instance or not instance.id:
             metrics.runner_creation_failed.labels(cloud=self.name).inc()
@@ -186,13 +386,289 @@ class OpenstackManager(CloudManager):
                 f"""VM not found on openstack, recreating it.
 VM id: {instance.id if instance else 'Vm not created'}"""
             )
-            return self.create_vm(
+            return self._create_vm(
                 runner, runner_token, github_organization, installer, call_number + 1
             )
 
         logger.info("vm is successfully created")
         return instance.id
 
+    def create_vms(
+        self,
+        runners: list[Runner],
+        runner_token: int or None,
+        github_organization: str,
+        installer: str,
+    ) -> list[int or None]:
+        """
+        Create the VMs of several runners with a single Nova request
+
+        Nova names the VMs `<name>-<index>`, runners have to be named the same way.
+        They share the init script, which reads the runner name from the metadata.
+        A VM which failed or was not found is created again on its own with `create_vm`.
+        """
+        name = runners[0].name.rsplit("-", 1)[0]
+        if len(runners) == 1 or [r.name for r in runners] != [
+            f"{name}-{index}" for index in range(1, len(runners) + 1)
+        ]:
+            return super(OpenstackManager, self).create_vms(
+                runners, runner_token, github_organization, installer
+            )
+
+        vm_type = runners[0].vm_type
+        self.CONFIG_VM_TYPE_SCHEMA().load(vm_type.config)
+        started = time.monotonic()
+        servers = {}
+        reservation_id = None
+        try:
+            image, baked = self.runner_image(vm_type)
+            # With `reservation_id` Nova answers the id of the reservation, not a server
+            reservation_id = self.nova_client.servers.create(
+                name=name,
+                image=image,
+                flavor=self.find_flavor(vm_type.config["flavor"]),
+                security_groups=[self.security_group_id()],
+                nics=[{"net-id": self.network_id()}],
+                userdata=self.script_init_runner(
+                    runners[0],
+                    runner_token,
+                    github_organization,
+                    installer,
+                    name_from_metadata=True,
+                    baked=baked,
+                ),
+                min_count=len(runners),
+                max_count=len(runners),
+                reservation_id=True,
+            )
+        except Exception as e:
+            logger.error(f"Batch creation of {name} raised an error, {e}")
+            self.lookups.invalidate()
+        if reservation_id is not None:
+            # Indexed before any retry, which reaps the servers of the batch it replaces
+            servers = self.reservation_servers(str(reservation_id))
+            for server_name, server_id in servers.items():
+                self.index_server(server_name, server_id)
+
+        statuses = {
+            runner.name: self.status_watcher.watch(
+                servers[runner.name], runner.name, {"ACTIVE", "ERROR"}
+            )
+            for runner in runners
+            if runner.name in servers
+        }
+        deadline = time.monotonic() + self.create_timeout
+
+        instance_ids = []
+        for runner in runners:
+            status = None
+            if runner.name in statuses:
+                try:
+                    status = statuses[runner.name].result(
+                        max(deadline - time.monotonic(), 0)
+                    )
+                except TimeoutError:
+                    self.status_watcher.unwatch(
+                        servers[runner.name], statuses[runner.name]
+                    )
+
+            if status == "ACTIVE":
+                metrics.runner_creation_time_seconds.labels(
+                    cloud=self.name, pool=vm_type.pool_id
+                ).observe(time.monotonic() - started)
+                instance_ids.append(servers[runner.name])
+                continue
+
+            logger.info(f"vm {runner.name} failed with status {status}, retrying")
+            metrics.runner_creation_failed.labels(cloud=self.name).inc()
+            if runner.name in servers:
+                runner.vm_id = servers[runner.name]
+                self.delete_vm(runner)
+                runner.vm_id = None
+            vm_id = self._create_vm(
+                runner, runner_token, github_organization, installer, 1
+            )
+            if vm_id is not None:
+                metrics.runner_creation_time_seconds.labels(
+                    cloud=self.name, pool=vm_type.pool_id
+                ).observe(time.monotonic() - started)
+            instance_ids.append(vm_id)
+        return instance_ids
+
+    def reservation_servers(self, reservation_id: str) -> dict[str, str]:
+        """
+        Return the id of each server of a multiple create by name,
+        the listing is tried again as the servers exist once the reservation is made
+        """
+        for attempt in range(1, self.reservation_attempts + 1):
+            try:
+                # Exact match on the reservation, not a regex search on the names
+                return {
+                    server.name: server.id
+                    for server in self.nova_client.servers.list(
+                        search_opts={"reservation_id": reservation_id}
+                    )
+                }
+            except Exception as e:
+                logger.error(
+                    f"Listing the servers of the reservation {reservation_id} "
+                    f"failed ({attempt}/{self.reservation_attempts}), {e}"
+                )
+                if attempt < self.reservation_attempts:
+                    time.sleep(self.reservation_retry_interval)
+        return {}
+
+    def create_warm_vm(
+        self, vm_type: VmType, name: str, github_organization: str, installer: str
+    ) -> str or None:
+        """
+        Create a VM for the warm pool of a runner pool
+        Its init script provisions it then powers it off, it is shelved after that
+        """
+        self.CONFIG_VM_TYPE_SCHEMA().load(vm_type.config)
+        runner = Runner(name, None, vm_type, self.name)
+        try:
+            image, baked = self.runner_image(vm_type)
+            instance = self.nova_client.servers.create(
+                name=name,
+                image=image,
+                flavor=self.find_flavor(vm_type.config["flavor"]),
+                security_groups=[self.security_group_id()],
+                nics=[{"net-id": self.network_id()}],
+                userdata=self.script_init_runner(
+                    runner, None, github_organization, installer, warm=True, baked=baked
+                ),
+            )
+            runner.vm_id = instance.id
+            self.index_server(name, instance.id)
+
+            status = self.status_watcher.wait(
+                instance.id, name, {"SHUTOFF", "ERROR"}, timeout=self.provision_timeout
+            )
+            if status == "SHUTOFF":
+                self.nova_client.servers.shelve(instance.id)
+                status = self.status_watcher.wait(
+                    instance.id,
+                    name,
+                    {"SHELVED", "SHELVED_OFFLOADED", "ERROR"},
+                    timeout=self.shelve_timeout,
+                )
+                if status in ["SHELVED", "SHELVED_OFFLOADED"]:
+                    logger.info(f"Warm VM {name} ready")
+                    return instance.id
+            logger.error(f"Warm VM {name} failed with status {status}")
+        except Exception as e:
+            logger.error(f"Warm VM creation raised an error, {e}")
+            self.lookups.invalidate()
+
+        if runner.vm_id:
+            self.discard_server(name, runner.vm_id)
+        return None
+
+    def start_warm_vm(
+        self, runner: Runner, runner_token: str, github_organization: str
+    ) -> bool:
+        """
+        Unshelve a warm VM as the runner,
+        its boot hook reads the runner name and token from the server metadata
+        """
+        try:
+            self.nova_client.servers.set_meta(
+                runner.vm_id, {"runner_name": runner.name, "runner_token": runner_token}
+            )
+            self.nova_client.servers.update(runner.vm_id, name=runner.name)
+            self.unindex_server_id(runner.vm_id)
+            self.index_server(runner.name, runner.vm_id)
+            self.nova_client.servers.unshelve(runner.vm_id)
+
+            status = self.status_watcher.wait(
+                runner.vm_id,
+                runner.name,
+                {"ACTIVE", "ERROR"},
+                timeout=self.create_timeout,
+            )
+            if status == "ACTIVE":
+                logger.info(f"Warm VM {runner.vm_id} started as {runner.name}")
+                return True
+            logger.error(f"Warm VM {runner.vm_id} failed with status {status}")
+        except Exception as e:
+            logger.error(f"Warm VM start raised an error, {e}")
+
+        self.discard_server(runner.name, runner.vm_id)
+        return False
+
+    def delete_warm_vm(self, vm_id: str) -> None:
+        self.unindex_server_id(vm_id)
+        self.reaper.submit(self.reap_server, vm_id)
+
+    def bake_image(
+        self, vm_type: VmType, name: str, github_organization: str, installer: str
+    ) -> str or None:
+        """
+        Provision a VM from the image of the pool, it powers itself off,
+        then snapshot it to a Glance image named as the VM and delete the VM
+        """
+        self.CONFIG_VM_TYPE_SCHEMA().load(vm_type.config)
+        runner = Runner(name, None, vm_type, self.name)
+        image_id = None
+        try:
+            instance = self.nova_client.servers.create(
+                name=name,
+                image=self.find_image(vm_type.config["image"]),
+                flavor=self.find_flavor(vm_type.config["flavor"]),
+                security_groups=[self.security_group_id()],
+                nics=[{"net-id": self.network_id()}],
+                userdata=self.script_init_runner(
+                    runner, None, github_organization, installer, bake=True
+                ),
+            )
+            runner.vm_id = instance.id
+            self.index_server(name, instance.id)
+
+            status = self.status_watcher.wait(
+                instance.id, name, {"SHUTOFF", "ERROR"}, timeout=self.provision_timeout
+            )
+            if status == "SHUTOFF":
+                image_id = self.nova_client.servers.create_image(
+                    instance.id, name, metadata={"runner_pool": vm_type.pool_id}
+                )
+                if not self.wait_image(image_id):
+                    self.delete_image(image_id)
+                    image_id = None
+            else:
+                logger.error(f"Bake VM {name} failed with status {status}")
+        except Exception as e:
+            logger.error(f"Image bake raised an error, {e}")
+            self.lookups.invalidate()
+
+        if runner.vm_id:
+            self.discard_server(name, runner.vm_id)
+        if image_id:
+            logger.info(f"Image {name} baked for {vm_type.pool_id}")
+        return image_id
+
+    def wait_image(self, image_id: str) -> bool:
+        """
+        Wait for the upload of a snapshot, return False if it failed or timed out
+        """
+        deadline = time.monotonic() + self.image_timeout
+        while time.monotonic() < deadline:
+            status = self.glance.images.get(image_id).status
+            if status == "active":
+                return True
+            if status in ["killed", "deleted"]:
+                logger.error(f"Image {image_id} failed with status {status}")
+                return False
+            time.sleep(self.image_poll_interval)
+        logger.error(f"Image {image_id} not active after {self.image_timeout}s")
+        return False
+
+    def delete_image(self, image_id: str) -> None:
+        try:
+            self.glance.images.delete(image_id)
+        except Exception as e:
+            logger.error(f"Error when deleting the image {image_id}: {e}")
+
     @delete_vm_metric
     def delete_vm(self, runner: Runner):
         """
@@ -220,23 +696,21 @@ VM id: {instance.id if instance else 'Vm not created'}"""
                 and "rhel" in runner.vm_type.config["image"]
             ):
                 try:
-                    nb_error = 0
                     self.nova_client.servers.shelve(runner.vm_id)
-                    s = self.nova_client.servers.get(runner.vm_id).status
-                    while s not in ["SHUTOFF", "SHELVED_OFFLOADED"] and nb_error < 5:
-                        time.sleep(5)
-                        try:
-                            s = self.nova_client.servers.get(runner.vm_id).status
-                            logger.info(s)
-                        except Exception as e:
-                            nb_error += 1
-                            logger.error(f"Error in VM delete {e}")
-
-                except Exception:
-                    pass
+                    status = self.status_watcher.wait(
+                        runner.vm_id,
+                        runner.name,
+                        {"SHUTOFF", "SHELVED_OFFLOADED"},
+                        timeout=self.shelve_timeout,
+                    )
+                    logger.info(f"VM {runner.name} shelve finished: {status}")
+                except Exception as e:
+                    logger.error(f"Error in VM delete {e}")
 
             self.nova_client.servers.delete(runner.vm_id)
+            self.unindex_server(runner.name, runner.vm_id)
         except novaclient.exceptions.NotFound as exp:
+            self.unindex_server(runner.name, runner.vm_id)
             # If the machine was already deleted, move along
             logger.info(exp)
             pass
@@ -0,0 +1,169 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError
+
+import novaclient.client
+import novaclient.exceptions
+
+logger = logging.getLogger("runner_manager")
+
+
+class ServerStatusWatcher(object):
+    """
+    Wait for Openstack servers to reach a status
+
+    A single thread lists the watched servers, filtered by the prefix of their names,
+    and resolves the futures of the servers which reached one of the awaited status.
+    When the names share less than `name_prefix`, the filter would match all the servers
+    of the project, the watched servers are read one by one instead.
+    A server missing from the list resolves its futures with `DELETED`.
+    The interval between two lists doubles up to `max_interval` while nothing changes
+    and goes back to `min_interval` when a watch is resolved or added.
+    """
+
+    min_interval: float
+    max_interval: float
+    interval: float
+    name_prefix: str
+    watches: dict[str, list[tuple[str, frozenset, Future]]]
+
+    def __init__(
+        self,
+        nova_client: novaclient.client.Client,
+        min_interval: float = 2,
+        max_interval: float = 30,
+        name_prefix: str = "",
+    ):
+        self.nova_client = nova_client
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.name_prefix = name_prefix
+        self.interval = min_interval
+        self.last_poll = 0
+        self.watches = {}
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def watch(self, server_id: str, name: str, statuses: set[str]) -> Future:
+        """
+        Return a future resolved with the status of the server
+        when it reaches one of `statuses`
+        """
+        future = Future()
+        with self.condition:
+            self.watches.setdefault(server_id, []).append(
+                (name, frozenset(statuses), future)
+            )
+            self.interval = self.min_interval
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.run, name="openstack-status-watcher", daemon=True
+                )
+                self.thread.start()
+            self.condition.notify()
+        return future
+
+    def unwatch(self, server_id: str, future: Future) -> None:
+        with self.condition:
+            watches = [w for w in self.watches.get(server_id, []) if w[2] is not future]
+            if watches:
+                self.watches[server_id] = watches
+            else:
+                self.watches.pop(server_id, None)
+        future.cancel()
+
+    def wait(
+        self, server_id: str, name: str, statuses: set[str], timeout: float = None
+    ) -> str or None:
+        """
+        Block until the server reaches one of `statuses`, return None on timeout
+        """
+        future = self.watch(server_id, name, statuses)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            self.unwatch(server_id, future)
+            return None
+
+    def poll(self) -> bool:
+        """
+        List the watched servers once and resolve the watches which reached their status
+        :return: True if a watch was resolved
+        """
+        with self.condition:
+            watched = {
+                server_id: [name for name, _, _ in watches]
+                for server_id, watches in self.watches.items()
+            }
+        names = [name for names in watched.values() for name in names]
+        if not names:
+            return False
+
+        prefix = os.path.commonprefix(names)
+        if not prefix or len(prefix) < len(self.name_prefix):
+            servers = self.get_servers(watched.keys())
+        else:
+            servers = {
+                server.id: server.status
+                for server in self.nova_client.servers.list(
+                    detailed=True, search_opts={"name": prefix}
+                )
+                if server.name.startswith(prefix)
+            }
+
+        resolved = False
+        with self.condition:
+            # The watches added during the list are left for the next poll
+            for server_id in watched.keys() & self.watches.keys():
+                watches = self.watches[server_id]
+                status = servers.get(server_id, "DELETED")
+                for watch in list(watches):
+                    if status in watch[1] or status == "DELETED":
+                        watches.remove(watch)
+                        watch[2].set_result(status)
+                        resolved = True
+                if not watches:
+                    del self.watches[server_id]
+        return resolved
+
+    def get_servers(self, server_ids) -> dict[str, str]:
+        """
+        Return the status of each server, the deleted servers are left out
+        """
+        servers = {}
+        for server_id in server_ids:
+            try:
+                servers[server_id] = self.nova_client.servers.get(server_id).status
+            except novaclient.exceptions.NotFound:
+                pass
+        return servers
+
+    def run(self) -> None:
+        while True:
+            with self.condition:
+                # Sleep until the next poll, a new watch can bring it closer
+                while not self.watches or (
+                    time.monotonic() < self.last_poll + self.interval
+                ):
+                    if not self.watches:
+                        self.condition.wait()
+                    else:
+                        self.condition.wait(
+                            self.last_poll + self.interval - time.monotonic()
+                        )
+
+            self.last_poll = time.monotonic()
+            try:
+                resolved = self.poll()
+            except Exception as e:
+                logger.error(f"Openstack servers status list failed: {e}")
+                resolved = False
+
+            with self.condition:
+                if resolved:
+                    self.interval = self.min_interval
+                else:
+                    self.interval = min(self.interval * 2, self.max_interval)
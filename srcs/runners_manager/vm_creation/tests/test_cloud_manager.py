@@ -0,0 +1,86 @@
+import os
+import unittest
+from unittest.mock import patch
+
+from jinja2 import Environment
+from jinja2 import FileSystemLoader
+from runners_manager.runner.Runner import Runner
+from runners_manager.vm_creation import CloudManager
+from runners_manager.vm_creation.openstack.OpenstackManager import OpenstackManager
+from runners_manager.vm_creation.VmType import VmType
+
+TEMPLATES = os.path.join(os.path.dirname(__file__), "../../../../templates")
+
+
+@patch.object(CloudManager, "TEMPLATES_DIRECTORY", TEMPLATES)
+class TestCloudManager(unittest.TestCase):
+    def setUp(self) -> None:
+        self.manager = OpenstackManager(
+            "openstack",
+            {
+                "auth_url": "http://localhost",
+                "region_name": "region",
+                "project_name": "project",
+                "network_name": "network",
+                "username": "user",
+                "password": "password",
+            },
+            "redhat",
+            "password",
+            "ssh-rsa key",
+        )
+        self.vm_type = VmType(
+            {
+                "tags": ["centos7", "small"],
+                "config": {"flavor": "m1.small", "image": "CentOS 7 (PVHVM)"},
+                "quantity": {"min": 1, "max": 2},
+            }
+        )
+        self.installer = {"download_url": "http://runner.tar.gz", "filename": "a.tgz"}
+
+    def render(self, runner: Runner, token, **flags) -> str:
+        env = Environment(
+            loader=FileSystemLoader(TEMPLATES), trim_blocks=True, lstrip_blocks=True
+        )
+        return env.get_template("init_runner_script.sh").render(
+            installer=self.installer,
+            github_organization="org",
+            token=token,
+            name=runner.name,
+            tags="centos7,small",
+            redhat_username="redhat",
+            redhat_password="password",
+            group="default",
+            ssh_keys="ssh-rsa key",
+            **flags,
+        )
+
+    def test_script_init_runner(self):
+        for flags in [{}, {"warm": True}, {"baked": True}, {"bake": True}]:
+            for index, token in enumerate(["token-1", "token-2", None]):
+                runner = Runner(f"runner-{index}", None, self.vm_type, "openstack")
+                self.assertEqual(
+                    self.manager.script_init_runner(
+                        runner, token, "org", self.installer, **flags
+                    ),
+                    self.render(runner, token, **flags),
+                )
+        # The script of each pool and mode is rendered once
+        self.assertEqual(len(self.manager.init_scripts), 4)
+
+    def test_pool_label(self):
+        runner = Runner("runner-1", None, self.vm_type, "openstack")
+        self.assertEqual(CloudManager.pool_label(runner), "centos7-small")
+        # A VM listed from the cloud
+        runner.vm_type = VmType({"tags": [], "config": {}, "quantity": {}})
+        self.assertEqual(CloudManager.pool_label(runner), "unknown")
+        runner.vm_type = None
+        self.assertEqual(CloudManager.pool_label(runner), "unknown")
+
+    def test_script_init_runner_new_installer(self):
+        runner = Runner("runner-1", None, self.vm_type, "openstack")
+        self.manager.script_init_runner(runner, "token", "org", self.installer)
+        self.installer = {"download_url": "http://new.tar.gz", "filename": "b.tgz"}
+        script = self.manager.script_init_runner(runner, "token", "org", self.installer)
+        self.assertIn("http://new.tar.gz", script)
+        self.assertEqual(script, self.render(runner, "token"))
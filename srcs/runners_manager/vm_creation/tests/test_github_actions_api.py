@@ -0,0 +1,178 @@
+import datetime
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+from prometheus_client import REGISTRY
+from runners_manager.vm_creation.Exception import APIException
+from runners_manager.vm_creation.Exception import RateLimitException
+from runners_manager.vm_creation.github_actions_api import GithubManager
+from runners_manager.vm_creation.github_actions_api import Priority
+
+
+def runners_page(total_count: int, page: int, per_page: int) -> dict:
+    first = (page - 1) * per_page
+    return {
+        "total_count": total_count,
+        "runners": [
+            {"id": i, "name": f"runner-{i}", "status": "online", "busy": False}
+            for i in range(first, min(first + per_page, total_count))
+        ],
+    }
+
+
+class TestGithubManager(unittest.TestCase):
+    def setUp(self) -> None:
+        self.github_manager = GithubManager("org", "token")
+        self.github_manager.session = MagicMock()
+
+    def mock_runners_pages(self, total_count: int):
+        def get(url, params=None, **kwargs):
+            response = MagicMock()
+            response.status_code = 200
+            response.headers = {}
+            response.json.return_value = runners_page(
+                total_count, params["page"], params["per_page"]
+            )
+            return response
+
+        self.github_manager.session.get.side_effect = get
+
+    def test_get_runners_pages(self):
+        def requests_count():
+            return REGISTRY.get_sample_value(
+                "runner_manager_github_request_seconds_count", {"endpoint": "runners"}
+            )
+
+        self.mock_runners_pages(250)
+        before = requests_count() or 0
+        runners = self.github_manager.get_runners(per_page=100)
+
+        self.assertEqual(self.github_manager.session.get.call_count, 3)
+        self.assertEqual(requests_count() - before, 3)
+        self.assertEqual(runners["total_count"], 250)
+        self.assertListEqual([r["id"] for r in runners["runners"]], list(range(0, 250)))
+
+    def test_get_runners_prefix(self):
+        self.mock_runners_pages(12)
+        runners = self.github_manager.get_runners(prefix="runner-1", per_page=5)
+
+        self.assertEqual(self.github_manager.session.get.call_count, 3)
+        self.assertListEqual(
+            [r["name"] for r in runners["runners"]],
+            ["runner-1", "runner-10", "runner-11"],
+        )
+
+    def test_get_runners_etag(self):
+        page = runners_page(2, 1, 100)
+        calls = []
+
+        def get(url, params=None, headers=None, **kwargs):
+            calls.append(headers)
+            response = MagicMock()
+            response.headers = {}
+            if headers.get("If-None-Match") == '"v1"':
+                response.status_code = 304
+            else:
+                response.status_code = 200
+                response.headers = {"ETag": '"v1"'}
+                response.json.return_value = page
+            return response
+
+        self.github_manager.session.get.side_effect = get
+
+        first = self.github_manager.get_runners()
+        second = self.github_manager.get_runners()
+        self.assertListEqual(calls, [{}, {"If-None-Match": '"v1"'}])
+        self.assertEqual(first["runners"], second["runners"])
+        self.assertEqual(first["etag"], second["etag"])
+        # The cached page is not altered by the prefix filter
+        self.github_manager.get_runners(prefix="none")
+        self.assertEqual(len(self.github_manager.get_runners()["runners"]), 2)
+
+    def test_registration_token_cache(self):
+        expires_at = datetime.datetime.now(datetime.timezone.utc)
+        tokens = iter(["expired", "fresh"])
+
+        def post(url, **kwargs):
+            response = MagicMock()
+            response.status_code = 201
+            response.headers = {}
+            response.json.return_value = {
+                "token": next(tokens),
+                "expires_at": (expires_at + datetime.timedelta(minutes=5)).isoformat(),
+            }
+            return response
+
+        self.github_manager.session.post.side_effect = post
+
+        # Expiring in 5 minutes, the token is too old to be kept
+        self.assertEqual(self.github_manager.create_runner_token(), "expired")
+        expires_at += datetime.timedelta(hours=1)
+        self.assertEqual(self.github_manager.create_runner_token(), "fresh")
+        self.assertEqual(self.github_manager.create_runner_token(), "fresh")
+        self.assertEqual(self.github_manager.session.post.call_count, 2)
+
+    def test_link_download_runner_cache(self):
+        response = MagicMock()
+        response.status_code = 200
+        response.headers = {}
+        response.json.return_value = [
+            {"os": "linux", "architecture": "x64", "filename": "x64.tar.gz"},
+            {"os": "linux", "architecture": "arm64", "filename": "arm64.tar.gz"},
+        ]
+        self.github_manager.session.get.return_value = response
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            installers = list(
+                executor.map(
+                    lambda _: self.github_manager.link_download_runner(), range(8)
+                )
+            )
+        self.assertEqual(installers[0]["filename"], "x64.tar.gz")
+        self.assertEqual(
+            self.github_manager.link_download_runner("arm64")["filename"],
+            "arm64.tar.gz",
+        )
+        self.assertEqual(self.github_manager.session.get.call_count, 2)
+
+    def test_rate_limit_priorities(self):
+        response = MagicMock()
+        response.status_code = 200
+        response.headers = {
+            "X-RateLimit-Remaining": "200",
+            "X-RateLimit-Limit": "1000",
+            "X-RateLimit-Reset": str(time.time() + 3600),
+        }
+        response.json.return_value = runners_page(1, 1, 100)
+        self.github_manager.session.get.return_value = response
+        self.github_manager.get_runners()
+
+        # Under 30% of the budget, low priority calls wait for the reset
+        with self.assertRaises(RateLimitException):
+            self.github_manager.get_runners(priority=Priority.LOW)
+        self.github_manager.get_runners()
+        self.assertEqual(self.github_manager.session.get.call_count, 2)
+
+    def test_rate_limit_retry_after(self):
+        response = MagicMock()
+        response.status_code = 403
+        response.headers = {"Retry-After": "120"}
+        self.github_manager.session.post.return_value = response
+
+        with self.assertRaises(RateLimitException):
+            self.github_manager.create_runner_token()
+        # Every priority backs off until the retry date
+        with self.assertRaises(RateLimitException):
+            self.github_manager.create_runner_token()
+        self.assertEqual(self.github_manager.session.post.call_count, 1)
+
+    def test_get_runners_error(self):
+        response = MagicMock()
+        response.status_code = 401
+        response.headers = {}
+        self.github_manager.session.get.return_value = response
+
+        with self.assertRaises(APIException):
+            self.github_manager.get_runners()
@@ -0,0 +1,329 @@
+import time
+import unittest
+from concurrent.futures import Future
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import novaclient.base
+from prometheus_client import REGISTRY
+
+from runners_manager.runner.Runner import Runner
+from runners_manager.vm_creation.openstack.OpenstackManager import OpenstackManager
+from runners_manager.vm_creation.VmType import VmType
+
+
+class Server(object):
+    def __init__(self, id, name, status="ACTIVE"):
+        self.id = id
+        self.name = name
+        self.status = status
+        self.image = {"id": "image"}
+        self.flavor = {"id": "flavor"}
+
+
+class TestOpenstackManager(unittest.TestCase):
+    def setUp(self) -> None:
+        self.manager = OpenstackManager(
+            "openstack",
+            {
+                "auth_url": "http://localhost",
+                "region_name": "region",
+                "project_name": "project",
+                "network_name": "network",
+                "username": "user",
+                "password": "password",
+            },
+            None,
+            None,
+            "",
+        )
+        self.manager.nova_client = MagicMock()
+        self.manager.glance = MagicMock()
+        self.manager.neutron = MagicMock()
+        self.manager.script_init_runner = MagicMock(return_value="")
+        self.manager.status_watcher = MagicMock()
+        self.manager.status_watcher.wait.return_value = "ACTIVE"
+        self.vm_type = VmType(
+            {
+                "tags": ["centos7", "small"],
+                "config": {"flavor": "m1.small", "image": "CentOS 7 (PVHVM)"},
+                "quantity": {"min": 1, "max": 2},
+            }
+        )
+
+    def test_duplicated_names(self):
+        self.manager.nova_client.servers.list.return_value = [
+            Server("1", "runner-a"),
+            Server("2", "runner-a"),
+            Server("3", "other"),
+        ]
+        self.manager.get_all_vms("runner-")
+        self.assertEqual(self.manager.servers_by_name, {"runner-a": {"1", "2"}})
+        self.manager.nova_client.servers.list.reset_mock()
+
+        self.manager.nova_client.servers.create.return_value = Server("4", "runner-a")
+        runner = Runner("runner-a", None, self.vm_type, "openstack")
+        vm_id = self.manager.create_vm(runner, "token", "org", {})
+        self.manager.reaper.shutdown()
+
+        self.assertEqual(vm_id, "4")
+        # The duplicates are found without listing the servers
+        self.manager.nova_client.servers.list.assert_not_called()
+        self.assertCountEqual(
+            [c.args[0] for c in self.manager.nova_client.servers.delete.call_args_list],
+            ["1", "2"],
+        )
+        self.assertEqual(self.manager.servers_by_name, {"runner-a": {"4"}})
+
+        runner.vm_id = vm_id
+        self.manager.async_delete_vm(runner)
+        self.assertEqual(self.manager.servers_by_name, {})
+
+    def test_servers_index_seeded(self):
+        self.manager.lookup_refresher = MagicMock()
+        self.manager.nova_client.servers.list.return_value = [
+            Server("1", "runner-a"),
+            Server("2", "warm-runner-b"),
+            Server("3", "baked-openstack-centos7-small-1"),
+            Server("4", "other"),
+        ]
+        self.manager.warm_up([self.vm_type], "runner-")
+        self.assertEqual(
+            self.manager.servers_by_name,
+            {
+                "runner-a": {"1"},
+                "warm-runner-b": {"2"},
+                "baked-openstack-centos7-small-1": {"3"},
+            },
+        )
+
+        # The warm VM is renamed as its runner
+        runner = Runner("runner-b", "2", self.vm_type, "openstack")
+        self.assertTrue(self.manager.start_warm_vm(runner, "token", "org"))
+        self.assertEqual(
+            self.manager.servers_by_name,
+            {
+                "runner-a": {"1"},
+                "runner-b": {"2"},
+                "baked-openstack-centos7-small-1": {"3"},
+            },
+        )
+
+    def lookups_count(self) -> list[int]:
+        return [
+            self.manager.nova_client.glance.find_image.call_count,
+            self.manager.nova_client.flavors.find.call_count,
+            self.manager.neutron.list_networks.call_count,
+            self.manager.neutron.list_security_groups.call_count,
+        ]
+
+    def test_lookups_cache(self):
+        self.manager.nova_client.servers.create.return_value = Server("1", "runner-a")
+        for name in ["runner-a", "runner-b"]:
+            runner = Runner(name, None, self.vm_type, "openstack")
+            self.assertEqual(self.manager.create_vm(runner, "token", "org", {}), "1")
+        # The second creation uses the cached resources
+        self.assertListEqual(self.lookups_count(), [1, 1, 1, 1])
+
+        # A failed creation forgets them, the retry looks them up again
+        self.manager.nova_client.servers.create.side_effect = [
+            Exception("Image not found"),
+            Server("2", "runner-c"),
+        ]
+        runner = Runner("runner-c", None, self.vm_type, "openstack")
+        self.assertEqual(self.manager.create_vm(runner, "token", "org", {}), "2")
+        self.assertListEqual(self.lookups_count(), [2, 2, 2, 2])
+
+        # Once expired they are loaded again
+        self.manager.nova_client.servers.create.side_effect = None
+        expired = time.time() + self.manager.lookup_ttl + 1
+        with patch("runners_manager.vm_creation.Cache.time.time", return_value=expired):
+            runner = Runner("runner-d", None, self.vm_type, "openstack")
+            self.manager.create_vm(runner, "token", "org", {})
+        self.assertListEqual(self.lookups_count(), [3, 3, 3, 3])
+
+    def test_create_vm_timed_once(self):
+        def creations_count():
+            return (
+                REGISTRY.get_sample_value(
+                    "runner_manager_resource_creation_time_seconds_count",
+                    {"cloud": "openstack", "pool": "centos7-small"},
+                )
+                or 0
+            )
+
+        before = creations_count()
+        self.manager.nova_client.servers.create.side_effect = [
+            Exception("No valid host"),
+            Exception("No valid host"),
+            Server("1", "runner-a"),
+        ]
+        runner = Runner("runner-a", None, self.vm_type, "openstack")
+        self.assertEqual(self.manager.create_vm(runner, "token", "org", {}), "1")
+        # The retries are part of the creation timed
+        self.assertEqual(creations_count() - before, 1)
+
+    def test_bake_image(self):
+        self.manager.nova_client.servers.create.return_value = Server("1", "baked")
+        self.manager.status_watcher.wait.return_value = "SHUTOFF"
+        self.manager.nova_client.servers.create_image.return_value = "image-1"
+        self.manager.glance.images.get.return_value.status = "active"
+
+        image_id = self.manager.bake_image(self.vm_type, "baked", "org", {})
+        self.manager.reaper.shutdown()
+
+        self.assertEqual(image_id, "image-1")
+        self.assertTrue(self.manager.script_init_runner.call_args.kwargs["bake"])
+        # The VM is deleted once snapshotted
+        self.manager.nova_client.servers.delete.assert_called_once_with("1")
+
+        # The runners of the pool boot from the baked image
+        self.manager.baked_images[self.vm_type.pool_id] = image_id
+        self.manager.nova_client.servers.create.return_value = Server("2", "runner-a")
+        self.manager.status_watcher.wait.return_value = "ACTIVE"
+        runner = Runner("runner-a", None, self.vm_type, "openstack")
+        self.manager.create_vm(runner, "token", "org", {})
+        self.manager.nova_client.glance.find_image.assert_called_with("image-1")
+        self.assertTrue(self.manager.script_init_runner.call_args.kwargs["baked"])
+
+    def test_bake_image_index_rebuilt(self):
+        self.manager.nova_client.servers.create.return_value = Server("1", "baked")
+        self.manager.nova_client.servers.list.return_value = []
+
+        def wait(server_id, name, states, timeout):
+            # The orphans sweep rebuilds the index while the VM is provisioned
+            self.manager.get_all_vms("runner-")
+            return "ERROR"
+
+        self.manager.status_watcher.wait.side_effect = wait
+        self.assertIsNone(self.manager.bake_image(self.vm_type, "baked", "org", {}))
+        self.manager.reaper.shutdown()
+        self.manager.nova_client.servers.delete.assert_called_once_with("1")
+
+    def test_warm_vm_failed(self):
+        self.manager.nova_client.servers.create.return_value = Server("1", "warm-a")
+        self.manager.nova_client.servers.list.return_value = []
+
+        def wait(server_id, name, states, timeout):
+            self.manager.get_all_vms("runner-")
+            return "ERROR"
+
+        self.manager.status_watcher.wait.side_effect = wait
+        self.assertIsNone(
+            self.manager.create_warm_vm(self.vm_type, "warm-a", "org", {})
+        )
+
+        # The start of a warm VM fails after the index was rebuilt
+        runner = Runner("runner-a", "2", self.vm_type, "openstack")
+        self.assertFalse(self.manager.start_warm_vm(runner, "token", "org"))
+        self.manager.reaper.shutdown()
+
+        self.assertCountEqual(
+            [c.args[0] for c in self.manager.nova_client.servers.delete.call_args_list],
+            ["1", "2"],
+        )
+        self.assertEqual(self.manager.servers_by_name, {})
+
+    def batch(self, count: int) -> list[Runner]:
+        return [
+            Runner(f"runner-b-{index}", None, self.vm_type, "openstack")
+            for index in range(1, count + 1)
+        ]
+
+    def watch_statuses(self, statuses: dict[str, str]) -> None:
+        def watch(server_id, name, states):
+            future = Future()
+            future.set_result(statuses[name])
+            return future
+
+        self.manager.status_watcher.watch.side_effect = watch
+
+    def test_create_vms(self):
+        self.manager.nova_client.servers.create.return_value = (
+            novaclient.base.StrWithMeta("r-1", None)
+        )
+        self.manager.nova_client.servers.list.return_value = [
+            Server("1", "runner-b-1"),
+            Server("2", "runner-b-2"),
+        ]
+        self.watch_statuses({"runner-b-1": "ACTIVE", "runner-b-2": "ACTIVE"})
+
+        vm_ids = self.manager.create_vms(self.batch(2), "token", "org", {})
+
+        self.assertListEqual(vm_ids, ["1", "2"])
+        create = self.manager.nova_client.servers.create.call_args.kwargs
+        self.assertEqual(create["name"], "runner-b")
+        self.assertEqual(create["min_count"], 2)
+        self.assertEqual(create["max_count"], 2)
+        # Unknown arguments are dropped silently by novaclient
+        self.assertIs(create["reservation_id"], True)
+        self.assertNotIn("return_reservation_id", create)
+        self.manager.nova_client.servers.list.assert_called_once_with(
+            search_opts={"reservation_id": "r-1"}
+        )
+        self.assertEqual(
+            self.manager.servers_by_name, {"runner-b-1": {"1"}, "runner-b-2": {"2"}}
+        )
+
+    def test_create_vms_partial(self):
+        self.manager.nova_client.servers.create.side_effect = [
+            "r-1",
+            Server("3", "runner-b-2"),
+        ]
+        self.manager.nova_client.servers.list.return_value = [
+            Server("1", "runner-b-1"),
+            Server("2", "runner-b-2"),
+        ]
+        self.watch_statuses({"runner-b-1": "ACTIVE", "runner-b-2": "ERROR"})
+
+        vm_ids = self.manager.create_vms(self.batch(2), "token", "org", {})
+        self.manager.reaper.shutdown()
+
+        # The server failed is deleted and created again on its own
+        self.assertListEqual(vm_ids, ["1", "3"])
+        self.manager.nova_client.servers.delete.assert_called_once_with("2")
+        self.assertEqual(
+            self.manager.servers_by_name, {"runner-b-1": {"1"}, "runner-b-2": {"3"}}
+        )
+
+    def test_create_vms_fallback(self):
+        self.manager.reservation_attempts = 1
+        self.manager.nova_client.servers.create.side_effect = [
+            "r-1",
+            Server("3", "runner-b-1"),
+            Server("4", "runner-b-2"),
+        ]
+        # The servers of the reservation are not listed
+        self.manager.nova_client.servers.list.side_effect = Exception("timeout")
+
+        vm_ids = self.manager.create_vms(self.batch(2), "token", "org", {})
+        self.manager.reaper.shutdown()
+
+        self.assertListEqual(vm_ids, ["3", "4"])
+        self.manager.status_watcher.watch.assert_not_called()
+
+    def test_create_vms_reservation_listed_again(self):
+        self.manager.reservation_retry_interval = 0
+        self.manager.nova_client.servers.create.side_effect = [
+            "r-1",
+            Server("3", "runner-b-1"),
+            Server("4", "runner-b-2"),
+        ]
+        self.manager.nova_client.servers.list.side_effect = [
+            Exception("timeout"),
+            [Server("1", "runner-b-1"), Server("2", "runner-b-2")],
+        ]
+        self.watch_statuses({"runner-b-1": "ERROR", "runner-b-2": "ERROR"})
+
+        vm_ids = self.manager.create_vms(self.batch(2), "token", "org", {})
+        self.manager.reaper.shutdown()
+
+        # The servers of the batch are known, they are deleted before the retries
+        self.assertListEqual(vm_ids, ["3", "4"])
+        self.assertCountEqual(
+            [c.args[0] for c in self.manager.nova_client.servers.delete.call_args_list],
+            ["1", "2"],
+        )
+        self.assertEqual(
+            self.manager.servers_by_name, {"runner-b-1": {"3"}, "runner-b-2": {"4"}}
+        )
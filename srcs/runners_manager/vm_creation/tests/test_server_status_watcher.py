@@ -0,0 +1,86 @@
+import unittest
+from unittest.mock import MagicMock
+
+import novaclient.exceptions
+from runners_manager.vm_creation.openstack.ServerStatusWatcher import (
+    ServerStatusWatcher,
+)
+
+
+class Server(object):
+    def __init__(self, id, name, status):
+        self.id = id
+        self.name = name
+        self.status = status
+
+
+class TestServerStatusWatcher(unittest.TestCase):
+    def setUp(self) -> None:
+        self.nova_client = MagicMock()
+        self.watcher = ServerStatusWatcher(
+            self.nova_client, min_interval=0.01, max_interval=0.05
+        )
+
+    def test_poll(self):
+        self.nova_client.servers.list.return_value = [
+            Server("1", "runner-a-1", "ACTIVE"),
+            Server("2", "runner-a-2", "BUILD"),
+        ]
+        self.watcher.thread = MagicMock()
+        active = self.watcher.watch("1", "runner-a-1", {"ACTIVE", "ERROR"})
+        building = self.watcher.watch("2", "runner-a-2", {"ACTIVE", "ERROR"})
+        deleted = self.watcher.watch("3", "runner-a-3", {"SHUTOFF"})
+
+        self.assertTrue(self.watcher.poll())
+        # A single list filtered by the common prefix of the servers
+        self.nova_client.servers.list.assert_called_once_with(
+            detailed=True, search_opts={"name": "runner-a-"}
+        )
+        self.assertEqual(active.result(0), "ACTIVE")
+        self.assertEqual(deleted.result(0), "DELETED")
+        self.assertFalse(building.done())
+        self.assertListEqual(list(self.watcher.watches.keys()), ["2"])
+
+    def test_poll_without_prefix(self):
+        servers = {"1": Server("1", "warm-runner-a", "SHELVED")}
+
+        def get(server_id):
+            if server_id not in servers:
+                raise novaclient.exceptions.NotFound(404)
+            return servers[server_id]
+
+        self.nova_client.servers.get.side_effect = get
+        self.watcher.name_prefix = "runner-"
+        self.watcher.thread = MagicMock()
+        warm = self.watcher.watch("1", "warm-runner-a", {"SHELVED"})
+        deleted = self.watcher.watch("2", "runner-b", {"ACTIVE"})
+
+        # The names only share "", the servers are read one by one
+        self.assertTrue(self.watcher.poll())
+        self.nova_client.servers.list.assert_not_called()
+        self.assertEqual(warm.result(0), "SHELVED")
+        self.assertEqual(deleted.result(0), "DELETED")
+
+        # A prefix shorter than the runners one would still match other servers
+        self.watcher.watch("3", "runner-c", {"ACTIVE"})
+        self.watcher.watch("4", "rhel-d", {"ACTIVE"})
+        self.watcher.poll()
+        self.nova_client.servers.list.assert_not_called()
+
+    def test_wait(self):
+        statuses = iter(["BUILD", "BUILD", "BUILD", "ACTIVE"])
+        self.nova_client.servers.list.side_effect = lambda **kwargs: [
+            Server("1", "runner-a-1", next(statuses, "ACTIVE"))
+        ]
+
+        status = self.watcher.wait("1", "runner-a-1", {"ACTIVE", "ERROR"}, timeout=5)
+        self.assertEqual(status, "ACTIVE")
+        self.assertEqual(self.nova_client.servers.list.call_count, 4)
+
+    def test_wait_timeout(self):
+        self.nova_client.servers.list.return_value = [
+            Server("1", "runner-a-1", "BUILD")
+        ]
+
+        self.assertIsNone(self.watcher.wait("1", "runner-a-1", {"ACTIVE"}, timeout=0.1))
+        self.assertEqual(self.watcher.watches, {})
@@ -21,6 +21,7 @@ class EnvSettings(object):
         self.redhat_username = os.getenv("REDHAT_USERNAME")
         self.redhat_password = os.getenv("REDHAT_PASSWORD")
         self.redis_password = os.getenv("REDIS_PASSWORD")
+        self.init_script_reload = os.getenv("INIT_SCRIPT_RELOAD", "").lower() == "true"
 
 
 class ExtraRunnerTimer(Schema):
@@ -35,6 +36,7 @@ class TimeoutRunnerTimer(Schema):
 
 class RunnerQuantity(Schema):
     on_demand = fields.Bool(default=False, missing=False)
+    warm = fields.Int(default=0, missing=0)
     min = fields.Int(required=True)
     max = fields.Int(required=True)
 
@@ -43,6 +45,35 @@ class RunnerPool(Schema):
     tags = fields.List(fields.Str(), required=True)
     config = fields.Dict(required=True)
     quantity = fields.Nested(RunnerQuantity, required=True)
+    bake = fields.Bool(default=False, missing=False)
+
+
+class RunnerCreationPool(Schema):
+    max_workers = fields.Int()
+    max_queue_depth = fields.Int()
+    pool_concurrency = fields.Int()
+
+
+class RunnerAutoscaler(Schema):
+    bucket_seconds = fields.Int()
+    window = fields.Int()
+    history_days = fields.Int()
+    seasonality = fields.Float()
+    boot_time = fields.Int()
+
+
+class WebhookQueue(Schema):
+    shards = fields.Int()
+    max_length = fields.Int()
+    claim_idle = fields.Float()
+    dedupe_ttl = fields.Int()
+    max_deliveries = fields.Int()
+
+
+class Reconcile(Schema):
+    min_poll_interval = fields.Float()
+    max_poll_interval = fields.Float()
+    coalesce_window = fields.Float()
 
 
 class RedisDatabase(Schema):
@@ -60,6 +91,10 @@ class Settings(Schema):
     extra_runner_timer = fields.Nested(ExtraRunnerTimer, required=True)
     timeout_runner_timer = fields.Nested(TimeoutRunnerTimer, required=True)
     redis = fields.Nested(RedisDatabase, required=True)
+    creation_pool = fields.Nested(RunnerCreationPool, required=False)
+    autoscaler = fields.Nested(RunnerAutoscaler, required=False)
+    webhook_queue = fields.Nested(WebhookQueue, required=False)
+    reconcile = fields.Nested(Reconcile, required=False)
 
 
 def setup_settings(settings_file: str) -> dict:
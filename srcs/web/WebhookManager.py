@@ -43,29 +43,19 @@ class WebHookManager(object):
         Github Action Workflow job event, received when a job
         https://docs.github.com/en/developers/webhooks-and-events/webhooks/webhook-events-and-payloads#workflow_job
         """
+        runner_m.record_job(payload.workflow_job.labels, payload.action)
+
         status = {}
         if (
             payload.action == "queued"
             and "self-hosted" in payload.workflow_job.labels
             and payload.workflow_job.runner_id is None
         ):
-            payload.workflow_job.labels.remove("self-hosted")
-            try:
-                r_m = next(
-                    iter(
-                        runner_m.get_runner_manager_on_demand(
-                            lambda elem: elem.vm_type.tags
-                            == payload.workflow_job.labels
-                        )
-                    ),
-                    None,
-                )
-            except Exception as e:
-                logger.error(e.with_traceback())
-                return 0
-
+            # The job goes to the runners of the smallest pool with its labels,
+            # only an on demand pool needs a runner created for it
+            r_m = runner_m.find_pool(payload.workflow_job.labels, best_match=True)
             logger.info(f"{r_m} Runner manager found")
-            if r_m:
+            if r_m and r_m.vm_type.on_demand:
                 logger.info("Start create new runner " + r_m.redis_key_name())
                 try:
                     r_m.create_runner()
@@ -74,6 +64,9 @@ class WebHookManager(object):
 
             return
         elif payload.action == "in_progress":
+            job = payload.workflow_job
+            if "self-hosted" in job.labels and job.created_at and job.started_at:
+                runner_m.observe_job_wait(job.labels, job.created_at, job.started_at)
             status = {
                 "status": "online",
                 "busy": True,
@@ -9,9 +9,14 @@ from fastapi.templating import Jinja2Templates
 from fastapi_utils.tasks import repeat_every
 from runners_manager.monitoring.prometheus import metrics
 from runners_manager.monitoring.prometheus import prometheus_metrics
+from runners_manager.runner.EventQueue import EventQueue
+from runners_manager.vm_creation.github_actions_api import Priority
 from web import cloud_manager
 from web import github_manager
+from web import redis_database
 from web import runner_m
+from web import settings
+from web.models import BakeImage
 from web.models import CreateVm
 from web.models import WebHook
 from web.WebhookManager import WebHookManager
@@ -24,6 +29,15 @@ templates = Jinja2Templates(directory="templates/html")
 app.add_route("/metrics", prometheus_metrics)
 
 
+def handle_webhook(event: str, payload: str):
+    WebHookManager(payload=WebHook.parse_raw(payload), event=event)()
+
+
+webhook_queue = EventQueue(
+    redis_database, handle_webhook, **settings.get("webhook_queue", {})
+)
+
+
 @app.on_event("startup")
 @repeat_every(seconds=60 * 60 * 2)
 def delete_orphan_runners():
@@ -35,9 +49,9 @@ def delete_orphan_runners():
         logger.info("list not tracked VM")
         gh_runners = [
             (elem["id"], elem["name"])
-            for elem in github_manager.get_runners(runner_m.factory.runner_prefix)[
-                "runners"
-            ]
+            for elem in github_manager.get_runners(
+                runner_m.factory.runner_prefix, priority=Priority.LOW
+            )["runners"]
         ]
         server_list = cloud_manager.get_all_vms(runner_m.factory.runner_prefix)
 
@@ -66,12 +80,36 @@ def delete_orphan_runners():
 # TODO: RELENG-6041 There could be an issue with this call when multiple
 # runners are deployed
 @app.on_event("startup")
-@repeat_every(seconds=60 * 2)
+def start_reconcile_scheduler():
+    """
+    Reconcile runners on webhook events, with a full poll of GitHub as fallback
+    """
+    runner_m.scheduler.start()
+
+
+@app.on_event("startup")
+def start_webhook_queue():
+    """
+    Handle the webhook events queued, in the background
+    """
+    webhook_queue.start()
+
+
+@app.on_event("shutdown")
+def stop_webhook_queue():
+    webhook_queue.stop()
+
+
+@app.on_event("shutdown")
+def stop_reconcile_scheduler():
+    runner_m.scheduler.stop()
+    runner_m.factory.creations.shutdown(wait=False)
+
+
 def refresh():
     logger.info("Refresh runners")
     try:
-        runners = github_manager.get_runners(runner_m.factory.runner_prefix)
-        runner_m.update_all_runners(runners["runners"])
+        runner_m.scheduler.reconcile(full=True)
     except Exception as e:
         logger.error(e)
 
@@ -85,21 +123,20 @@ def delete_images():
 # TODO: RELENG-6041 There could be an issue with this call when multiple
 # runners are deployed
 @app.post("/runners/refresh")
-async def refresh_data():
-    await refresh()
+def refresh_data():
+    refresh()
     return Response(status_code=200)
 
 
 @app.post("/runners/reset")
-async def reset_reset_runners(request: Request):
+def reset_reset_runners(request: Request):
     """
     Delete Virutal machine and runner on github and create new runner
     """
-    g_runners = github_manager.get_runners(runner_m.factory.runner_prefix)
-    runner_m.update_all_runners(g_runners["runners"])
-    runner_m.remove_all_runners()
-    g_runners = github_manager.get_runners(runner_m.factory.runner_prefix)
-    runner_m.update_all_runners(g_runners["runners"])
+    with runner_m.scheduler.lock:
+        runner_m.scheduler.reconcile(full=True)
+        runner_m.remove_all_runners()
+        runner_m.scheduler.reconcile(full=True)
     return Response(status_code=200)
 
 
@@ -108,13 +145,7 @@ async def request_runners(params: CreateVm, request: Request):
     """
     Create VM
     """
-    elem = next(
-        filter(
-            lambda runner_manager: runner_manager.vm_type.tags == params.tags,
-            runner_m.runner_managers,
-        )
-    )
-
+    elem = runner_m.find_pool(params.tags)
     if elem is None:
         return Response(status_code=404)
     for i in range(0, params.quantity):
@@ -122,6 +153,22 @@ async def request_runners(params: CreateVm, request: Request):
     return Response(status_code=200)
 
 
+@app.post("/runners/bake")
+async def bake_images(params: BakeImage, request: Request):
+    """
+    Bake a new image for the runner pools, the current one is used until it is ready
+    """
+    if params.tags is None:
+        managers = runner_m.runner_managers
+    else:
+        managers = [m for m in [runner_m.find_pool(params.tags)] if m is not None]
+    if not managers:
+        return Response(status_code=404)
+    for manager in managers:
+        runner_m.factory.bake(manager.vm_type)
+    return Response(status_code=202)
+
+
 @app.post("/runners/stop")
 async def stop_runner(request: Request):
     runner_m.redis.set_manager_running(not runner_m.redis.get_manager_running())
@@ -129,12 +176,26 @@ async def stop_runner(request: Request):
 
 
 @app.post("/webhook")
-async def webhook_post(data: WebHook, request: Request):
+def webhook_post(data: WebHook, request: Request):
     """
     Webhook point for Github
+    The event is queued and handled in the background, in order for each job
+    The redeliveries and the repeated actions of a job are dropped
     """
-    WebHookManager(payload=data, event=request.headers["X-Github-Event"])()
-    return Response(status_code=200)
+    delivery_keys = []
+    if request.headers.get("X-GitHub-Delivery"):
+        delivery_keys.append(request.headers["X-GitHub-Delivery"])
+    job = data.workflow_job
+    if job:
+        delivery_keys.append(f"job:{job.id}:{job.run_attempt}:{data.action}")
+
+    event_id = webhook_queue.put(
+        request.headers["X-Github-Event"],
+        data.json(),
+        key=str(job.id) if job else "",
+        delivery_keys=delivery_keys,
+    )
+    return Response(status_code=202 if event_id else 200)
 
 
 @app.get("/", response_class=HTMLResponse)
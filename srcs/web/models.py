@@ -31,6 +31,9 @@ class WorkflowJob(BaseModel):
     head_sha: str
     run_attempt: int
     labels: List[str]
+    # The job is queued when created, the start is set once a runner picks it up
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
 
     # Information about the runner can be null if the Job is queued
     runner_id: Optional[int] = None
@@ -54,3 +57,8 @@ class WebHook(BaseModel):
 class CreateVm(BaseModel):
     tags: List[str]
     quantity: int
+
+
+class BakeImage(BaseModel):
+    # Every pool with baking enabled when not set
+    tags: Optional[List[str]] = None
@@ -5,15 +5,18 @@ LINUX_OS=${ID}
 LINUX_OS_VERSION=$(echo ${VERSION_ID} | sed -E 's/^([0-9]+)\..*$/\1/')
 DOCKER_SERVICE_START="yes"
 
+{% if not baked %}
 sudo groupadd -f docker
 sudo useradd -m  actions
 sudo usermod -aG docker,root actions
 sudo bash -c "echo 'actions ALL=(ALL) NOPASSWD:ALL' >> /etc/sudoers"
+{% endif %}
 sudo -H -u actions bash -c 'mkdir -p /home/actions/.ssh'
 {% if ssh_keys %}
 sudo -H -u actions bash -c 'echo "{{ ssh_keys }}" >>  /home/actions/.ssh/authorized_keys'
 {% endif %}
 
+{% if not baked %}
 if [ "${LINUX_OS}" = "ubuntu" ]
 then
 sudo apt-get -y update
@@ -93,10 +96,22 @@ fi
 
 if [ "${DOCKER_SERVICE_START}" = "yes" ]
 then
-sudo systemctl start docker
+sudo systemctl enable --now docker
 fi
 {% endif %}
+{% endif %}
 
+{% if warm or bake %}
+{% elif name %}
+RUNNER_NAME="{{ name }}"
+{% else %}
+# VMs created in a batch share this script, the runner name is the name of the VM
+curl -s -o /tmp/meta_data.json http://169.254.169.254/openstack/latest/meta_data.json
+PYTHON=$(command -v python3 || command -v python)
+RUNNER_NAME=$(${PYTHON} -c 'import json; print(json.load(open("/tmp/meta_data.json"))["name"])')
+{% endif %}
+
+{% if not baked %}
 sudo -H -u actions bash -c 'mkdir -p /home/actions/actions-runner'
 sudo -H -u actions bash -c 'cd /home/actions/actions-runner && curl -O -L {{ installer["download_url"] }} && tar xzf ./{{ installer["filename"] }}'
 sudo -H -u actions bash -c 'sudo /home/actions/actions-runner/bin/installdependencies.sh'
@@ -116,8 +131,47 @@ TimeoutStopSec=5min
 
 [Install]
 {% endraw %}
-WantedBy=multi-user.target" > /home/actions/actions-runner/bin/actions.runner.service.template &&
-				./config.sh --url https://github.com/{{ github_organization }} --token {{ token }} --name "{{ name }}" --work _work  --labels {{ tags }} --runnergroup {{ group }} --replace --unattended --ephemeral'
+WantedBy=multi-user.target" > /home/actions/actions-runner/bin/actions.runner.service.template'
+{% endif %}
+{% if bake %}
+# Golden image: the VM is snapshotted once powered off, the VMs created from the
+# image run this script again with `baked` and only register their runner
+command -v cloud-init && sudo cloud-init clean --logs
+sudo shutdown -h now
+{% elif warm %}
+# Warm VM: it is shelved once provisioned, the runner is registered when it is
+# unshelved, with the name and the token set in the server metadata
+sudo bash -c 'cat <<"EOF" > /usr/local/bin/register_runner.sh
+#!/usr/bin/env bash
+[ -f /home/actions/actions-runner/.runner ] && exit 0
+curl -s -o /tmp/meta_data.json http://169.254.169.254/openstack/latest/meta_data.json
+PYTHON=$(command -v python3 || command -v python)
+META="import json; meta = json.load(open(\"/tmp/meta_data.json\"))[\"meta\"]; print(meta.get"
+RUNNER_NAME=$(${PYTHON} -c "${META}(\"runner_name\", \"\"))")
+RUNNER_TOKEN=$(${PYTHON} -c "${META}(\"runner_token\", \"\"))")
+[ -z "${RUNNER_TOKEN}" ] && exit 0
+sudo -H -u actions bash -c "cd /home/actions/actions-runner && ./config.sh --url https://github.com/{{ github_organization }} --token ${RUNNER_TOKEN} --name ${RUNNER_NAME} --work _work  --labels {{ tags }} --runnergroup {{ group }} --replace --unattended --ephemeral"
+cd /home/actions/actions-runner && ./svc.sh install actions && ./svc.sh start
+EOF'
+sudo bash -c 'cat <<EOF > /etc/systemd/system/register_runner.service
+[Unit]
+Description=Register the GitHub runner of a warm VM
+After=network-online.target
+Wants=network-online.target
+
+[Service]
+Type=oneshot
+ExecStart=/bin/bash /usr/local/bin/register_runner.sh
+
+[Install]
+WantedBy=multi-user.target
+EOF'
+sudo systemctl daemon-reload
+sudo systemctl enable register_runner.service
+sudo shutdown -h now
+{% else %}
+sudo -H -u actions bash -c 'cd /home/actions/actions-runner &&
+				./config.sh --url https://github.com/{{ github_organization }} --token {{ token }} --name "'"${RUNNER_NAME}"'" --work _work  --labels {{ tags }} --runnergroup {{ group }} --replace --unattended --ephemeral'
 if command -v systemctl; then
 sudo -H -u actions bash -c 'cd /home/actions/actions-runner &&
 				sudo ./svc.sh install &&
@@ -125,3 +179,4 @@ sudo -H -u actions bash -c 'cd /home/actions/actions-runner &&
 else
 nohup sudo -H -u actions bash -c '/home/actions/actions-runner/run.sh 2> /home/actions/actions-runner/logs'
 fi
+{% endif %}